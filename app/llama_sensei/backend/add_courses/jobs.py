@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 1))
+MAX_FINISHED_JOBS = 100  # finished jobs kept around for GET /jobs/{id}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """
+    State of one background ingestion run, updated by the worker thread and
+    read by the API. Progress is kept per stage, e.g.
+    {"download": {"done": 3, "total": 10, "failed": 1}}.
+    """
+
+    def __init__(self, job_id: str, info: Dict):
+        self.id = job_id
+        self.info = info
+        self.status = "queued"  # queued, running, done, failed, cancelled
+        self.stage = None
+        self.progress: Dict[str, Dict] = {}
+        self.timings: Dict[str, float] = {}
+        self.errors: List[str] = []
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed", "cancelled")
+
+    def check_cancelled(self):
+        # Called by the worker between units of work
+        if self._cancel.is_set():
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+    @contextmanager
+    def run_stage(self, name: str, total: int = None):
+        self.check_cancelled()
+        with self._lock:
+            self.stage = name
+            self.progress[name] = {"done": 0, "total": total}
+        before = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.timings[name] = time.perf_counter() - before
+
+    def advance(self, stage: str = None, **counts):
+        # advance("embed", done=1, chunks=42) adds to the stage's counters
+        with self._lock:
+            progress = self.progress.setdefault(stage or self.stage, {"done": 0})
+            for key, value in counts.items():
+                progress[key] = progress.get(key, 0) + value
+
+    def set_total(self, stage: str, total: int):
+        with self._lock:
+            self.progress.setdefault(stage, {"done": 0})["total"] = total
+
+    def add_error(self, error: str):
+        with self._lock:
+            self.errors.append(error)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            end = self.finished_at or time.time()
+            return {
+                "job_id": self.id,
+                **self.info,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": {k: dict(v) for k, v in self.progress.items()},
+                "timings": dict(self.timings),
+                "elapsed": end - (self.started_at or end),
+                "errors": list(self.errors),
+                "result": self.result,
+                "cancel_requested": self.cancel_requested,
+            }
+
+
+class JobManager:
+    """
+    Runs ingestion jobs on a small dedicated thread pool, so long running
+    downloads and transcriptions never block the API's event loop.
+    """
+
+    def __init__(self, max_workers=INGEST_WORKERS, max_finished=MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ingest"
+        )
+        self._jobs: Dict[str, Job] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args, **info) -> Job:
+        """
+        Queue fn(job, *args). The job id is returned at once; fn reports
+        progress through the job and may return a JSON-able result.
+        """
+        job = Job(uuid.uuid4().hex, info)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        job.future = self._pool.submit(self._run, job, fn, args)
+        return job
+
+    def _run(self, job: Job, fn: Callable, args):
+        if job.cancel_requested:
+            job.status = "cancelled"
+            job.finished_at = time.time()
+            return
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = fn(job, *args)
+            job.status = "done"
+        except JobCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            job.add_error(str(e))
+            job.status = "failed"
+            print(f"Job {job.id} failed: {e}")
+            traceback.print_exc()
+        finally:
+            job.finished_at = time.time()
+            print(
+                f"Job {job.id} {job.status} in {job.to_dict()['elapsed']:.1f} seconds"
+            )
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[: max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Ask a job to stop. A queued job never starts; a running one stops at
+        its next checkpoint (between videos or documents).
+        """
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        job._cancel.set()
+        if job.future is not None and job.future.cancel():
+            job.status = "cancelled"
+            job.finished_at = time.time()
+        return job
+
+    def shutdown(self, cancel=True):
+        if cancel:
+            for job in self.jobs():
+                self.cancel(job.id)
+        self._pool.shutdown(wait=False, cancel_futures=cancel)
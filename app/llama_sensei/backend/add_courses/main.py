@@ -1,76 +1,307 @@
-import glob
+import asyncio
+import json
 import os
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Dict, List
 
 import uvicorn
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
-from schemas import AddCourseRequest, SearchQuery, SearchResponse
-from speech_to_text.transcript import DeepgramSTTClient
-from vectordb.document_processor import DocumentProcessor
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
+from jobs import Job, JobManager
+from manifest import CourseManifest
+from payload import MSGPACK_MEDIA_TYPE, pack, search_payload, wants_msgpack
+from pipeline import IngestionPipeline
+from schemas import (
+    AddCourseRequest,
+    BatchSearchQuery,
+    BatchSearchResponse,
+    SearchQuery,
+    SearchResponse,
+)
+from speech_to_text.transcript import DeepgramSTTClient, peak_rss_mb
+from sync import CourseSync
+from vectordb.backends import open_vector_db
+from vectordb.lexical_index import LexicalIndex
+from vectordb.registry import ModelRegistry
+from vectordb.result_cache import SearchResultCache
 from vectordb.vector_db_operations import VectorDBOperations
 from yt_api.audio import YouTubeAudioDownloader
 from yt_api.playlist import PlaylistVideosFetcher
 
 load_dotenv()
 DATA_SAVE_DIR = os.getenv("DATA_SAVE_DIR")
-vectordb = VectorDBOperations(DATA_SAVE_DIR)
-app = FastAPI(title="LlamaSensei: Course management API")
+# Created by the lifespan hook, not at import: under `python main.py` every
+# spawned preprocessing or embedding worker re-imports this module (as
+# __mp_main__) and must not open the stores or start job threads again
+vectordb: VectorDBOperations = None
+registry: ModelRegistry = None
+jobs: JobManager = None
 
 
-@app.post("/add_course/")
-async def add_course(request: AddCourseRequest):
-    try:
-        fetcher = PlaylistVideosFetcher()
-        video_urls = fetcher.get_playlist_videos(request.playlist_url)
-        print(video_urls)
+def create_services():
+    global vectordb, registry, jobs
+    vectordb = open_vector_db(
+        DATA_SAVE_DIR,
+        result_cache=SearchResultCache(),
+        lexical_index=LexicalIndex(DATA_SAVE_DIR),
+    )
+    registry = ModelRegistry(cache_dir=os.path.join(DATA_SAVE_DIR, "embedding_cache"))
+    jobs = JobManager()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    create_services()
+    # Load and warm up models in the background so "/" answers while we warm up
+    warmup = asyncio.create_task(run_in_threadpool(registry.load))
+    yield
+    warmup.cancel()
+    jobs.shutdown()
+    registry.close()
+
 
-        downloader = YouTubeAudioDownloader(
-            output_path=DATA_SAVE_DIR, course_name=request.course_name
+app = FastAPI(title="LlamaSensei: Course management API", lifespan=lifespan)
+
+
+def ensure_ready():
+    if registry is None or not registry.ready:
+        raise HTTPException(
+            status_code=503,
+            detail=(registry and registry.error) or "Models are warming up",
         )
-        downloader.download_audio(video_urls)
-        print('Download success')
 
-        course_audio_dir = os.path.join(
-            DATA_SAVE_DIR, request.course_name, "audio/*.wav"
+
+def ingest_course(job: Job, request: AddCourseRequest):
+    # Runs on a JobManager worker thread: fetch, then stream download, transcribe, embed
+    with job.run_stage("fetch"):
+        fetcher = PlaylistVideosFetcher()
+        entries = fetcher.get_playlist_entries(request.playlist_url)
+        job.advance(done=1)
+
+    downloader = YouTubeAudioDownloader(
+        output_path=DATA_SAVE_DIR, course_name=request.course_name
+    )
+    transcript_dir = os.path.join(DATA_SAVE_DIR, request.course_name, "transcript/")
+    deepgram_client = DeepgramSTTClient(
+        output_path=transcript_dir,
+        sample_rate=downloader.profile["sample_rate"],
+        mimetype=downloader.profile["mimetype"],
+    )
+    processor = registry.document_processor(
+        vector_db=vectordb, collection_name=request.course_name, search_only=False
+    )
+
+    manifest = CourseManifest(downloader.output_course_path, registry.model_name)
+
+    plan = None
+    if request.sync:
+        with job.run_stage("sync"):
+            course_sync = CourseSync(
+                downloader, deepgram_client, vectordb, request.course_name, manifest
+            )
+            prepared = course_sync.prepare(entries, request.delete_removed)
+            entries = prepared["entries"]
+            plan = {kind: len(ids) for kind, ids in prepared["plan"].items()}
+            job.advance(done=1, **plan)
+
+    # Pick each video up from the last stage a previous run finished
+    with job.run_stage("resume"):
+        resume = manifest.resume(
+            entries,
+            downloader,
+            deepgram_client,
+            vectordb.get_video_ids(request.course_name),
         )
-        audio_list = glob.glob(course_audio_dir)
-        transcript_dir = os.path.join(DATA_SAVE_DIR, request.course_name, "transcript/")
-        deepgram_client = DeepgramSTTClient(output_path=transcript_dir)
-        deepgram_client.get_transcripts(audio_list)
-        print("Transcript success")
-
-        processor = DocumentProcessor(
-            vector_db=vectordb, collection_name=request.course_name, search_only=False
+        job.advance(done=1, **{k: len(v) for k, v in resume.items()})
+
+    with job.run_stage("ingest"):
+        pipeline = IngestionPipeline(
+            downloader, deepgram_client, processor, job=job, manifest=manifest
         )
-        for video_id in os.listdir(transcript_dir):
-            processor.process_document(
-                path=os.path.join(transcript_dir, video_id),
-                metadata={'video_id': video_id.split('.')[0]},
+        try:
+            result = pipeline.run(
+                resume["urls"],
+                audio_files=resume["audio_files"],
+                transcripts=resume["transcripts"],
             )
+        finally:
+            # Once per job, also indexing what a failed run got to embed
+            vectordb.build_lexical_index(request.course_name)
+
+    return {
+        "message": "Success",
+        "sync": plan,
+        "already_indexed": len(resume["indexed"]),
+        "failed_downloads": result["failed"]["download"],
+        "failed": result["failed"],
+        "transcripts": result["transcripts"],
+        "chunks": result["chunks"],
+        "busy_seconds": result["busy_seconds"],
+        "embedding_cache": result["embedding_cache"],
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+@app.post("/add_course/", status_code=202)
+async def add_course(request: AddCourseRequest):
+    # Queue the ingestion and answer at once, poll GET /jobs/{job_id} for progress
+    ensure_ready()
+    job = jobs.submit(
+        ingest_course,
+        request,
+        course_name=request.course_name,
+        playlist_url=request.playlist_url,
+        sync=request.sync,
+    )
+    return {"message": "Queued", "job_id": job.id, "status": job.status}
 
-        return {"message": "Success"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/jobs/")
+async def list_jobs():
+    return [job.to_dict() for job in jobs.jobs()]
 
-@app.post("/search/", response_model=SearchResponse)
-async def search(query: SearchQuery):
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_dict()
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    job = jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_dict()
+
+
+def search_filters(query: SearchQuery):
+    if query.filters is None:
+        return None
+    return query.filters.model_dump(exclude_none=True)
+
+
+def search_response(payload: Dict, binary: bool) -> Response:
+    # Built by hand: validating hundreds of floats per hit through the
+    # response model costs more than the search itself
+    if binary:
+        return Response(content=pack(payload), media_type=MSGPACK_MEDIA_TYPE)
+    return JSONResponse(content=payload)
+
+
+def search_responses(model) -> Dict:
+    # search_response bypasses response_model, so the schema of the JSON body
+    # and the msgpack alternative are declared for the OpenAPI docs here
+    return {
+        200: {
+            "model": model,
+            "content": {MSGPACK_MEDIA_TYPE: {}},
+            "description": 'JSON, or msgpack with "Accept: application/msgpack"',
+        }
+    }
+
+
+@app.post("/search/", response_model=None, responses=search_responses(SearchResponse))
+async def search(query: SearchQuery, accept: str = Header(default=None)):
+    """
+    Send "Accept: application/msgpack" for a msgpack body carrying the
+    embeddings as raw float32 bytes (with embedding_dim).
+    """
+    ensure_ready()
     try:
-        document_processor = DocumentProcessor(
-            vector_db=vectordb,
-            collection_name=query.course_name,
-            search_only=True,
+        document_processor = registry.document_processor(
+            vector_db=vectordb, collection_name=query.course_name
         )
-        result = document_processor.search(
+        # Off the event loop, the embedder may be busy with an ingestion job
+        result = await run_in_threadpool(
+            document_processor.search,
             query=query.text,
             top_k=query.top_k,
+            filters=search_filters(query),
+            mode=query.mode,
         )
-        return SearchResponse(
-            documents=result['documents'][0],
-            metadatas=result['metadatas'][0],
-            embeddings=result['embeddings'][0],
+        binary = wants_msgpack(accept)
+        payload = search_payload(
+            result['documents'][0],
+            result['metadatas'][0],
+            result['embeddings'][0],
+            query.embedding_format,
+            binary=binary,
         )
+        return search_response(payload, binary)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def batch_search(queries: List[SearchQuery], binary=False) -> List[Dict]:
+    # Encode every query in one forward pass, then one vector query per course
+    # (and set of filters)
+    processor = registry.document_processor(vector_db=vectordb, collection_name=None)
+    # Preprocessed once, for the embeddings and the BM25 side of hybrid queries
+    texts = [processor.text_processor._preprocess(query.text) for query in queries]
+    embeddings = processor.embed_preprocessed(texts)
+    groups = defaultdict(list)
+    payloads = [None] * len(queries)
+    for i, query in enumerate(queries):
+        filters = search_filters(query)
+        if query.mode == "hybrid":
+            # Fused per query, the BM25 side takes well under a millisecond
+            result = vectordb.search_hybrid(
+                query.course_name,
+                embeddings[i],
+                texts[i],
+                query.top_k,
+                filters=filters,
+            )
+            if result is None:
+                raise ValueError(f"Search in {query.course_name} failed")
+            payloads[i] = search_payload(
+                result['documents'][0],
+                result['metadatas'][0],
+                result['embeddings'][0],
+                query.embedding_format,
+                binary=binary,
+            )
+            continue
+        groups[(query.course_name, json.dumps(filters, sort_keys=True))].append(i)
+
+    for (course_name, filters), indices in groups.items():
+        result = vectordb.search_embeddings_batch(
+            course_name,
+            embeddings[indices],
+            max(queries[i].top_k for i in indices),
+            filters=json.loads(filters),
+        )
+        if result is None:
+            raise ValueError(f"Search in {course_name} failed")
+        for row, i in enumerate(indices):
+            top_k = queries[i].top_k
+            payloads[i] = search_payload(
+                result['documents'][row][:top_k],
+                result['metadatas'][row][:top_k],
+                result['embeddings'][row][:top_k],
+                queries[i].embedding_format,
+                binary=binary,
+            )
+    return payloads
+
+
+@app.post(
+    "/search/batch",
+    response_model=None,
+    responses=search_responses(BatchSearchResponse),
+)
+async def search_batch(request: BatchSearchQuery, accept: str = Header(default=None)):
+    ensure_ready()
+    try:
+        binary = wants_msgpack(accept)
+        results = await run_in_threadpool(batch_search, request.queries, binary)
+        return search_response({"results": results}, binary)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -84,6 +315,21 @@ async def get_courses():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/admin/cache")
+async def cache_stats():
+    ensure_ready()
+    return {
+        "query_embeddings": registry.query_cache.stats(),
+        "search_results": vectordb.result_cache.stats(),
+    }
+
+
+@app.get("/ready")
+async def ready():
+    ensure_ready()
+    return {"status": "ready", "model": registry.model_name}
+
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to LlamaSensei: Course management API"}
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Set
+
+MANIFEST_FILENAME = "manifest.json"
+STATES = ("downloaded", "transcribed", "indexed")  # in pipeline order
+
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_complete_transcript(path: str) -> bool:
+    # A crash mid-write leaves invalid JSON or a response without results
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return bool(data["results"]["channels"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+
+
+class CourseManifest:
+    """
+    Per-course record of how far every video got through ingestion, kept in
+    DATA_SAVE_DIR/<course>/manifest.json and rewritten atomically on every
+    change. Each video maps to its last finished state (downloaded,
+    transcribed, indexed) plus the transcript checksum, chunk count and
+    embedding model, so a restarted run resumes where the last one stopped.
+    """
+
+    def __init__(self, course_dir: str, model_name: str = None):
+        self.path = os.path.join(course_dir, MANIFEST_FILENAME)
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self.videos: Dict[str, Dict] = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)["videos"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return {}
+
+    def _save(self):
+        tmp_file = self.path + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump({"videos": self.videos}, f, indent=4)
+        os.replace(tmp_file, self.path)
+
+    def _update(self, video_id: str, state: str, **fields):
+        with self._lock:
+            record = self.videos.setdefault(video_id, {})
+            record.update(fields, state=state, updated_at=time.time())
+            self._save()
+
+    def state(self, video_id: str) -> str:
+        return self.videos.get(video_id, {}).get("state")
+
+    def mark_downloaded(self, video_id: str, audio_file: str):
+        self._update(video_id, "downloaded", audio=audio_file)
+
+    def mark_transcribed(self, video_id: str, transcript_file: str):
+        self._update(
+            video_id,
+            "transcribed",
+            transcript=transcript_file,
+            transcript_sha256=file_checksum(transcript_file),
+        )
+
+    def mark_indexed(self, video_id: str, chunks: int):
+        self._update(video_id, "indexed", chunks=chunks, model=self.model_name)
+
+    def forget(self, video_ids):
+        with self._lock:
+            for video_id in video_ids:
+                self.videos.pop(video_id, None)
+            self._save()
+
+    def transcript_ok(self, video_id: str, transcript_file: str) -> bool:
+        """
+        A transcript counts as finished when its checksum matches the one
+        recorded, or, for files written before the manifest existed, when it
+        is a complete Deepgram response (it is then recorded).
+        """
+        if not os.path.exists(transcript_file):
+            return False
+        record = self.videos.get(video_id, {})
+        if "transcript_sha256" in record:
+            return file_checksum(transcript_file) == record["transcript_sha256"]
+        if is_complete_transcript(transcript_file):
+            self.mark_transcribed(video_id, transcript_file)
+            return True
+        return False
+
+    def resume(
+        self, entries: List[Dict], downloader, stt_client, indexed: Set[str]
+    ) -> Dict[str, List]:
+        """
+        Split playlist entries by the stage they have to restart from:
+        "indexed" (nothing to do), "transcripts" (embed only), "audio_files"
+        (transcribe and embed) and "urls" (the whole pipeline). Transcripts
+        that do not pass transcript_ok are deleted so they are redone.
+        """
+        resume = {"indexed": [], "transcripts": [], "audio_files": [], "urls": []}
+        for entry in entries:
+            video_id = entry.get("id")
+            if not video_id:
+                resume["urls"].append(entry["url"])
+                continue
+            record = self.videos.get(video_id, {})
+            transcript_file = stt_client.transcript_path(video_id)
+            audio_file = downloader.audio_path(video_id)
+
+            transcribed = self.transcript_ok(video_id, transcript_file)
+            if (
+                transcribed
+                and record.get("state") == "indexed"
+                and record.get("model") == self.model_name
+                and video_id in indexed
+            ):
+                resume["indexed"].append(video_id)
+            elif transcribed:
+                resume["transcripts"].append(transcript_file)
+            else:
+                if os.path.exists(transcript_file):
+                    print(f"Transcript of {video_id} is incomplete, redoing it")
+                    os.remove(transcript_file)
+                if record.get("state") in STATES and os.path.exists(audio_file):
+                    resume["audio_files"].append(audio_file)
+                else:
+                    resume["urls"].append(entry["url"])
+        print(
+            "Resume: " + ", ".join(f"{len(items)} {k}" for k, items in resume.items())
+        )
+        return resume
@@ -0,0 +1,48 @@
+import base64
+from typing import Dict, List
+
+import msgpack
+import numpy as np
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+# How /search returns the embedding of every hit in a JSON body:
+# "list" (a list of floats per hit), "base64" (one little-endian float32
+# matrix, see embeddings_b64 and embedding_dim) or "none" (left out)
+EMBEDDING_FORMATS = ("list", "base64", "none")
+
+
+def wants_msgpack(accept: str) -> bool:
+    return MSGPACK_MEDIA_TYPE in (accept or "")
+
+
+def search_payload(
+    documents: List[str],
+    metadatas: List[Dict],
+    embeddings,
+    embedding_format: str = "list",
+    binary: bool = False,
+) -> Dict:
+    """
+    The body of one search result. With `binary` (a msgpack response) the
+    embeddings are the raw float32 matrix bytes instead of a list or base64.
+    """
+    payload = {"documents": list(documents), "metadatas": list(metadatas)}
+    if embedding_format == "none":
+        return payload
+    matrix = np.asarray(embeddings, dtype="<f4")
+    matrix = matrix.reshape(len(documents), -1 if len(documents) else 0)
+    if binary:
+        payload["embeddings"] = matrix.tobytes()
+        payload["embedding_dim"] = matrix.shape[1]
+    elif embedding_format == "base64":
+        payload["embeddings_b64"] = base64.b64encode(matrix.tobytes()).decode()
+        payload["embedding_dim"] = matrix.shape[1]
+    else:
+        # JSON floats are float64: every float32 is written with up to 17
+        # digits, which is why "base64" and msgpack exist for big results
+        payload["embeddings"] = matrix.tolist()
+    return payload
+
+
+def pack(payload: Dict) -> bytes:
+    return msgpack.packb(payload, use_bin_type=True)
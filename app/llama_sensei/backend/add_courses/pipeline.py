@@ -0,0 +1,266 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from typing import Dict, List
+
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 2))
+POLL_INTERVAL = 0.1  # secs between checks for a stop request while waiting
+
+_DONE = object()  # end of stream marker put on a queue by the stage feeding it
+
+
+class PipelineStopped(Exception):
+    pass
+
+
+def video_id(path: str) -> str:
+    # Audio and transcript files are both named after the video id
+    return os.path.basename(path).split('.')[0]
+
+
+class IngestionPipeline:
+    """
+    Stream the videos of a course through download -> transcribe -> embed.
+
+    Every stage runs in its own thread(s) and hands each finished video to the
+    next stage through a bounded queue. While video N is embedded, N+1 can be
+    transcribed and N+2 downloaded, and a slow stage holds back the stages
+    before it instead of letting audio pile up on disk.
+
+    `job` is optional; when given (see jobs.Job) it receives per-stage
+    progress and errors and is checked for cancellation. So is `manifest`
+    (see manifest.CourseManifest), which records every finished stage.
+    A video that fails a stage is taken off the totals of the later stages,
+    so that each of them still ends at done == total.
+    """
+
+    STAGES = ("download", "transcribe", "embed")
+
+    def __init__(
+        self,
+        downloader,
+        stt_client,
+        processor,
+        queue_size=PIPELINE_QUEUE_SIZE,
+        job=None,
+        manifest=None,
+    ):
+        self.downloader = downloader
+        self.stt_client = stt_client
+        self.processor = processor
+        self.job = job
+        self.manifest = manifest
+        self.audio_queue = queue.Queue(maxsize=queue_size)
+        self.transcript_queue = queue.Queue(maxsize=queue_size)
+        self.failed: Dict[str, Dict[str, str]] = {stage: {} for stage in self.STAGES}
+        self.busy: Dict[str, float] = {stage: 0.0 for stage in self.STAGES}
+        self.transcripts: List[Dict] = []
+        self.chunks = 0
+        self._ready_transcripts: List[str] = []
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+        self._lock = threading.Lock()
+
+    def run(
+        self, urls: List[str], audio_files: List[str] = (), transcripts: List[str] = ()
+    ) -> Dict:
+        """
+        Ingest the videos at `urls`. Work finished by an earlier run can be
+        passed in: `audio_files` already downloaded skip to transcription and
+        `transcripts` already on disk skip straight to embedding.
+        """
+        before = time.perf_counter()
+        self._ready_transcripts = list(transcripts)
+        if self.job is not None:
+            self.job.set_total("download", len(urls))
+            self.job.set_total("transcribe", len(urls) + len(audio_files))
+            self.job.set_total("embed", len(urls) + len(audio_files) + len(transcripts))
+
+        url_queue = queue.Queue()
+        for url in urls:
+            url_queue.put(url)
+        threads = [
+            threading.Thread(
+                target=self._guard,
+                args=(self._download_stage, url_queue, list(audio_files)),
+            ),
+            threading.Thread(target=self._guard, args=(self._transcribe_stage,)),
+        ]
+        for thread in threads:
+            thread.start()
+
+        # Embedding uses the shared models, so it stays on the calling thread
+        try:
+            self._embed_stage()
+        except PipelineStopped:
+            pass
+        except BaseException:
+            self._stop.set()
+            raise
+        finally:
+            for thread in threads:
+                thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+        if self.job is not None:
+            self.job.check_cancelled()
+
+        elapsed = time.perf_counter() - before
+        print(
+            f"Ingested {len(urls)} videos in {elapsed:.1f} seconds "
+            f"(busy: {', '.join(f'{k} {v:.1f}s' for k, v in self.busy.items())})"
+        )
+        return {
+            "failed": self.failed,
+            "transcripts": self.transcripts,
+            "chunks": self.chunks,
+            "seconds": elapsed,
+            "busy_seconds": dict(self.busy),
+            "embedding_cache": dict(getattr(self.processor, "cache_stats", {})),
+        }
+
+    def _stopping(self) -> bool:
+        return self._stop.is_set() or (
+            self.job is not None and self.job.cancel_requested
+        )
+
+    def _guard(self, stage, *args):
+        # A crashed stage stops the others instead of leaving them waiting
+        try:
+            stage(*args)
+        except PipelineStopped:
+            pass
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+
+    def _put(self, q: queue.Queue, item):
+        while True:
+            try:
+                return q.put(item, timeout=POLL_INTERVAL)
+            except queue.Full:
+                if self._stopping():
+                    raise PipelineStopped()
+
+    def _get(self, q: queue.Queue):
+        while True:
+            try:
+                return q.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if self._stopping():
+                    raise PipelineStopped()
+
+    def _report(self, stage: str, key: str, seconds: float, error: str = None):
+        with self._lock:
+            self.busy[stage] += seconds
+            if error is not None:
+                self.failed[stage][key] = error
+        if self.job is not None:
+            self.job.advance(stage, done=1, failed=int(error is not None))
+            if error is not None:
+                self.job.add_error(f"{stage} {key}: {error}")
+                # The video goes no further: the later stages expect one less
+                for later in self.STAGES[self.STAGES.index(stage) + 1 :]:
+                    self.job.advance(later, total=-1)
+
+    def _download_stage(self, url_queue: queue.Queue, audio_files: List[str]):
+        for audio_file in audio_files:
+            self._put(self.audio_queue, audio_file)
+        workers = [
+            threading.Thread(
+                target=self._guard, args=(self._download_worker, url_queue)
+            )
+            for _ in range(min(self.downloader.max_workers, url_queue.qsize()) or 1)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self._put(self.audio_queue, _DONE)
+
+    def _download_worker(self, url_queue: queue.Queue):
+        while not self._stopping():
+            try:
+                url = url_queue.get_nowait()
+            except queue.Empty:
+                return
+            before = time.perf_counter()
+            try:
+                audio_file = self.downloader.download_video(url)
+            except Exception as e:
+                print(f"Failed to download {url}: {str(e)}")
+                self._report("download", url, time.perf_counter() - before, str(e))
+                continue
+            self._report("download", url, time.perf_counter() - before)
+            if self.manifest is not None:
+                self.manifest.mark_downloaded(video_id(audio_file), audio_file)
+            # Blocks while transcription is behind
+            self._put(self.audio_queue, audio_file)
+
+    def _transcribe_stage(self):
+        asyncio.run(self._atranscribe_stage())
+        self._put(self.transcript_queue, _DONE)
+
+    async def _atranscribe_stage(self):
+        # Shared by every file, so segmented files keep to the same limit
+        requests = asyncio.Semaphore(self.stt_client.concurrency)
+        slots = asyncio.Semaphore(self.stt_client.concurrency)
+        tasks = []
+        while True:
+            await slots.acquire()
+            audio_file = await asyncio.to_thread(self._get, self.audio_queue)
+            if audio_file is _DONE:
+                break
+            task = asyncio.create_task(self._transcribe_one(audio_file, requests))
+            task.add_done_callback(lambda _: slots.release())
+            tasks.append(task)
+        await asyncio.gather(*tasks)
+
+    async def _transcribe_one(self, audio_file: str, requests: asyncio.Semaphore):
+        save_file = self.stt_client.transcript_path(audio_file)
+        if os.path.exists(save_file):
+            status = {"file": audio_file, "status": "skipped", "seconds": 0.0}
+        else:
+            status = await self.stt_client.atranscribe(audio_file, save_file, requests)
+        self.transcripts.append(status)
+        self._report(
+            "transcribe", audio_file, status.get("seconds", 0.0), status.get("error")
+        )
+        if status["status"] == "done" and self.manifest is not None:
+            self.manifest.mark_transcribed(video_id(audio_file), save_file)
+        if status["status"] != "failed":
+            await asyncio.to_thread(self._put, self.transcript_queue, save_file)
+
+    def _next_transcript(self):
+        if self._ready_transcripts:
+            return self._ready_transcripts.pop(0)
+        return self._get(self.transcript_queue)
+
+    def _embed_stage(self):
+        while True:
+            transcript_file = self._next_transcript()
+            if transcript_file is _DONE:
+                return
+            if self.job is not None:
+                self.job.check_cancelled()
+            before = time.perf_counter()
+            transcript_id = video_id(transcript_file)
+            try:
+                num_chunks = self.processor.process_document(
+                    path=transcript_file, metadata={'video_id': transcript_id}
+                )
+            except Exception as e:
+                print(f"Failed to embed {transcript_file}: {str(e)}")
+                self._report(
+                    "embed", transcript_id, time.perf_counter() - before, str(e)
+                )
+                continue
+            if self.manifest is not None:
+                self.manifest.mark_indexed(transcript_id, num_chunks)
+            self.chunks += num_chunks
+            if self.job is not None:
+                self.job.advance("embed", chunks=num_chunks)
+            self._report("embed", transcript_id, time.perf_counter() - before)
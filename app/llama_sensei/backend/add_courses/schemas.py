@@ -1,4 +1,4 @@
-from typing import Dict, List
+from typing import Dict, List, Literal, Optional, Union
 
 from pydantic import BaseModel, Field
 
@@ -6,15 +6,58 @@ from pydantic import BaseModel, Field
 class AddCourseRequest(BaseModel):
     playlist_url: str = Field(..., description="Youtube course playlist")
     course_name: str = Field(..., description="Collection to create")
+    sync: bool = Field(
+        default=False, description="Only process videos that are new or changed"
+    )
+    delete_removed: bool = Field(
+        default=False, description="With sync, drop videos no longer in the playlist"
+    )
+
+
+class SearchFilters(BaseModel):
+    video_ids: Optional[List[str]] = Field(
+        default=None, description="Only chunks of these videos"
+    )
+    start_after: Optional[float] = Field(
+        default=None, description="Only chunks starting at or after this second"
+    )
+    end_before: Optional[float] = Field(
+        default=None, description="Only chunks ending at or before this second"
+    )
+    metadata: Dict[str, Union[str, int, float, bool]] = Field(
+        default_factory=dict, description="Equality on any other stored metadata"
+    )
 
 
 class SearchQuery(BaseModel):
     course_name: str = Field(..., description="Collection to search")
     text: str = Field(..., description="Query content")
     top_k: int = Field(default=5, gt=0)
+    filters: Optional[SearchFilters] = Field(
+        default=None, description="Narrow the chunks searched, applied in the vector db"
+    )
+    mode: Literal["vector", "hybrid"] = Field(
+        default="vector",
+        description="Vector search, or fused with a BM25 search of the chunk text",
+    )
+    embedding_format: Literal["list", "base64", "none"] = Field(
+        default="list",
+        description="Embeddings as float lists, one base64 float32 matrix, or left out",
+    )
 
 
 class SearchResponse(BaseModel):
     documents: List[str]
     metadatas: List[Dict]
-    embeddings: List[List[float]]
+    embeddings: Optional[List[List[float]]] = None
+    # embedding_format="base64": little-endian float32, len(documents) x embedding_dim
+    embeddings_b64: Optional[str] = None
+    embedding_dim: Optional[int] = None
+
+
+class BatchSearchQuery(BaseModel):
+    queries: List[SearchQuery] = Field(..., min_length=1, max_length=256)
+
+
+class BatchSearchResponse(BaseModel):
+    results: List[SearchResponse]  # in the order of the queries
@@ -0,0 +1,178 @@
+import copy
+import os
+import re
+import subprocess
+from typing import Dict, List, Tuple
+
+SILENCE_NOISE_DB = -30  # quieter than this counts as silence
+SILENCE_MIN_DURATION = 0.5  # secs
+
+_DURATION_RE = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+_SILENCE_START_RE = re.compile(r"silence_start: (-?\d+(?:\.\d+)?)")
+_SILENCE_END_RE = re.compile(r"silence_end: (-?\d+(?:\.\d+)?)")
+
+
+def parse_silencedetect(output: str) -> Tuple[float, List[Tuple[float, float]]]:
+    """
+    Read the duration and the (start, end) silences from ffmpeg's silencedetect log.
+    """
+    match = _DURATION_RE.search(output)
+    if match is None:
+        raise ValueError("Could not read the audio duration from ffmpeg output")
+    hours, minutes, seconds = match.groups()
+    duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    silences = []
+    start = None
+    for line in output.splitlines():
+        if (match := _SILENCE_START_RE.search(line)) is not None:
+            start = max(float(match.group(1)), 0.0)
+        elif (match := _SILENCE_END_RE.search(line)) is not None and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    if start is not None:  # silent until the end of the file
+        silences.append((start, duration))
+    return duration, silences
+
+
+def detect_silences(
+    audio_file: str,
+    noise_db: float = SILENCE_NOISE_DB,
+    min_silence: float = SILENCE_MIN_DURATION,
+) -> Tuple[float, List[Tuple[float, float]]]:
+    command = [
+        "ffmpeg",
+        "-hide_banner",
+        "-nostats",
+        "-i",
+        audio_file,
+        "-af",
+        f"silencedetect=noise={noise_db}dB:d={min_silence}",
+        "-f",
+        "null",
+        "-",
+    ]
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    return parse_silencedetect(result.stderr)
+
+
+def plan_segments(
+    duration: float, silences: List[Tuple[float, float]], segment_length: float
+) -> List[Tuple[float, float]]:
+    """
+    Split [0, duration] into (start, end) segments of about `segment_length`
+    seconds, cutting in the middle of the silence closest to each target.
+    Segments stay between half and one and a half times `segment_length`;
+    without a silence in that window the audio is cut at the target.
+    """
+    cut_points = [(start + end) / 2 for start, end in silences]
+    segments = []
+    start = 0.0
+    while duration - start > segment_length * 1.5:
+        target = start + segment_length
+        low = start + segment_length / 2
+        high = min(start + segment_length * 1.5, duration - segment_length / 2)
+        candidates = [cut for cut in cut_points if low <= cut <= high]
+        cut = min(candidates, key=lambda c: abs(c - target)) if candidates else target
+        segments.append((start, cut))
+        start = cut
+    segments.append((start, duration))
+    return segments
+
+
+def split_audio(
+    audio_file: str, segments: List[Tuple[float, float]], output_dir: str
+) -> List[str]:
+    # Stream copy: no re-encoding, cuts land on the nearest audio packet
+    ext = os.path.splitext(audio_file)[1]
+    paths = []
+    for i, (start, end) in enumerate(segments):
+        path = os.path.join(output_dir, f"segment_{i:04d}{ext}")
+        command = [
+            "ffmpeg",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-y",
+            "-ss",
+            f"{start:.3f}",
+            "-i",
+            audio_file,
+            "-t",
+            f"{end - start:.3f}",
+            "-c",
+            "copy",
+            path,
+        ]
+        subprocess.run(command, capture_output=True, check=True)
+        paths.append(path)
+    return paths
+
+
+def _shift(items: List[Dict], offset: float):
+    for item in items:
+        item["start"] += offset
+        item["end"] += offset
+        _shift(item.get("sentences", []), offset)
+
+
+def _merge_alternatives(parts: List[Dict], offsets: List[float]) -> Dict:
+    merged = {"transcript": "", "confidence": 0.0, "words": []}
+    paragraphs = [] if "paragraphs" in parts[0] else None
+    paragraph_text = []
+    for part, offset in zip(parts, offsets):
+        _shift(part.get("words", []), offset)
+        merged["words"].extend(part.get("words", []))
+        if paragraphs is not None and "paragraphs" in part:
+            _shift(part["paragraphs"].get("paragraphs", []), offset)
+            paragraphs.extend(part["paragraphs"].get("paragraphs", []))
+            paragraph_text.append(part["paragraphs"].get("transcript", ""))
+
+    merged["transcript"] = " ".join(
+        part["transcript"] for part in parts if part.get("transcript")
+    )
+    # Weight each segment's confidence by its number of words
+    num_words = [len(part.get("words", [])) or 1 for part in parts]
+    merged["confidence"] = sum(
+        part.get("confidence", 0.0) * n for part, n in zip(parts, num_words)
+    ) / sum(num_words)
+    if paragraphs is not None:
+        merged["paragraphs"] = {
+            "transcript": "".join(paragraph_text),
+            "paragraphs": paragraphs,
+        }
+    return merged
+
+
+def merge_transcripts(results: List[Dict], offsets: List[float]) -> Dict:
+    """
+    Merge the Deepgram responses of consecutive segments into one response,
+    shifting every timestamp by the offset at which its segment starts.
+    """
+    results = copy.deepcopy(results)
+    merged = copy.deepcopy(results[0])
+
+    for i, channel in enumerate(merged["results"]["channels"]):
+        for j, alternative in enumerate(channel["alternatives"]):
+            parts = [r["results"]["channels"][i]["alternatives"][j] for r in results]
+            alternative.update(_merge_alternatives(parts, offsets))
+
+    if "utterances" in merged["results"]:
+        utterances = []
+        for result, offset in zip(results, offsets):
+            _shift(result["results"].get("utterances", []), offset)
+            utterances.extend(result["results"].get("utterances", []))
+        merged["results"]["utterances"] = utterances
+
+    metadata = merged.setdefault("metadata", {})
+    metadata["duration"] = offsets[-1] + results[-1].get("metadata", {}).get(
+        "duration", 0.0
+    )
+    metadata["segments"] = [
+        {
+            "start": offset,
+            "request_id": result.get("metadata", {}).get("request_id"),
+        }
+        for result, offset in zip(results, offsets)
+    ]
+    return merged
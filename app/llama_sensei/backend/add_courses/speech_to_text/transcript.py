@@ -1,81 +1,337 @@
+import asyncio
+import json
 import os
+import random
+import resource
+import shutil
+import tempfile
+import time
 from datetime import datetime
-from typing import List
+from typing import Callable, Dict, List, Optional
 
 import httpx
-from deepgram import DeepgramClient, FileSource, PrerecordedOptions
+from deepgram import (
+    DeepgramClient,
+    DeepgramClientOptions,
+    PrerecordedOptions,
+    StreamSource,
+)
 from dotenv import load_dotenv
 
+from .segment import detect_silences, merge_transcripts, plan_segments, split_audio
+
 load_dotenv()
 
 DEFAULT_STT_MODEL = "nova-2"
-AUDIO_SAMPLE_RATE = 48000
+AUDIO_SAMPLE_RATE = 16000  # matches the default "opus" download profile
+AUDIO_MIMETYPE = "audio/ogg"
+DELETE_AUDIO = os.getenv("DELETE_AUDIO_AFTER_TRANSCRIPT", "false").lower() == "true"
 DEEPGRAM_API_KEY = os.getenv("DG_API_KEY")
+DEEPGRAM_URL = os.getenv("DG_API_URL", "")  # empty means api.deepgram.com
 DEEPGRAM_TIMEOUT = 900.0  # secs
+TRANSCRIBE_CONCURRENCY = int(os.getenv("DG_CONCURRENCY", 4))
+MAX_RETRIES = 4
+RETRY_BASE_DELAY = 2.0  # secs, doubled on every retry
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # bytes read from disk per upload chunk
+# Split longer audio at silences into segments of about this many seconds, 0 disables it
+SEGMENT_LENGTH = float(os.getenv("DG_SEGMENT_SECONDS", 0))
+
+
+def is_retryable(error: Exception) -> bool:
+    # Rate limits, server errors and dropped connections are worth another try
+    status = str(getattr(error, "status", ""))
+    if status == "429" or status.startswith("5"):
+        return True
+    return isinstance(error, httpx.TransportError)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def iter_file(path: str, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            yield chunk
+
+
+async def aiter_file(path: str, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    with open(path, "rb") as file:
+        while chunk := await asyncio.to_thread(file.read, chunk_size):
+            yield chunk
 
 
 class DeepgramSTTClient:
-    def __init__(self, output_path) -> None:
+    def __init__(
+        self,
+        output_path,
+        concurrency=TRANSCRIBE_CONCURRENCY,
+        max_retries=MAX_RETRIES,
+        retry_base_delay=RETRY_BASE_DELAY,
+        url=DEEPGRAM_URL,
+        sample_rate=AUDIO_SAMPLE_RATE,
+        mimetype=AUDIO_MIMETYPE,
+        delete_audio=DELETE_AUDIO,
+        segment_length=SEGMENT_LENGTH,
+    ) -> None:
         self.output_path = output_path
         os.makedirs(self.output_path, exist_ok=True)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.url = url
+        self.delete_audio = delete_audio
+        self.segment_length = segment_length
+        self.headers = {"Content-Type": mimetype}
+        self._client = None
 
         self.options = PrerecordedOptions(
             model=DEFAULT_STT_MODEL,
-            sample_rate=AUDIO_SAMPLE_RATE,
+            sample_rate=sample_rate,
             smart_format=True,
         )
 
-    def get_transcripts(self, audio_files: List[str]):
-        if len(audio_files) == 0:
-            print("There is no file to transcribe")
-            return
+    @property
+    def client(self) -> DeepgramClient:
+        # One client shared by every file (and every concurrent request)
+        if self._client is None:
+            print("Connecting to Deepgram...")
+            self._client = DeepgramClient(
+                DEEPGRAM_API_KEY, DeepgramClientOptions(url=self.url)
+            )
+            print("Connect successful!")
+        return self._client
 
+    def transcript_path(self, audio_file: str) -> str:
+        save_name = os.path.basename(audio_file).split(".")[0] + ".json"
+        return os.path.join(self.output_path, save_name)
+
+    def _pending(self, audio_files: List[str]):
+        # Pair each audio file with its transcript path, skipping finished ones
         for filename in audio_files:
-            save_name = os.path.basename(filename).split(".")[0] + ".json"
-            save_transcript_path = os.path.join(self.output_path, save_name)
+            save_transcript_path = self.transcript_path(filename)
             if os.path.exists(save_transcript_path):
-                print(f"file {save_name} existed")
+                print(f"file {os.path.basename(save_transcript_path)} existed")
+                self._cleanup(filename)
+                yield filename, None
             else:
-                self.transcribe(filename, save_transcript_path)
+                yield filename, save_transcript_path
 
-        # task_list = []
-        # for filename in audio_files:
-        #     save_name = os.path.basename(filename).split(".")[0] + ".json"
-        #     save_transcript_path = os.path.join(self.output_path, save_name)
-        #     if os.path.exists(save_transcript_path):
-        #         print(f"file {save_name} existed")
-        #     else:
-        #         task_list.append(asyncio.create_task(self.transcribe(filename, save_transcript_path)))
+    def _cleanup(self, audio_file: str):
+        # The transcript is all later stages need, drop the audio if asked to
+        if self.delete_audio and os.path.exists(audio_file):
+            os.remove(audio_file)
 
-        # await asyncio.gather(*task_list)
+    def _retry_delay(self, attempt: int) -> float:
+        # Exponential backoff with jitter, so parallel retries do not line up
+        delay = self.retry_base_delay * 2 ** (attempt - 1)
+        return delay + random.uniform(0, self.retry_base_delay)
 
-    def transcribe(self, audio_file: str, save_file: str):
-        try:
-            print("Connecting to Deepgram...")
-            deepgram_client = DeepgramClient(DEEPGRAM_API_KEY)
-            print("Connect successful!")
+    def _with_retries(self, request, audio_file, status):
+        while True:
+            status["attempts"] += 1
+            try:
+                return request()
+            except Exception as e:
+                if status["attempts"] > self.max_retries or not is_retryable(e):
+                    raise
+                delay = self._retry_delay(status["attempts"])
+                print(f"Retrying {audio_file} in {delay:.1f} seconds: {e}")
+                time.sleep(delay)
 
-            with open(audio_file, "rb") as file:
-                buffer_data = file.read()
+    async def _awith_retries(self, request, audio_file, status):
+        while True:
+            status["attempts"] += 1
+            try:
+                return await request()
+            except Exception as e:
+                if status["attempts"] > self.max_retries or not is_retryable(e):
+                    raise
+                delay = self._retry_delay(status["attempts"])
+                print(f"Retrying {audio_file} in {delay:.1f} seconds: {e}")
+                await asyncio.sleep(delay)
+
+    def get_transcripts(self, audio_files: List[str]) -> List[Dict]:
+        if len(audio_files) == 0:
+            print("There is no file to transcribe")
+            return []
 
-            payload: FileSource = {
-                "buffer": buffer_data,
-            }
+        statuses = []
+        for filename, save_transcript_path in self._pending(audio_files):
+            if save_transcript_path is None:
+                statuses.append({"file": filename, "status": "skipped"})
+            else:
+                statuses.append(self.transcribe(filename, save_transcript_path))
+        return statuses
+
+    async def aget_transcripts(
+        self,
+        audio_files: List[str],
+        on_done: Optional[Callable[[Dict], None]] = None,
+    ) -> List[Dict]:
+        """
+        Transcribe files concurrently, at most `concurrency` requests in flight.
+        Returns one status dict per file, in input order. on_done(status) is
+        called as each file finishes; if it raises, the remaining files are cancelled.
+        """
+        if len(audio_files) == 0:
+            print("There is no file to transcribe")
+            return []
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        before = time.perf_counter()
+        tasks = []
+        for filename, save_transcript_path in self._pending(audio_files):
+            if save_transcript_path is None:
+                tasks.append(self._skipped(filename))
+            else:
+                tasks.append(
+                    self.atranscribe(filename, save_transcript_path, semaphore)
+                )
+
+        async def report(task):
+            status = await task
+            if on_done is not None:
+                on_done(status)
+            return status
+
+        statuses = await asyncio.gather(*map(report, tasks))
+
+        done = sum(status["status"] == "done" for status in statuses)
+        failed = sum(status["status"] == "failed" for status in statuses)
+        print(
+            f"Transcribed {done} files ({failed} failed) in "
+            f"{time.perf_counter() - before:.1f} seconds, "
+            f"peak RSS {peak_rss_mb():.0f} MB"
+        )
+        return list(statuses)
+
+    async def _skipped(self, filename):
+        return {"file": filename, "status": "skipped"}
+
+    def transcribe(self, audio_file: str, save_file: str) -> Dict:
+        status = {"file": audio_file, "status": "failed", "attempts": 0}
+        try:
+            deepgram_client = self.client
 
             print("Sending request to Deepgram...")
             before = datetime.now()
-            r = deepgram_client.listen.rest.v("1").transcribe_file(
-                payload,
-                self.options,
-                timeout=httpx.Timeout(DEEPGRAM_TIMEOUT, connect=10.0),
+            # Stream the file from disk, a fresh stream for every attempt
+            r = self._with_retries(
+                lambda: deepgram_client.listen.rest.v("1").transcribe_file(
+                    StreamSource(stream=iter_file(audio_file)),
+                    self.options,
+                    headers=self.headers,
+                    timeout=httpx.Timeout(DEEPGRAM_TIMEOUT, connect=10.0),
+                ),
+                audio_file,
+                status,
             )
             after = datetime.now()
             print("Received transcript results from Deepgram...")
             difference = after - before
             print(f"Transcript time: {difference.seconds} seconds")
 
-            with open(save_file, "w") as f:
-                f.write(r.to_json(indent=4))
+            _write_file(save_file, r.to_json(indent=4))
+            status.update(status="done", seconds=difference.total_seconds())
+            self._cleanup(audio_file)
+            status["peak_rss_mb"] = peak_rss_mb()
 
         except Exception as e:
+            status["error"] = str(e)
             print(f"Exception: {e}")
+        return status
+
+    def _arequest(self, audio_file: str):
+        # A fresh stream for every attempt
+        return self.client.listen.asyncrest.v("1").transcribe_file(
+            StreamSource(stream=aiter_file(audio_file)),
+            self.options,
+            headers=self.headers,
+            timeout=httpx.Timeout(DEEPGRAM_TIMEOUT, connect=10.0),
+        )
+
+    def _plan(self, audio_file: str):
+        if not self.segment_length:
+            return None
+        try:
+            duration, silences = detect_silences(audio_file)
+        except Exception as e:
+            print(f"Could not split {audio_file}, sending it whole: {e}")
+            return None
+        return plan_segments(duration, silences, self.segment_length)
+
+    async def atranscribe(
+        self, audio_file: str, save_file: str, semaphore: asyncio.Semaphore
+    ) -> Dict:
+        status = {"file": audio_file, "status": "failed", "attempts": 0}
+        before = time.perf_counter()
+        try:
+            segments = await asyncio.to_thread(self._plan, audio_file)
+            if segments and len(segments) > 1:
+                content = await self._atranscribe_segments(
+                    audio_file, segments, semaphore, status
+                )
+            else:
+                async with semaphore:
+                    r = await self._awith_retries(
+                        lambda: self._arequest(audio_file), audio_file, status
+                    )
+                content = r.to_json(indent=4)
+
+            await asyncio.to_thread(_write_file, save_file, content)
+            status["status"] = "done"
+            self._cleanup(audio_file)
+            print(f"Transcribed {os.path.basename(audio_file)}")
+        except Exception as e:
+            status["error"] = str(e)
+            print(f"Exception while transcribing {audio_file}: {e}")
+        status["seconds"] = time.perf_counter() - before
+        status["peak_rss_mb"] = peak_rss_mb()
+        return status
+
+    async def _atranscribe_segments(self, audio_file, segments, semaphore, status):
+        """
+        Transcribe the segments of one file concurrently (sharing the client's
+        concurrency limit) and stitch them into a single transcript. A failed
+        segment is retried on its own instead of resending the whole file.
+        """
+        status["segments"] = len(segments)
+        segment_dir = tempfile.mkdtemp(dir=os.path.dirname(audio_file) or None)
+        try:
+            paths = await asyncio.to_thread(
+                split_audio, audio_file, segments, segment_dir
+            )
+
+            async def transcribe_segment(path):
+                segment_status = {"attempts": 0}
+                try:
+                    async with semaphore:
+                        r = await self._awith_retries(
+                            lambda: self._arequest(path), path, segment_status
+                        )
+                finally:
+                    status["attempts"] += segment_status["attempts"]
+                return json.loads(r.to_json())
+
+            # Let every segment finish before the segment files are removed
+            results = await asyncio.gather(
+                *map(transcribe_segment, paths), return_exceptions=True
+            )
+        finally:
+            shutil.rmtree(segment_dir, ignore_errors=True)
+
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            raise errors[0]
+        merged = merge_transcripts(results, [start for start, _ in segments])
+        return json.dumps(merged, indent=4)
+
+
+def _write_file(path, content):
+    # Write then rename, so a crash never leaves a truncated transcript behind
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
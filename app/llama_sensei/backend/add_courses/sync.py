@@ -0,0 +1,100 @@
+import glob
+import os
+from typing import Dict, List, Set
+
+DURATION_TOLERANCE = 1.0  # secs, larger differences mean the video was replaced
+
+
+def _changed(entry: Dict, recorded: Dict) -> bool:
+    if not recorded:
+        return False
+    before, after = recorded.get("duration"), entry.get("duration")
+    if not isinstance(before, (int, float)) or not isinstance(after, (int, float)):
+        return False
+    return abs(before - after) > DURATION_TOLERANCE
+
+
+def plan_sync(
+    entries: List[Dict], recorded: List[Dict], indexed: Set[str]
+) -> Dict[str, List[str]]:
+    """
+    Compare the playlist with what a course already holds.
+
+    entries are the playlist videos (id, url, duration), recorded the
+    playlist_metadata.json entries and indexed the video ids in the vector db.
+    Returns the video ids that are new (not indexed yet), changed (indexed,
+    but the duration no longer matches), unchanged, and removed (indexed or
+    recorded, but gone from the playlist).
+    """
+    recorded_by_id = {video.get("id"): video for video in recorded}
+    plan = {"new": [], "changed": [], "unchanged": [], "removed": []}
+    for entry in entries:
+        if entry["id"] not in indexed:
+            plan["new"].append(entry["id"])
+        elif _changed(entry, recorded_by_id.get(entry["id"])):
+            plan["changed"].append(entry["id"])
+        else:
+            plan["unchanged"].append(entry["id"])
+
+    playlist_ids = {entry["id"] for entry in entries}
+    known_ids = set(indexed) | {video_id for video_id in recorded_by_id if video_id}
+    plan["removed"] = sorted(known_ids - playlist_ids)
+    return plan
+
+
+class CourseSync:
+    """
+    Bring a course in line with its playlist: work out which videos need
+    (re)processing and drop the ones that are stale, so only those go through
+    the ingestion pipeline (see CourseManifest.resume for where each restarts).
+    """
+
+    def __init__(
+        self, downloader, stt_client, vector_db, collection_name, manifest=None
+    ):
+        self.downloader = downloader
+        self.stt_client = stt_client
+        self.vector_db = vector_db
+        self.collection_name = collection_name
+        self.manifest = manifest
+
+    def _drop(self, video_ids: List[str]):
+        # Remove the chunks, transcripts and audio of each video: the raw
+        # transcript and every copy named after it (the compact paragraphs)
+        for video_id in video_ids:
+            self.vector_db.delete_video(self.collection_name, video_id)
+            transcript_file = self.stt_client.transcript_path(video_id)
+            for path in [
+                *glob.glob(glob.escape(os.path.splitext(transcript_file)[0]) + ".*"),
+                self.downloader.audio_path(video_id),
+            ]:
+                if os.path.exists(path):
+                    os.remove(path)
+        if self.manifest is not None and video_ids:
+            self.manifest.forget(video_ids)
+
+    def prepare(self, entries: List[Dict], delete_removed=False) -> Dict:
+        """
+        Returns the plan and the playlist entries that are new or changed,
+        the only ones left to ingest.
+        """
+        entries = [entry for entry in entries if entry.get("id")]
+        plan = plan_sync(
+            entries,
+            self.downloader.load_metadata(),
+            self.vector_db.get_video_ids(self.collection_name),
+        )
+        print(
+            f"Sync {self.collection_name}: "
+            + ", ".join(f"{len(ids)} {kind}" for kind, ids in plan.items())
+        )
+
+        if delete_removed and plan["removed"]:
+            self._drop(plan["removed"])
+            self.downloader.forget_videos(plan["removed"])
+
+        # A replaced video is transcribed again from fresh audio
+        self._drop(plan["changed"])
+
+        todo = set(plan["new"]) | set(plan["changed"])
+        return {"plan": plan, "entries": [e for e in entries if e["id"] in todo]}
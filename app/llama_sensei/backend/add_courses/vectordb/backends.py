@@ -0,0 +1,115 @@
+import os
+from typing import Dict
+
+from .lexical_index import LexicalIndex
+from .numpy_vector_db import NumpyVectorDB
+from .result_cache import SearchResultCache
+from .vector_db_operations import ChromaVectorDB, VectorDBOperations
+
+# Engine of the collections: "chroma" (HNSW index) or "numpy" (exact search)
+VECTOR_DB_BACKEND = os.getenv("VECTOR_DB_BACKEND", "chroma")
+# Engine of single collections, e.g. "cs229_stanford:numpy,big_course:chroma"
+VECTOR_DB_COLLECTION_BACKENDS = os.getenv("VECTOR_DB_COLLECTION_BACKENDS", "")
+BACKENDS = {"chroma": ChromaVectorDB, "numpy": NumpyVectorDB}
+
+
+def parse_collection_backends(value: str) -> Dict[str, str]:
+    collection_backends = {}
+    for item in value.split(","):
+        if item.strip():
+            collection_name, backend = item.split(":")
+            collection_backends[collection_name.strip()] = backend.strip()
+    return collection_backends
+
+
+class RoutedVectorDB(VectorDBOperations):
+    """
+    Serves every collection from the engine chosen for it in
+    `collection_backends`, the `default` one otherwise. The result cache and
+    lexical index are shared by all of them.
+    """
+
+    def __init__(
+        self,
+        stores: Dict[str, VectorDBOperations],
+        default: str,
+        collection_backends: Dict[str, str],
+        result_cache: SearchResultCache = None,
+        lexical_index: LexicalIndex = None,
+    ):
+        super().__init__(result_cache=result_cache, lexical_index=lexical_index)
+        self.stores = stores
+        self.default = default
+        self.collection_backends = collection_backends
+
+    def backend(self, collection_name) -> str:
+        return self.collection_backends.get(collection_name, self.default)
+
+    def _store(self, collection_name) -> VectorDBOperations:
+        return self.stores[self.backend(collection_name)]
+
+    def _create_collection(self, collection_name):
+        self._store(collection_name)._create_collection(collection_name)
+
+    def _upsert(
+        self, collection_name, documents, embeddings, metadatas, ids, batch_size
+    ):
+        self._store(collection_name)._upsert(
+            collection_name, documents, embeddings, metadatas, ids, batch_size
+        )
+
+    def _query(self, collection_name, query_embeddings, top_k, filters=None):
+        return self._store(collection_name)._query(
+            collection_name, query_embeddings, top_k, filters
+        )
+
+    def _get(self, collection_name, ids=None, include=(), limit=None, offset=0):
+        return self._store(collection_name)._get(
+            collection_name, ids, include, limit, offset
+        )
+
+    def _delete_video(self, collection_name, video_id):
+        self._store(collection_name)._delete_video(collection_name, video_id)
+
+    def _delete_collection(self, collection_name):
+        self._store(collection_name)._delete_collection(collection_name)
+
+    def get_collections(self):
+        # A collection left in an engine it is no longer routed to is hidden
+        return sorted(
+            collection_name
+            for backend, store in self.stores.items()
+            for collection_name in store.get_collections()
+            if self.backend(collection_name) == backend
+        )
+
+
+def open_vector_db(
+    save_path,
+    backend: str = VECTOR_DB_BACKEND,
+    collection_backends: Dict[str, str] = None,
+    result_cache: SearchResultCache = None,
+    lexical_index: LexicalIndex = None,
+) -> VectorDBOperations:
+    """
+    The vector store of the deployment: `backend` for every collection, except
+    those given another engine in `collection_backends` (by default parsed
+    from VECTOR_DB_COLLECTION_BACKENDS).
+    """
+    if collection_backends is None:
+        collection_backends = parse_collection_backends(VECTOR_DB_COLLECTION_BACKENDS)
+    used = {backend, *collection_backends.values()}
+    unknown = used - set(BACKENDS)
+    if unknown:
+        raise ValueError(f"Unknown vector db backends: {sorted(unknown)}")
+    if used == {backend}:
+        return BACKENDS[backend](
+            save_path, result_cache=result_cache, lexical_index=lexical_index
+        )
+    return RoutedVectorDB(
+        {name: BACKENDS[name](save_path) for name in used},
+        backend,
+        collection_backends,
+        result_cache=result_cache,
+        lexical_index=lexical_index,
+    )
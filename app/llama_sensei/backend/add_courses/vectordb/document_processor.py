@@ -1,52 +1,183 @@
+import os
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List
+
+import numpy as np
+
+from .embedding_cache import EmbeddingCache
 from .get_embedding import Embedder
 from .load_text import TranscriptLoader
 from .preprocessing_text import TextPreprocessor
+from .query_cache import QueryEmbeddingCache
 from .vector_db_operations import VectorDBOperations
 
+# Chunks preprocessed, embedded and written at a time, bounding the memory used
+# per document whatever its length
+PROCESS_WINDOW_SIZE = int(os.getenv("PROCESS_WINDOW_SIZE", 256))
+# Micro-batches per worker process in a window: a window of fewer leaves most
+# of the pool idle, since each window waits on the one before it
+WINDOW_BATCHES_PER_WORKER = 4
+
+
+def ingestion_window_size(embedder: Embedder, text_processor: TextPreprocessor) -> int:
+    """
+    Chunks per window for these models: PROCESS_WINDOW_SIZE, or more when
+    they run worker pools, so that every embedding (or preprocessing) process
+    gets WINDOW_BATCHES_PER_WORKER micro-batches of every window.
+    """
+    workers = max(embedder.workers, text_processor.workers, 1)
+    return max(
+        PROCESS_WINDOW_SIZE,
+        workers * embedder.batch_size * WINDOW_BATCHES_PER_WORKER,
+    )
+
 
 class DocumentProcessor:
     def __init__(
-        self, vector_db: VectorDBOperations, collection_name: str, search_only: bool
+        self,
+        vector_db: VectorDBOperations,
+        collection_name: str,
+        search_only: bool,
+        text_processor: TextPreprocessor = None,
+        embedder: Embedder = None,
+        cache: EmbeddingCache = None,
+        query_cache: QueryEmbeddingCache = None,
+        window_size: int = PROCESS_WINDOW_SIZE,
     ):
-        self.text_processor = TextPreprocessor()
+        # Reuse shared (already loaded) models when given, see ModelRegistry
+        if text_processor is None:
+            text_processor = TextPreprocessor()
+        if embedder is None:
+            embedder = Embedder()
+        self.text_processor = text_processor
         self.vector_db = vector_db
-        self.embedder = Embedder()
+        self.embedder = embedder
+        self.cache = cache
+        self.cache_stats = {"hits": 0, "misses": 0}
+        self.query_cache = query_cache
+        self.window_size = window_size  # see ingestion_window_size
         if search_only is False:
             self.vector_db.create_collection(collection_name)
         self.collection_name = collection_name
 
-    def process_document(self, path, metadata, num_st_each_chunk=3):
-        # load data
-        transcriptLoader = TranscriptLoader(path)
+    def process_document(
+        self, path, metadata, num_st_each_chunk=3, window_size=None
+    ) -> int:
+        """
+        Index a transcript and return its number of chunks. Paragraphs stream
+        from the loader and are merged into chunks lazily; every window of
+        `window_size` (default self.window_size) chunks is preprocessed, embedded and written before the
+        next one is built. Chunk ids ({video_id}_{i}) run on across windows.
+        """
+        paragraphs = TranscriptLoader(path).iter_paragraphs()
+        if paragraphs is None:
+            raise ValueError(f"Could not load transcript {path}")
+        chunks = self.iter_chunks(paragraphs, num_st_each_chunk)
+        window_size = window_size or self.window_size
 
-        # Preprocess
-        sentences = transcriptLoader.load_data()
-        chunks = [
-            self.text_processor.merge_text(
-                sentences[i : min(i + num_st_each_chunk, len(sentences))]
-            )
-            for i in range(0, len(sentences), num_st_each_chunk)
-        ]
+        num_chunks = 0
+        while window := list(islice(chunks, window_size)):
+            self._process_window(window, metadata, first_id=num_chunks)
+            num_chunks += len(window)
+        return num_chunks
+
+    def iter_chunks(
+        self, paragraphs: Iterable[tuple], num_st_each_chunk=3
+    ) -> Iterator[tuple]:
+        # Merge every num_st_each_chunk consecutive paragraphs into one chunk
+        paragraphs = iter(paragraphs)
+        while group := list(islice(paragraphs, num_st_each_chunk)):
+            yield self.text_processor.merge_text(group)
+
+    def _process_window(self, chunks: List[tuple], metadata: Dict, first_id: int):
         preprocessed_chunks = self.text_processor.preprocess_text(chunks)
 
-        # embed
-        chunks_with_embed = self.embedder.embed_chunks(preprocessed_chunks)
+        # embed, one row per chunk
+        embeddings = self.embed_chunks(preprocessed_chunks)
 
-        # store each chunk
-        for i, chunk in enumerate(chunks_with_embed):
-            chunk_metadata = {**metadata, 'start': chunk[2], 'end': chunk[3]}
-            self.vector_db.add_embedding(
-                self.collection_name,
-                chunks[i][0],  # raw text
-                chunk[1],
-                chunk_metadata,
-                f"{metadata['video_id']}_{i}",
+        # store the window's chunks in bulk
+        written = self.vector_db.add_embeddings(
+            self.collection_name,
+            documents=[chunk[0] for chunk in chunks],  # raw text
+            embeddings=embeddings,
+            metadatas=[
+                {**metadata, 'start': chunk[1], 'end': chunk[2]}
+                for chunk in preprocessed_chunks
+            ],
+            ids=[
+                f"{metadata['video_id']}_{i}"
+                for i in range(first_id, first_id + len(chunks))
+            ],
+            texts=[chunk[0] for chunk in preprocessed_chunks],  # lexical index
+        )
+        if not written:
+            # Fails the video, so it is not recorded as indexed and gets retried
+            raise RuntimeError(
+                f"Could not write the chunks of {metadata['video_id']} "
+                f"to {self.collection_name}"
             )
 
-    def search(self, query, top_k=5):
-        query_embedding = self.embedder.embed(self.text_processor._preprocess(query))
+    def embed_chunks(self, chunks) -> np.ndarray:
+        # Only chunks missing from the embedding cache go through the model
+        if self.cache is None:
+            return self.embedder.embed_chunks(chunks)
+        texts = [chunk[0] for chunk in chunks]
+        embeddings, missing = self.cache.get_many(texts)
+        if missing:
+            computed = self.embedder.embed_texts([texts[i] for i in missing])
+            embeddings[missing] = computed
+            self.cache.put_many([texts[i] for i in missing], computed)
+        self.cache_stats["hits"] += len(texts) - len(missing)
+        self.cache_stats["misses"] += len(missing)
+        return embeddings
+
+    def search(self, query, top_k=5, filters=None, mode="vector"):
+        # mode "hybrid" fuses the vector search with BM25, see search_hybrid
+        text = self.text_processor._preprocess(query)
+        if self.query_cache is None:
+            query_embedding = self.embedder.embed(text)
+        else:
+            query_embedding = self.embed_preprocessed([text])[0]
+        if mode == "hybrid":
+            return self.vector_db.search_hybrid(
+                self.collection_name,
+                query_embedding,
+                text,
+                top_k,
+                filters=filters,
+            )
         return self.vector_db.search_embeddings(
-            self.collection_name, query_embedding, top_k
+            self.collection_name, query_embedding, top_k, filters=filters
+        )
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        # One forward pass for the whole batch, one row per query
+        return self.embed_preprocessed(
+            [self.text_processor._preprocess(query) for query in queries]
+        )
+
+    def embed_preprocessed(self, texts: List[str]) -> np.ndarray:
+        # embed_queries for queries already through the text processor
+        if self.query_cache is None:
+            return self._encode_queries(texts)
+
+        # Only queries missing from the query cache go through the model
+        cached = self.query_cache.get_many(texts)
+        missing = [i for i, embedding in enumerate(cached) if embedding is None]
+        if missing:
+            computed = self._encode_queries([texts[i] for i in missing])
+            self.query_cache.put_many([texts[i] for i in missing], computed)
+            for i, embedding in zip(missing, computed):
+                cached[i] = embedding
+        return np.vstack(cached).astype(np.float32, copy=False)
+
+    def _encode_queries(self, texts: List[str]) -> np.ndarray:
+        embeddings = self.embedder.embed(texts, batch_size=max(1, len(texts)))
+        return np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
+
+    def search_batch(self, queries: List[str], top_k=5, filters=None):
+        return self.vector_db.search_embeddings_batch(
+            self.collection_name, self.embed_queries(queries), top_k, filters=filters
         )
 
     def erase_all_data(self):
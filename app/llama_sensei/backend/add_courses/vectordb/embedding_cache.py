@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+DEFAULT_CACHE_ENTRIES = int(os.getenv("EMBEDDING_CACHE_ENTRIES", 200_000))
+KEY_SIZE = 16  # bytes of blake2b digest per cached text
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of chunk embeddings, keyed by (model name, hash of the
+    preprocessed text).
+
+    Vectors live in a float32 memory-mapped file of `max_entries` rows, next
+    to two memory-mapped index arrays: the key of every slot and when it was
+    last used. The least recently used entries are evicted once the cache is
+    full. One directory per model; a cache whose dimension or size does not
+    match is started afresh. Meant for a single process (the course service).
+    """
+
+    def __init__(
+        self, cache_dir, model_name, dimension, max_entries=DEFAULT_CACHE_ENTRIES
+    ):
+        self.model_name = model_name
+        self.dimension = dimension
+        self.capacity = max_entries
+        self.path = os.path.join(cache_dir, re.sub(r"[^\w.-]", "_", model_name))
+        os.makedirs(self.path, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        fresh = not self._matches_meta()
+        self._vectors = self._open(
+            "vectors.f32", np.float32, (max_entries, dimension), fresh
+        )
+        self._keys = self._open("keys.bin", np.uint8, (max_entries, KEY_SIZE), fresh)
+        self._used = self._open("used.bin", np.int64, (max_entries,), fresh)
+        if fresh:
+            self._write_meta()
+
+        # used == 0 marks an empty slot, otherwise it is a logical clock
+        occupied = np.flatnonzero(self._used)
+        self._slots: Dict[bytes, int] = {
+            self._keys[slot].tobytes(): int(slot) for slot in occupied
+        }
+        self._free: List[int] = np.flatnonzero(self._used == 0)[::-1].tolist()
+        self._clock = int(self._used.max())
+
+    def _meta(self) -> Dict:
+        return {
+            "model_name": self.model_name,
+            "dimension": self.dimension,
+            "capacity": self.capacity,
+        }
+
+    def _matches_meta(self) -> bool:
+        try:
+            with open(os.path.join(self.path, "meta.json")) as f:
+                return json.load(f) == self._meta()
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+
+    def _write_meta(self):
+        tmp_file = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp_file, "w") as f:
+            json.dump(self._meta(), f)
+        os.replace(tmp_file, os.path.join(self.path, "meta.json"))
+
+    def _open(self, name, dtype, shape, fresh):
+        mode = (
+            "w+" if fresh or not os.path.exists(os.path.join(self.path, name)) else "r+"
+        )
+        return np.memmap(
+            os.path.join(self.path, name), dtype=dtype, mode=mode, shape=shape
+        )
+
+    def key(self, text: str) -> bytes:
+        digest = hashlib.blake2b(digest_size=KEY_SIZE)
+        digest.update(self.model_name.encode())
+        digest.update(b"\0")
+        digest.update(text.encode())
+        return digest.digest()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def get_many(self, texts: List[str]) -> Tuple[np.ndarray, List[int]]:
+        """
+        Look texts up. Returns a (len(texts), dim) matrix holding the cached
+        rows and the indices of the texts that were not cached (their rows are
+        left uninitialised).
+        """
+        keys = [self.key(text) for text in texts]
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                slot = self._slots.get(key)
+                if slot is None:
+                    missing.append(i)
+                    continue
+                embeddings[i] = self._vectors[slot]
+                self._used[slot] = self._tick()
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+        return embeddings, missing
+
+    def put_many(self, texts: List[str], embeddings: np.ndarray):
+        new = {}
+        for text, embedding in zip(texts, embeddings):
+            new[self.key(text)] = embedding
+        with self._lock:
+            new = [(k, v) for k, v in new.items() if k not in self._slots]
+            new = new[-self.capacity :]
+            self._evict(len(new) - len(self._free))
+            # Each array reaches the disk before the next one is touched, so a
+            # crash never leaves a slot marked used whose key or vector is not
+            # written yet: evicted slots are freed first, then the vectors go
+            # in, then the keys, and last the used clock that makes them valid
+            self._used.flush()
+            if not new:
+                return
+            slots = [self._free.pop() for _ in new]
+            self._vectors[slots] = np.stack([embedding for _, embedding in new])
+            self._vectors.flush()
+            for slot, (key, _) in zip(slots, new):
+                self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+            self._keys.flush()
+            for slot, (key, _) in zip(slots, new):
+                self._used[slot] = self._tick()
+                self._slots[key] = slot
+            self._used.flush()
+
+    def _evict(self, count: int):
+        if count <= 0:
+            return
+        occupied = np.fromiter(self._slots.values(), dtype=np.int64)
+        oldest = occupied[np.argpartition(self._used[occupied], count - 1)[:count]]
+        for slot in oldest.tolist():
+            del self._slots[self._keys[slot].tobytes()]
+            self._used[slot] = 0
+            self._free.append(slot)
+        self.evictions += count
+
+    def flush(self):
+        self._vectors.flush()
+        self._keys.flush()
+        self._used.flush()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._slots),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
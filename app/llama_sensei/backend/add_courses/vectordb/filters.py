@@ -0,0 +1,57 @@
+from typing import Dict, List
+
+import numpy as np
+
+
+class MetadataColumns:
+    """
+    The metadata of a list of chunks as columns, to apply search filters
+    (video_ids, start_after, end_before and metadata equalities, see
+    chroma_where) with numpy instead of the vector db. A chunk lacking the
+    filtered field never matches, as in Chroma.
+    """
+
+    def __init__(self, metadatas: List[Dict]):
+        self.metadatas = metadatas
+        self.video_ids = np.array(
+            [metadata.get("video_id") for metadata in metadatas], dtype=object
+        )
+        self.starts = np.array(
+            [metadata.get("start", np.nan) for metadata in metadatas], dtype=float
+        )
+        self.ends = np.array(
+            [metadata.get("end", np.nan) for metadata in metadatas], dtype=float
+        )
+
+    def extend(self, metadatas: List[Dict]):
+        # Columns of appended chunks, without going over the others again
+        added = MetadataColumns(metadatas)
+        self.metadatas.extend(metadatas)
+        self.video_ids = np.concatenate([self.video_ids, added.video_ids])
+        self.starts = np.concatenate([self.starts, added.starts])
+        self.ends = np.concatenate([self.ends, added.ends])
+
+    def update(self, rows: List[int], metadatas: List[Dict]):
+        # New metadata of the chunks at these rows
+        if not rows:
+            return
+        updated = MetadataColumns(metadatas)
+        for row, metadata in zip(rows, metadatas):
+            self.metadatas[row] = metadata
+        self.video_ids[rows] = updated.video_ids
+        self.starts[rows] = updated.starts
+        self.ends[rows] = updated.ends
+
+    def mask(self, filters: Dict) -> np.ndarray:
+        keep = np.ones(len(self.metadatas), dtype=bool)
+        if filters.get("video_ids"):
+            keep &= np.isin(self.video_ids, list(filters["video_ids"]))
+        if filters.get("start_after") is not None:
+            keep &= self.starts >= filters["start_after"]
+        if filters.get("end_before") is not None:
+            keep &= self.ends <= filters["end_before"]
+        for key, value in (filters.get("metadata") or {}).items():
+            keep &= np.array(
+                [metadata.get(key) == value for metadata in self.metadatas], dtype=bool
+            )
+        return keep
@@ -1,21 +1,159 @@
-from typing import List
+import os
+import threading
+import time
+from typing import Dict, List
 
+import numpy as np
 import torch
 from sentence_transformers import SentenceTransformer
 
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L12-v2"
+DEFAULT_BATCH_SIZE = 64
+# CPU processes encoding in parallel during ingestion (0 or 1 = in process)
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", 0))
+
+
+def _encode_worker(threads, device, model, input_queue, output_queue):
+    # Set in the worker itself: the service's environment is shared by the
+    # threads (and the processes they spawn) of every other job
+    torch.set_num_threads(threads)
+    SentenceTransformer._multi_process_worker(device, model, input_queue, output_queue)
+
+
+def start_encode_pool(model, workers: int, threads: int) -> Dict:
+    """
+    SentenceTransformer.start_multi_process_pool on `workers` CPU processes,
+    each limited to `threads` torch threads. Used with encode_multi_process
+    and stopped with stop_multi_process_pool like the original.
+    """
+    model.to("cpu")
+    model.share_memory()
+    ctx = torch.multiprocessing.get_context("spawn")
+    pool = {"input": ctx.Queue(), "output": ctx.Queue(), "processes": []}
+    for _ in range(workers):
+        process = ctx.Process(
+            target=_encode_worker,
+            args=(threads, "cpu", model, pool["input"], pool["output"]),
+            daemon=True,
+        )
+        process.start()
+        pool["processes"].append(process)
+    return pool
+
 
 class Embedder:
-    def __init__(self, model_name="all-MiniLM-L12-v2"):
+    def __init__(
+        self,
+        model_name=DEFAULT_EMBEDDING_MODEL,
+        batch_size=DEFAULT_BATCH_SIZE,
+        workers=EMBED_WORKERS,
+    ):
         device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = device
+        self.model_name = model_name
+        self.batch_size = batch_size
+        # A GPU is faster on its own than a pool of CPU processes
+        self.workers = workers if device == "cpu" else 0
         self.model = SentenceTransformer(model_name, trust_remote_code=True).to(device)
+        self.stats = {"chunks": 0, "seconds": 0.0}
+        # The fast tokenizer is not thread-safe, and ingestion jobs encode on
+        # worker threads while searches encode on the API thread
+        self.lock = threading.Lock()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def embed(self, doc, **kwargs):
+        with self.lock:
+            return self.model.encode(doc, **kwargs)
 
-    def embed(self, doc):
-        return self.model.encode(doc)
+    def embed_texts(self, texts: List[str], batch_size: int = None) -> np.ndarray:
+        """
+        Encode texts in micro-batches and return a (len(texts), dim) float32 matrix
+        whose rows follow the input order.
+        """
+        batch_size = batch_size or self.batch_size
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        if len(texts) == 0:
+            return embeddings
 
-    def embed_chunks(self, chunks: List[tuple], top_chunks: int = None) -> List[tuple]:
+        before = time.perf_counter()
+        # Longest texts first, so each micro-batch pads to a similar length
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        if self.workers > 1 and len(texts) > batch_size:
+            embeddings[order] = self._encode_in_pool(
+                [texts[i] for i in order], batch_size
+            )
+            self._record(len(texts), time.perf_counter() - before)
+            return embeddings
+        for start in range(0, len(order), batch_size):
+            batch_idx = order[start : start + batch_size]
+            # Locked per micro-batch, so searches can run in between
+            with self.lock:
+                embeddings[batch_idx] = self.model.encode(
+                    [texts[i] for i in batch_idx],
+                    batch_size=batch_size,
+                    convert_to_numpy=True,
+                )
+        self._record(len(texts), time.perf_counter() - before)
+        return embeddings
+
+    def _encode_in_pool(self, texts: List[str], batch_size: int) -> np.ndarray:
+        # Each worker gets whole micro-batches of the length-sorted texts
+        # (chunk_size=batch_size), the same batches the serial path encodes
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = self._start_pool()
+            return self.model.encode_multi_process(
+                texts, self._pool, batch_size=batch_size, chunk_size=batch_size
+            )
+
+    def _start_pool(self):
+        # Split the cores between the workers instead of every worker's torch
+        # spawning a thread per core
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        pool = start_encode_pool(self.model, self.workers, threads)
+        print(f"Started {self.workers} embedding processes ({threads} threads each)")
+        return pool
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self.model.stop_multi_process_pool(self._pool)
+                self._pool = None
+
+    def embed_chunks(
+        self, chunks: List[tuple], top_chunks: int = None, batch_size: int = None
+    ) -> np.ndarray:
         if top_chunks is None:
             top_chunks = len(chunks)
-        return [
-            (chunk[0], self.embed(chunk[0]), chunk[1], chunk[2])
-            for chunk in chunks[:top_chunks]
-        ]
+        return self.embed_texts(
+            [chunk[0] for chunk in chunks[:top_chunks]], batch_size=batch_size
+        )
+
+    def embed_documents(
+        self, documents: List[List[tuple]], batch_size: int = None
+    ) -> List[np.ndarray]:
+        # Encode the chunks of several documents in one pass, then split per document
+        if not documents:
+            return []
+        texts = [chunk[0] for chunks in documents for chunk in chunks]
+        embeddings = self.embed_texts(texts, batch_size=batch_size)
+        offsets = np.cumsum([len(chunks) for chunks in documents])[:-1]
+        return np.split(embeddings, offsets)
+
+    def throughput(self) -> float:
+        if self.stats["seconds"] == 0:
+            return 0.0
+        return self.stats["chunks"] / self.stats["seconds"]
+
+    def _record(self, num_chunks, seconds):
+        self.stats["chunks"] += num_chunks
+        self.stats["seconds"] += seconds
+        rate = num_chunks / seconds if seconds > 0 else float("inf")
+        print(
+            f"Embedded {num_chunks} chunks in {seconds:.2f} seconds ({rate:.1f} chunks/sec)"
+        )
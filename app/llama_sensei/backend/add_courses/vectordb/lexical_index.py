@@ -0,0 +1,255 @@
+import json
+import os
+import re
+import shutil
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .filters import MetadataColumns
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60  # rank offset of reciprocal rank fusion, as in Cormack et al.
+
+_WORD = re.compile(r"\w")
+
+
+def tokenize(text: str) -> List[str]:
+    # Text already went through TextPreprocessor (stop words out, stemmed),
+    # so only drop the punctuation tokens it keeps
+    return [token.lower() for token in text.split() if _WORD.search(token)]
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[str]], k: int = RRF_K
+) -> List[Tuple[str, float]]:
+    """
+    Fuse several rankings of ids: every id scores the sum of 1 / (k + rank)
+    over the rankings it appears in. Best first, ties in order of appearance.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, id in enumerate(ranking, start=1):
+            scores[id] = scores.get(id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+def _file_version(stat: os.stat_result) -> Tuple[int, int, int]:
+    # build() replaces index.json, so the inode changes even when the mtime
+    # resolution is too coarse to tell two builds apart
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class _CourseIndex:
+    """
+    The BM25 index of one collection as built by LexicalIndex.build: the
+    postings (chunk rows) and their precomputed BM25 weights, concatenated term
+    after term and memory-mapped, plus the term -> [start, end) spans.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, "index.json")) as f:
+            self.version = _file_version(os.fstat(f.fileno()))
+            index = json.load(f)
+        self.terms: Dict[str, List[int]] = index["terms"]
+        self.ids: List[str] = index["ids"]
+        self.columns = MetadataColumns(index["metadatas"])
+        self.postings = np.load(os.path.join(path, "postings.npy"), mmap_mode="r")
+        self.weights = np.load(os.path.join(path, "weights.npy"), mmap_mode="r")
+
+    def search(self, terms: List[str], top_k: int, filters: Dict = None):
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(terms):
+            span = self.terms.get(term)
+            if span is None:
+                continue
+            start, end = span
+            # A chunk appears once per term, so the fancy += does not lose hits
+            scores[self.postings[start:end]] += self.weights[start:end]
+        if filters:
+            scores[~self.columns.mask(filters)] = 0.0
+
+        rows = np.flatnonzero(scores > 0)
+        if len(rows) > top_k:
+            rows = rows[np.argpartition(-scores[rows], top_k - 1)[:top_k]]
+        rows = rows[np.lexsort((rows, -scores[rows]))]
+        return [(self.ids[row], float(scores[row])) for row in rows]
+
+
+class LexicalIndex:
+    """
+    BM25 inverted indexes of the preprocessed chunk text, one per collection,
+    under {save_path}/lexical_index/{collection}.
+
+    Ingestion appends every chunk (id, preprocessed text, metadata) to
+    chunks.jsonl, the source of the index; re-adding an id replaces it, like
+    the vector db upsert. Appended chunks are searchable once build() is called,
+    at the end of an ingestion job: it compacts chunks.jsonl to the last write
+    of every id and rewrites postings.npy and weights.npy (memory-mapped when
+    searched) and index.json (terms, ids and metadata). Searches only load the
+    last build, again whenever index.json was replaced since, e.g. by
+    scripts/build_lexical_index.py in another process. The text is tokenized by whitespace, so queries must be
+    preprocessed the same way as the chunks.
+    """
+
+    def __init__(self, save_path, k1: float = BM25_K1, b: float = BM25_B):
+        self.path = os.path.join(save_path, "lexical_index")
+        self.k1 = k1
+        self.b = b
+        self._indexes: Dict[str, _CourseIndex] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock(self, collection_name) -> threading.Lock:
+        # One per course: writing a course never holds up the others
+        with self._locks_lock:
+            return self._locks.setdefault(collection_name, threading.Lock())
+
+    def _course_path(self, collection_name) -> str:
+        return os.path.join(self.path, collection_name)
+
+    def _source(self, collection_name) -> str:
+        return os.path.join(self._course_path(collection_name), "chunks.jsonl")
+
+    def add(
+        self,
+        collection_name,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[Dict],
+    ):
+        with self._lock(collection_name):
+            os.makedirs(self._course_path(collection_name), exist_ok=True)
+            with open(self._source(collection_name), "a") as f:
+                for id, text, metadata in zip(ids, texts, metadatas):
+                    f.write(
+                        json.dumps({"id": id, "text": text, "metadata": metadata})
+                        + "\n"
+                    )
+
+    def _read_chunks(self, collection_name) -> Dict[str, Dict]:
+        chunks = {}
+        with open(self._source(collection_name)) as f:
+            for line in f:
+                chunk = json.loads(line)
+                chunks[chunk["id"]] = chunk  # the last write of an id wins
+        return chunks
+
+    def delete_video(self, collection_name, video_id):
+        # Rewrites the whole course anyway, so the index is rebuilt at once
+        with self._lock(collection_name):
+            if not os.path.exists(self._source(collection_name)):
+                return
+            chunks = self._read_chunks(collection_name)
+            self._build(
+                collection_name,
+                [
+                    chunk
+                    for chunk in chunks.values()
+                    if chunk["metadata"].get("video_id") != video_id
+                ],
+            )
+
+    def delete_collection(self, collection_name):
+        with self._lock(collection_name):
+            self._indexes.pop(collection_name, None)
+            shutil.rmtree(self._course_path(collection_name), ignore_errors=True)
+
+    def build(self, collection_name):
+        """
+        (Re)build the BM25 index of a collection from its chunks.jsonl, which
+        is compacted on the way. Nothing to do for a collection without chunks.
+        """
+        with self._lock(collection_name):
+            if not os.path.exists(self._source(collection_name)):
+                return
+            self._build(
+                collection_name, list(self._read_chunks(collection_name).values())
+            )
+
+    def _build(self, collection_name, chunks: List[Dict]):
+        path = self._course_path(collection_name)
+        # One (term id, row, term frequency) triple per distinct term of a chunk
+        term_ids: Dict[str, int] = {}
+        triples = []
+        lengths = np.zeros(len(chunks), dtype=np.float32)
+        for row, chunk in enumerate(chunks):
+            tokens = tokenize(chunk["text"])
+            lengths[row] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                triples.append((term_ids.setdefault(term, len(term_ids)), row, tf))
+        triples = np.array(triples, dtype=np.int64).reshape(-1, 3)
+        avg_length = float(lengths.mean()) if len(chunks) and lengths.any() else 1.0
+
+        # Grouped by term, rows ascending within a term
+        triples = triples[np.lexsort((triples[:, 1], triples[:, 0]))]
+        rows, tfs = triples[:, 1], triples[:, 2].astype(np.float32)
+        dfs = np.bincount(triples[:, 0], minlength=len(term_ids))
+        ends = np.cumsum(dfs)
+        idf = np.log1p((len(chunks) - dfs + 0.5) / (dfs + 0.5))[triples[:, 0]]
+        norm = self.k1 * (1 - self.b + self.b * lengths[rows] / avg_length)
+        postings = [rows.astype(np.int32)]
+        weights = [(idf * tfs * (self.k1 + 1) / (tfs + norm)).astype(np.float32)]
+        terms = {
+            term: [int(ends[id] - dfs[id]), int(ends[id])]
+            for term, id in term_ids.items()
+        }
+
+        # The source compacted first, then the arrays: index.json goes last
+        tmp_file = self._source(collection_name) + ".tmp"
+        with open(tmp_file, "w") as f:
+            f.writelines(json.dumps(chunk) + "\n" for chunk in chunks)
+        os.replace(tmp_file, self._source(collection_name))
+        for name, arrays, dtype in (
+            ("postings.npy", postings, np.int32),
+            ("weights.npy", weights, np.float32),
+        ):
+            tmp_file = os.path.join(path, name + ".tmp")
+            with open(tmp_file, "wb") as f:
+                np.save(f, np.concatenate(arrays).astype(dtype))
+            os.replace(tmp_file, os.path.join(path, name))
+        tmp_file = os.path.join(path, "index.json.tmp")
+        with open(tmp_file, "w") as f:
+            f.write(
+                json.dumps(
+                    {
+                        "terms": terms,
+                        "ids": [chunk["id"] for chunk in chunks],
+                        "metadatas": [chunk["metadata"] for chunk in chunks],
+                    }
+                )
+            )
+        os.replace(tmp_file, os.path.join(path, "index.json"))
+        self._indexes[collection_name] = _CourseIndex(path)
+
+    def _index(self, collection_name) -> Optional[_CourseIndex]:
+        # The last build, loaded on first use and reloaded once index.json is
+        # replaced: one stat per search, searches never rebuild
+        path = self._course_path(collection_name)
+        try:
+            version = _file_version(os.stat(os.path.join(path, "index.json")))
+        except FileNotFoundError:
+            return None
+        index = self._indexes.get(collection_name)
+        if index is None or index.version != version:
+            with self._lock(collection_name):
+                index = self._indexes.get(collection_name)
+                if index is None or index.version != version:
+                    index = self._indexes[collection_name] = _CourseIndex(path)
+        return index
+
+    def search(
+        self, collection_name, query_text: str, top_k: int = 5, filters: Dict = None
+    ) -> List[Tuple[str, float]]:
+        """
+        The (id, BM25 score) of the best top_k chunks holding a term of the
+        preprocessed query, best first, as of the last build. Empty for a
+        collection never built.
+        """
+        index = self._index(collection_name)
+        if index is None:
+            return []
+        return index.search(tokenize(query_text), top_k, filters)
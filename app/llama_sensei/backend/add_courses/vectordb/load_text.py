@@ -1,10 +1,46 @@
+import gzip
 import json
+import os
+from typing import Dict, Iterable, Iterator
+
+# Paragraph-only copy of a Deepgram transcript: gzipped JSON lines, a header
+# {"format", "version", "metadata"} then one [text, start, end] per paragraph
+COMPACT_SUFFIX = ".paragraphs.jsonl.gz"
+COMPACT_FORMAT = "paragraphs"
+COMPACT_VERSION = 1
+# Write the compact copy the first time a raw transcript is loaded for ingestion.
+# The raw file is kept (the manifest checks its checksum to resume), so the copy
+# saves load time and memory, not disk
+COMPACT_TRANSCRIPTS = os.getenv("COMPACT_TRANSCRIPTS", "true").lower() == "true"
+
+
+def compact_path(path: str) -> str:
+    if path.endswith(COMPACT_SUFFIX):
+        return path
+    return os.path.splitext(path)[0] + COMPACT_SUFFIX
+
+
+def write_compact(path: str, paragraphs: Iterable[tuple], metadata: Dict = None):
+    # Write then rename, like the raw transcripts
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        header = {
+            "format": COMPACT_FORMAT,
+            "version": COMPACT_VERSION,
+            "metadata": metadata or {},
+        }
+        f.write(json.dumps(header) + "\n")
+        for text, start, end in paragraphs:
+            f.write(json.dumps([text, start, end], ensure_ascii=False) + "\n")
+    os.replace(tmp_path, path)
 
 
 class TranscriptLoader:
-    def __init__(self, file_path):
+    def __init__(self, file_path, compact=COMPACT_TRANSCRIPTS):
         self.file_path = file_path
+        self.compact = compact  # write the compact copy when loading a raw file
         self.data = None
+        self.metadata = None
 
     def load_data(self, simple_output=False):
         try:
@@ -20,30 +56,100 @@ class TranscriptLoader:
             print(f"An error occurred: {str(e)}")
             return None
 
+        if not self.is_complete():
+            print("The file is not a complete transcript")
+            self.data = None
+            return None
+
         if simple_output:
             return self.data
 
         return self._process_data()
 
-    def _process_data(self):
-        if not self.data:
+    def is_complete(self):
+        # A truncated or failed response has no results to read paragraphs from
+        try:
+            return bool(self.data["results"]["channels"])
+        except (KeyError, TypeError):
+            return False
+
+    def iter_paragraphs(self):
+        """
+        Return an iterator of (text, start, end), one per paragraph, or None
+        if the transcript cannot be loaded.
+
+        A compact copy (see write_compact) at least as new as the raw file is
+        streamed line by line instead of parsing the raw JSON. Otherwise the
+        raw file is loaded and, if `compact` is set, its compact copy written.
+        """
+        compact_file = compact_path(self.file_path)
+        if self._compact_is_fresh(compact_file):
+            paragraphs = self._open_compact(compact_file)
+            if paragraphs is not None:
+                return paragraphs
+        if self.file_path == compact_file:
             return None
 
+        if self.load_data(simple_output=True) is None:
+            return None
+        if self.compact:
+            try:
+                write_compact(
+                    compact_file, self._iter_paragraphs(), self.get_metadata()
+                )
+            except Exception as e:
+                print(f"Could not write {compact_file}: {str(e)}")
+        return self._iter_paragraphs()
+
+    def _compact_is_fresh(self, compact_file: str) -> bool:
+        if not os.path.exists(compact_file):
+            return False
+        if compact_file == self.file_path or not os.path.exists(self.file_path):
+            return True
+        # A transcript redone after the copy was written makes it stale
+        return os.path.getmtime(compact_file) >= os.path.getmtime(self.file_path)
+
+    def _open_compact(self, compact_file: str):
+        try:
+            f = gzip.open(compact_file, "rt", encoding="utf-8")
+            header = json.loads(f.readline())
+            if (header.get("format"), header.get("version")) != (
+                COMPACT_FORMAT,
+                COMPACT_VERSION,
+            ):
+                f.close()
+                print(f"Unknown compact transcript format in {compact_file}")
+                return None
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"Could not read {compact_file}: {str(e)}")
+            return None
+        self.metadata = header.get("metadata")
+        return self._iter_compact(f)
+
+    @staticmethod
+    def _iter_compact(f) -> Iterator[tuple]:
+        with f:
+            for line in f:
+                text, start, end = json.loads(line)
+                yield (text, start, end)
+
+    def _iter_paragraphs(self):
         paragraphs = self.data["results"]["channels"][0]["alternatives"][0][
             "paragraphs"
         ]["paragraphs"]
-        doc = []
         for paragraph in paragraphs:
             text = " ".join([sentence["text"] for sentence in paragraph["sentences"]])
-            start = paragraph["start"]
-            end = paragraph["end"]
-            doc.append((text, start, end))
-        return doc
+            yield (text, paragraph["start"], paragraph["end"])
+
+    def _process_data(self):
+        if not self.data:
+            return None
+        return list(self._iter_paragraphs())
 
     def get_metadata(self):
         if self.data:
             return self.data.get("metadata")
-        return None
+        return self.metadata
 
 
 # Example usage:
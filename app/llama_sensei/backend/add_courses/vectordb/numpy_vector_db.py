@@ -0,0 +1,336 @@
+import json
+import os
+import re
+import shutil
+import threading
+from contextlib import nullcontext
+from typing import Dict, List
+
+import numpy as np
+
+from .filters import MetadataColumns
+from .lexical_index import LexicalIndex
+from .result_cache import SearchResultCache
+from .vector_db_operations import VectorDBOperations
+
+# Chroma's rule, so that a course can be served by either engine
+COLLECTION_NAME = re.compile(r"[A-Za-z0-9][\w.-]{1,510}[A-Za-z0-9]")
+
+
+def _norms(vectors: np.ndarray) -> np.ndarray:
+    # Row norms to divide the similarities by, 1 for zero vectors
+    norms = np.linalg.norm(vectors, axis=1)
+    return np.where(norms > 0, norms, 1.0).astype(np.float32)
+
+
+class _Collection:
+    """
+    One collection on disk: vectors.f32 holds the float32 embedding of every
+    chunk, row after row, and chunks.jsonl the id, document and metadata of
+    the rows. New ids are appended to both, vectors first; a replaced id keeps
+    its row, which is overwritten in place, and its line is appended again
+    (replayed over the earlier ones on load). Deleting chunks rewrites both
+    files. Loading repairs what a crash in the middle of an upsert leaves: a
+    cut last line and more (or fewer) vector rows than chunks.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()  # held by NumpyVectorDB around every call
+        with open(os.path.join(path, "meta.json")) as f:
+            self.dimension = json.load(f)["dimension"]  # None until the first upsert
+        self._load()
+        self._map()
+
+    def _file(self, name) -> str:
+        return os.path.join(self.path, name)
+
+    def _replay(self, chunks: List[Dict]):
+        self.ids, self.documents, self.metadatas, self.rows = [], [], [], {}
+        for chunk in chunks:
+            self._set(chunk)
+
+    def _load(self):
+        with open(self._file("chunks.jsonl"), "rb") as f:
+            data = f.read()
+        # A line cut short by a crash was never acknowledged: drop it
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            os.truncate(self._file("chunks.jsonl"), complete)
+        chunks = [json.loads(line) for line in data[:complete].splitlines()]
+        self._replay(chunks)
+
+        row_size = (self.dimension or 0) * 4
+        stored = (
+            os.path.getsize(self._file("vectors.f32")) // row_size if row_size else 0
+        )
+        if stored < len(self.ids):
+            # Chunks written without their vector (the file system reordered
+            # the writes): dropped, to be ingested again
+            chunks = [chunk for chunk in chunks if self.rows[chunk["id"]] < stored]
+            tmp_file = self._file("chunks.jsonl.tmp")
+            with open(tmp_file, "w") as f:
+                f.writelines(json.dumps(chunk) + "\n" for chunk in chunks)
+            os.replace(tmp_file, self._file("chunks.jsonl"))
+            self._replay(chunks)
+        # Rows (or part of one) appended by an upsert that never wrote its chunks
+        os.truncate(self._file("vectors.f32"), len(self.ids) * row_size)
+
+    def _set(self, chunk: Dict):
+        row = self.rows.get(chunk["id"])
+        if row is None:
+            self.rows[chunk["id"]] = len(self.ids)
+            self.ids.append(chunk["id"])
+            self.documents.append(chunk["document"])
+            self.metadatas.append(chunk["metadata"])
+        else:
+            # Metadata keys are updated, the others kept, as in Chroma
+            self.documents[row] = chunk["document"]
+            self.metadatas[row] = {**self.metadatas[row], **chunk["metadata"]}
+
+    def _map_vectors(self):
+        if self.ids:
+            self.vectors = np.memmap(
+                self._file("vectors.f32"),
+                dtype=np.float32,
+                mode="r",
+                shape=(len(self.ids), self.dimension),
+            )
+        else:
+            self.vectors = np.zeros((0, self.dimension or 0), dtype=np.float32)
+
+    def _map(self):
+        # (Re)map the vectors with what searches need, over every row: on load
+        # and after a delete; an upsert only adds its rows, see upsert
+        self._map_vectors()
+        self.norms = _norms(self.vectors)
+        self.columns = MetadataColumns(list(self.metadatas))
+
+    def upsert(self, documents, embeddings: np.ndarray, metadatas, ids):
+        if len(set(ids)) != len(ids):
+            raise ValueError("Duplicate ids in upsert")
+        if self.dimension is None:
+            self.dimension = int(embeddings.shape[1])
+            with open(self._file("meta.json.tmp"), "w") as f:
+                json.dump({"dimension": self.dimension}, f)
+            os.replace(self._file("meta.json.tmp"), self._file("meta.json"))
+        if embeddings.shape[1] != self.dimension:
+            raise ValueError(
+                f"Embedding dimension {embeddings.shape[1]} does not match "
+                f"collection dimensionality {self.dimension}"
+            )
+
+        new = [i for i, id in enumerate(ids) if id not in self.rows]
+        replaced = [i for i, id in enumerate(ids) if id in self.rows]
+        replaced_rows = [self.rows[ids[i]] for i in replaced]
+        first_new_row = len(self.ids)
+        # Drop the rows of an earlier upsert that failed before its chunks
+        os.truncate(self._file("vectors.f32"), len(self.ids) * self.dimension * 4)
+        with open(self._file("vectors.f32"), "ab") as f:
+            f.write(np.ascontiguousarray(embeddings[new]).tobytes())
+        if replaced:
+            vectors = np.memmap(
+                self._file("vectors.f32"),
+                dtype=np.float32,
+                mode="r+",
+                shape=(len(self.ids), self.dimension),
+            )
+            vectors[replaced_rows] = embeddings[replaced]
+            vectors.flush()
+            del vectors
+        chunks = [
+            {"id": id, "document": document, "metadata": metadata}
+            for document, metadata, id in zip(documents, metadatas, ids)
+        ]
+        # Serialized before anything is written, then in a single write
+        lines = "".join(json.dumps(chunk) + "\n" for chunk in chunks)
+        with open(self._file("chunks.jsonl"), "a") as f:
+            f.write(lines)
+        for chunk in chunks:
+            self._set(chunk)
+
+        # Norms and metadata columns of the written rows only
+        self._map_vectors()
+        self.norms = np.concatenate([self.norms, _norms(embeddings[new])])
+        self.norms[replaced_rows] = _norms(embeddings[replaced])
+        self.columns.extend(self.metadatas[first_new_row:])
+        self.columns.update(
+            replaced_rows, [self.metadatas[row] for row in replaced_rows]
+        )
+
+    def query(self, query_embeddings: np.ndarray, top_k: int, filters: Dict = None):
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        query_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(query_norms > 0, query_norms, 1.0)
+        # Exact cosine similarity of every query with every chunk
+        if self.ids:
+            similarities = (queries @ self.vectors.T) / self.norms
+        else:
+            similarities = np.zeros((len(queries), 0), dtype=np.float32)
+        candidates = len(self.ids)
+        if filters:
+            keep = self.columns.mask(filters)
+            similarities[:, ~keep] = -np.inf
+            candidates = int(keep.sum())
+        k = min(top_k, candidates)
+
+        results = {
+            "ids": [],
+            "distances": [],
+            "metadatas": [],
+            "embeddings": [],
+            "documents": [],
+            "uris": None,
+            "data": None,
+        }
+        for scores in similarities:
+            rows = np.argpartition(-scores, k - 1)[:k] if k else np.zeros(0, int)
+            # Closest first, ties in row order: searches are deterministic
+            rows = rows[np.lexsort((rows, -scores[rows]))]
+            results["ids"].append([self.ids[row] for row in rows])
+            results["distances"].append((1.0 - scores[rows]).tolist())
+            results["metadatas"].append([dict(self.metadatas[row]) for row in rows])
+            results["embeddings"].append(np.array(self.vectors[rows]))
+            results["documents"].append([self.documents[row] for row in rows])
+        return results
+
+    def get(self, ids=None, include=(), limit=None, offset=0) -> Dict:
+        if ids is not None:
+            rows = [self.rows[id] for id in ids if id in self.rows]
+        else:
+            end = len(self.ids) if limit is None else offset + limit
+            rows = list(range(offset, min(end, len(self.ids))))
+        result = {"ids": [self.ids[row] for row in rows]}
+        if "documents" in include:
+            result["documents"] = [self.documents[row] for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [dict(self.metadatas[row]) for row in rows]
+        if "embeddings" in include:
+            result["embeddings"] = np.array(self.vectors[rows])
+        return result
+
+    def delete_video(self, video_id):
+        keep = [
+            row
+            for row, metadata in enumerate(self.metadatas)
+            if metadata.get("video_id") != video_id
+        ]
+        if len(keep) == len(self.ids):
+            return
+        vectors = np.array(self.vectors[keep])
+        chunks = [
+            {
+                "id": self.ids[row],
+                "document": self.documents[row],
+                "metadata": self.metadatas[row],
+            }
+            for row in keep
+        ]
+        with open(self._file("vectors.f32.tmp"), "wb") as f:
+            f.write(vectors.tobytes())
+        with open(self._file("chunks.jsonl.tmp"), "w") as f:
+            f.writelines(json.dumps(chunk) + "\n" for chunk in chunks)
+        os.replace(self._file("vectors.f32.tmp"), self._file("vectors.f32"))
+        os.replace(self._file("chunks.jsonl.tmp"), self._file("chunks.jsonl"))
+        self._replay(chunks)
+        self._map()
+
+
+class NumpyVectorDB(VectorDBOperations):
+    """
+    Collections under {save_path}/numpy_db, searched exactly: one matrix
+    product of the queries with the memory-mapped float32 embeddings of the
+    course. For courses of a few thousand chunks this beats an HNSW index and
+    always returns the true nearest chunks, ties in insertion order.
+
+    Collections are loaded on first use and kept in memory (ids, documents and
+    metadata; the vectors stay memory-mapped). Every collection has its own
+    lock, so a course being ingested does not hold up searches of the others.
+    Meant for a single process (the course service), like the embedding cache.
+    """
+
+    def __init__(
+        self,
+        save_path,
+        result_cache: SearchResultCache = None,
+        lexical_index: LexicalIndex = None,
+    ):
+        super().__init__(result_cache=result_cache, lexical_index=lexical_index)
+        self.path = os.path.join(save_path, "numpy_db")
+        os.makedirs(self.path, exist_ok=True)
+        self._collections: Dict[str, _Collection] = {}
+        self._lock = threading.Lock()  # guards _collections and the directories
+
+    def _collection_path(self, collection_name) -> str:
+        return os.path.join(self.path, collection_name)
+
+    def _exists(self, collection_name) -> bool:
+        return os.path.exists(
+            os.path.join(self._collection_path(collection_name), "meta.json")
+        )
+
+    def _collection(self, collection_name) -> _Collection:
+        collection = self._collections.get(collection_name)
+        if collection is not None:
+            return collection
+        with self._lock:
+            collection = self._collections.get(collection_name)
+            if collection is None:
+                if not self._exists(collection_name):
+                    raise ValueError(f"Collection {collection_name} does not exist.")
+                collection = self._collections[collection_name] = _Collection(
+                    self._collection_path(collection_name)
+                )
+            return collection
+
+    def _create_collection(self, collection_name):
+        if not COLLECTION_NAME.fullmatch(collection_name or ""):
+            raise ValueError(f"Invalid collection name: {collection_name}")
+        with self._lock:
+            if self._exists(collection_name):
+                raise ValueError(f"Collection {collection_name} already exists")
+            path = self._collection_path(collection_name)
+            os.makedirs(path, exist_ok=True)
+            open(os.path.join(path, "vectors.f32"), "wb").close()
+            open(os.path.join(path, "chunks.jsonl"), "w").close()
+            # Written last: a collection exists once it has its meta.json
+            with open(os.path.join(path, "meta.json.tmp"), "w") as f:
+                json.dump({"dimension": None}, f)
+            os.replace(
+                os.path.join(path, "meta.json.tmp"), os.path.join(path, "meta.json")
+            )
+
+    def _upsert(
+        self, collection_name, documents, embeddings, metadatas, ids, batch_size
+    ):
+        # One write whatever the batch size, nothing to round-trip
+        collection = self._collection(collection_name)
+        with collection.lock:
+            collection.upsert(list(documents), embeddings, list(metadatas), list(ids))
+
+    def _query(self, collection_name, query_embeddings, top_k, filters=None):
+        collection = self._collection(collection_name)
+        with collection.lock:
+            return collection.query(query_embeddings, top_k, filters)
+
+    def _get(self, collection_name, ids=None, include=(), limit=None, offset=0):
+        collection = self._collection(collection_name)
+        with collection.lock:
+            return collection.get(ids, include, limit, offset)
+
+    def _delete_video(self, collection_name, video_id):
+        collection = self._collection(collection_name)
+        with collection.lock:
+            collection.delete_video(video_id)
+
+    def _delete_collection(self, collection_name):
+        with self._lock:
+            if not self._exists(collection_name):
+                raise ValueError(f"Collection {collection_name} does not exist.")
+            collection = self._collections.pop(collection_name, None)
+            # Lets a write in progress finish first
+            with collection.lock if collection is not None else nullcontext():
+                shutil.rmtree(self._collection_path(collection_name))
+
+    def get_collections(self):
+        return sorted(name for name in os.listdir(self.path) if self._exists(name))
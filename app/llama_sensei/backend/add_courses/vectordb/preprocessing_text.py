@@ -1,4 +1,9 @@
-from typing import List
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from typing import Dict, List
 
 import nltk
 from nltk.corpus import stopwords
@@ -6,37 +11,113 @@ from nltk.stem import PorterStemmer, WordNetLemmatizer
 from nltk.tag import pos_tag
 from nltk.tokenize import sent_tokenize, word_tokenize
 
+NLTK_RESOURCES = [
+    'punkt',
+    'punkt_tab',
+    'wordnet',
+    'averaged_perceptron_tagger',
+    'words',
+    'stopwords',
+    'averaged_perceptron_tagger_eng',
+]
+_nltk_resources_ready = False
+
+# Distinct tokens remembered by the lemma and stem caches
+TOKEN_CACHE_SIZE = int(os.getenv("PREPROCESS_TOKEN_CACHE_SIZE", 100_000))
+# Processes preprocessing chunks in parallel during ingestion (0 or 1 = in process)
+PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", 0))
+PARALLEL_MIN_CHUNKS = 32  # fewer chunks are not worth shipping to the pool
+
+
+def download_nltk_resources():
+    # nltk.download hits the network for every resource, so only do it once per process
+    global _nltk_resources_ready
+    if _nltk_resources_ready:
+        return
+    for resource in NLTK_RESOURCES:
+        nltk.download(resource, quiet=True)
+    _nltk_resources_ready = True
+
 
 class TextPreprocessor:
-    def __init__(self):
+    """
+    Stop word removal, lemmatization (as verbs) and stemming of transcript
+    chunks and search queries.
+
+    By default (fast=True) the POS tagging step is skipped, since its tags
+    were never used, and lemmas and stems are memoized per token: the same
+    words come back again and again in lectures. fast=False runs the original,
+    uncached pipeline; both produce the same text.
+    """
+
+    def __init__(self, fast=True, cache_size=TOKEN_CACHE_SIZE, workers=None):
         # Ensure necessary NLTK resources are downloaded
-        nltk.download('punkt', quiet=True)
-        nltk.download('punkt_tab', quiet=True)
-        nltk.download('wordnet', quiet=True)
-        nltk.download('averaged_perceptron_tagger', quiet=True)
-        nltk.download('words', quiet=True)
-        nltk.download('stopwords', quiet=True)
-        nltk.download('averaged_perceptron_tagger_eng', quiet=True)
+        download_nltk_resources()
 
         self.lemmatizer = WordNetLemmatizer()
         self.stemmer = PorterStemmer()
         self.stop_words = set(stopwords.words('english'))
+        self.fast = fast
+        self._lemmatize = lru_cache(maxsize=cache_size)(
+            partial(self.lemmatizer.lemmatize, pos='v')
+        )
+        self._stem = lru_cache(maxsize=cache_size)(self.stemmer.stem)
+        self.cache_size = cache_size
+        self.workers = PREPROCESS_WORKERS if workers is None else workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
 
     def preprocess_text(
         self, chunks: List[tuple], apply_lemmatize=True, apply_stem=True
     ) -> List[tuple]:
-        return [
-            (
+        if self.workers > 1 and len(chunks) >= PARALLEL_MIN_CHUNKS:
+            texts = self._map_in_pool(
+                [chunk[0] for chunk in chunks], apply_lemmatize, apply_stem
+            )
+        else:
+            texts = [
                 self._preprocess(
                     chunk[0], apply_lemmatize=apply_lemmatize, apply_stem=apply_stem
+                )
+                for chunk in chunks
+            ]
+        return [(text, chunk[1], chunk[2]) for text, chunk in zip(texts, chunks)]
+
+    def _map_in_pool(self, texts: List[str], apply_lemmatize, apply_stem):
+        # NLTK is pure Python, so chunks are spread over processes, not threads;
+        # map keeps the input order
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    # forking a process that runs threads and torch is unsafe
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.fast, self.cache_size),
+                )
+            pool = self._pool
+        chunksize = max(1, len(texts) // (self.workers * 4))
+        return list(
+            pool.map(
+                partial(
+                    _preprocess_in_worker,
+                    apply_lemmatize=apply_lemmatize,
+                    apply_stem=apply_stem,
                 ),
-                chunk[1],
-                chunk[2],
+                texts,
+                chunksize=chunksize,
             )
-            for chunk in chunks
-        ]
+        )
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
 
     def _preprocess(self, text, apply_lemmatize=True, apply_stem=True):
+        if self.fast:
+            return self._fast_preprocess(text, apply_lemmatize, apply_stem)
         sentences = sent_tokenize(text)
         words = [word_tokenize(sentence) for sentence in sentences]
 
@@ -63,6 +144,29 @@ class TextPreprocessor:
         preprocessed_text = [' '.join(sentence) for sentence in pos_tagged]
         return ' '.join(preprocessed_text)
 
+    def _fast_preprocess(self, text, apply_lemmatize=True, apply_stem=True):
+        sentences = []
+        for sentence in sent_tokenize(text):
+            words = []
+            for word in word_tokenize(sentence):
+                if word.lower() in self.stop_words:
+                    continue
+                if apply_lemmatize:
+                    word = self._lemmatize(word)
+                if apply_stem:
+                    word = self._stem(word)
+                words.append(word)
+            sentences.append(' '.join(words))
+        # Joined per sentence like the original, an all stop word sentence
+        # still leaves its (empty) place
+        return ' '.join(sentences)
+
+    def cache_info(self) -> Dict[str, Dict]:
+        return {
+            name: cache.cache_info()._asdict()
+            for name, cache in (("lemmatize", self._lemmatize), ("stem", self._stem))
+        }
+
     def chunk(self, words, chunk_size=512):
         return [words[i : i + chunk_size] for i in range(0, len(words), chunk_size)]
 
@@ -74,3 +178,19 @@ class TextPreprocessor:
         start, end = sentences[0][1], sentences[-1][2]
         chunk = " ".join([sentence[0] for sentence in sentences])
         return (chunk, start, end)
+
+
+_worker_preprocessor: TextPreprocessor = None
+
+
+def _init_worker(fast, cache_size):
+    global _worker_preprocessor, _nltk_resources_ready
+    # The parent already downloaded the resources to disk
+    _nltk_resources_ready = True
+    _worker_preprocessor = TextPreprocessor(fast=fast, cache_size=cache_size, workers=0)
+
+
+def _preprocess_in_worker(text, apply_lemmatize=True, apply_stem=True):
+    return _worker_preprocessor._preprocess(
+        text, apply_lemmatize=apply_lemmatize, apply_stem=apply_stem
+    )
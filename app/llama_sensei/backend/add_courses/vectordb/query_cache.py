@@ -0,0 +1,126 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+QUERY_CACHE_MB = float(os.getenv("QUERY_CACHE_MB", 64))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", 3600))  # secs
+ENTRY_OVERHEAD = 200  # bytes of dict, tuple and array bookkeeping per entry
+
+
+def normalize_query(text: str) -> str:
+    # Whitespace never changes the tokens the model sees
+    return " ".join(text.split())
+
+
+class QueryEmbeddingCache:
+    """
+    In-memory LRU cache of query embeddings, keyed by (model name, normalized
+    preprocessed query). Entries expire `ttl` seconds after they were stored,
+    and the least recently used ones are evicted once the entries take more
+    than `max_bytes`. Shared by every search of the service, so a question
+    asked again skips the forward pass.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        max_bytes: int = int(QUERY_CACHE_MB * 1024 * 1024),
+        ttl: float = QUERY_CACHE_TTL,
+        clock=time.monotonic,
+    ):
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[np.ndarray, float]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def key(self, text: str) -> Tuple[str, str]:
+        return (self.model_name, normalize_query(text))
+
+    @staticmethod
+    def _size(key: Tuple[str, str], embedding: np.ndarray) -> int:
+        return embedding.nbytes + sys.getsizeof(key[1]) + ENTRY_OVERHEAD
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        return self.get_many([text])[0]
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        The cached embedding of each text, None where it is missing or expired.
+        """
+        now = self.clock()
+        found = []
+        with self._lock:
+            for text in texts:
+                key = self.key(text)
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] <= now:
+                    self._remove(key)
+                    self.expired += 1
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    found.append(None)
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                found.append(entry[0])
+        return found
+
+    def put_many(self, texts: List[str], embeddings):
+        expires_at = self.clock() + self.ttl
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                key = self.key(text)
+                embedding = np.array(embedding, dtype=np.float32)
+                embedding.setflags(write=False)  # handed out to every caller
+                size = self._size(key, embedding)
+                if size > self.max_bytes:
+                    continue
+                if key in self._entries:
+                    self._remove(key)
+                self._entries[key] = (embedding, expires_at)
+                self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: Tuple[str, str]):
+        embedding, _ = self._entries.pop(key)
+        self.bytes -= self._size(key, embedding)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
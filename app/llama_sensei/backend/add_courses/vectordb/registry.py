@@ -0,0 +1,87 @@
+import threading
+from datetime import datetime
+
+from .document_processor import DocumentProcessor, ingestion_window_size
+from .embedding_cache import EmbeddingCache
+from .get_embedding import DEFAULT_EMBEDDING_MODEL, Embedder
+from .preprocessing_text import TextPreprocessor, download_nltk_resources
+from .query_cache import QueryEmbeddingCache
+from .vector_db_operations import VectorDBOperations
+
+WARMUP_TEXT = "Warm up the embedding model before serving requests."
+
+
+class ModelRegistry:
+    """
+    Process-wide holder of the models used by the course service.
+
+    The embedding model, NLTK resources, text preprocessor, embedding cache
+    and query embedding cache are loaded once (usually from the FastAPI
+    lifespan hook) and shared by every request.
+    """
+
+    def __init__(self, model_name=DEFAULT_EMBEDDING_MODEL, cache_dir=None):
+        self.model_name = model_name
+        self.cache_dir = cache_dir  # None disables the embedding cache
+        self.text_processor = None
+        self.embedder = None
+        self.cache = None
+        self.query_cache = None
+        self.error = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def load(self):
+        with self._lock:
+            if self.ready:
+                return self
+            try:
+                before = datetime.now()
+                download_nltk_resources()
+                self.text_processor = TextPreprocessor()
+                self.embedder = Embedder(model_name=self.model_name)
+                self.warm_up()
+                self.query_cache = QueryEmbeddingCache(self.model_name)
+                if self.cache_dir is not None:
+                    self.cache = EmbeddingCache(
+                        self.cache_dir, self.model_name, self.embedder.dimension
+                    )
+                self.error = None
+                self._ready.set()
+                print(f"Model registry ready in {datetime.now() - before} seconds")
+            except Exception as e:
+                self.error = str(e)
+                print(f"Failed to load models: {self.error}")
+        return self
+
+    def close(self):
+        # Stop the worker processes of the parallel ingestion mode, if started
+        if self.text_processor is not None:
+            self.text_processor.close()
+        if self.embedder is not None:
+            self.embedder.close()
+
+    def warm_up(self):
+        # A first encode triggers lazy initialisation (tokenizer, CUDA kernels),
+        # so pay for it here rather than on the first user query.
+        self.embedder.embed(self.text_processor._preprocess(WARMUP_TEXT))
+
+    def document_processor(
+        self, vector_db: VectorDBOperations, collection_name: str, search_only=True
+    ) -> DocumentProcessor:
+        if not self.ready:
+            raise RuntimeError("Models are not loaded yet")
+        return DocumentProcessor(
+            vector_db=vector_db,
+            collection_name=collection_name,
+            search_only=search_only,
+            text_processor=self.text_processor,
+            embedder=self.embedder,
+            cache=self.cache,
+            query_cache=self.query_cache,
+            window_size=ingestion_window_size(self.embedder, self.text_processor),
+        )
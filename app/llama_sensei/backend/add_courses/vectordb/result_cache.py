@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+import numpy as np
+
+SEARCH_CACHE_ENTRIES = int(os.getenv("SEARCH_CACHE_ENTRIES", 10_000))
+
+
+def embedding_key(embedding, top_k: int, filters: Dict = None) -> Hashable:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.asarray(embedding, dtype=np.float32).tobytes())
+    return (digest.digest(), top_k, json.dumps(filters or None, sort_keys=True))
+
+
+class SearchResultCache:
+    """
+    LRU cache of vector search results, keyed per collection and tagged with
+    the collection's version. Every write to a collection bumps its version
+    (see VectorDBOperations), so results computed before the write are never
+    served again. Read the version before searching and store the result under
+    it: a write racing the search then leaves the result unreachable.
+    """
+
+    def __init__(self, max_entries: int = SEARCH_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._versions: Dict[str, int] = {}
+        self._entries: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def version(self, collection_name: str) -> int:
+        with self._lock:
+            return self._versions.get(collection_name, 0)
+
+    def bump(self, collection_name: str):
+        with self._lock:
+            self._versions[collection_name] = self._versions.get(collection_name, 0) + 1
+            stale = [key for key in self._entries if key[0] == collection_name]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def get(self, collection_name: str, version: int, key: Hashable) -> Optional[Dict]:
+        with self._lock:
+            result = self._entries.get((collection_name, version, key))
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((collection_name, version, key))
+            self.hits += 1
+            return result
+
+    def put(self, collection_name: str, version: int, key: Hashable, result: Dict):
+        with self._lock:
+            if version != self._versions.get(collection_name, 0):
+                return  # written to since the search started
+            self._entries[(collection_name, version, key)] = result
+            self._entries.move_to_end((collection_name, version, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "versions": dict(self._versions),
+            }
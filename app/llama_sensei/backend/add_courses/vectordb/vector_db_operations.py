@@ -1,56 +1,440 @@
 import os
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
 
 import chromadb
+import numpy as np
 
+from .lexical_index import LexicalIndex, reciprocal_rank_fusion
+from .result_cache import SearchResultCache, embedding_key
 
-class VectorDBOperations:
-    def __init__(self, save_path):
-        self.client = chromadb.PersistentClient(
-            path=os.path.join(save_path, "chroma_db")
+DEFAULT_UPSERT_BATCH_SIZE = 1000
+# Vector and BM25 hits fused per hybrid search (at least top_k)
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 20))
+# Entries of a query result holding one list per query embedding
+PER_QUERY_KEYS = (
+    "ids",
+    "distances",
+    "metadatas",
+    "embeddings",
+    "documents",
+    "uris",
+    "data",
+)
+
+
+def chroma_where(filters: Dict = None) -> Optional[Dict]:
+    """
+    Turn search filters (see schemas.SearchFilters: video_ids, start_after,
+    end_before and metadata equalities) into a Chroma where clause, so the
+    chunks are filtered before the nearest neighbour search.
+    """
+    if not filters:
+        return None
+    clauses = []
+    if filters.get("video_ids"):
+        clauses.append({"video_id": {"$in": list(filters["video_ids"])}})
+    if filters.get("start_after") is not None:
+        clauses.append({"start": {"$gte": filters["start_after"]}})
+    if filters.get("end_before") is not None:
+        clauses.append({"end": {"$lte": filters["end_before"]}})
+    for key, value in (filters.get("metadata") or {}).items():
+        clauses.append({key: value})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def split_results(results, num_queries):
+    # One single-query result per query embedding
+    return [
+        {
+            key: ([value[i]] if key in PER_QUERY_KEYS and value is not None else value)
+            for key, value in results.items()
+        }
+        for i in range(num_queries)
+    ]
+
+
+def join_results(rows):
+    return {
+        key: (
+            [row[key][0] for row in rows]
+            if key in PER_QUERY_KEYS and value is not None
+            else value
         )
+        for key, value in rows[0].items()
+    }
+
+
+class VectorDBOperations(ABC):
+    """
+    Vector store of the course chunks, one collection per course.
+
+    Subclasses implement the storage primitives (the abstract methods below)
+    for one engine: ChromaVectorDB or NumpyVectorDB, see open_vector_db in
+    backends.py to pick one. This class
+    adds what every engine shares on top of them: error reporting, the
+    optional result cache and lexical index, batched and hybrid search.
+    """
+
+    def __init__(
+        self,
+        result_cache: SearchResultCache = None,
+        lexical_index: LexicalIndex = None,
+    ):
+        # Optional, see SearchResultCache; every write below invalidates it
+        self.result_cache = result_cache
+        # Optional, see LexicalIndex; needed by search_hybrid
+        self.lexical_index = lexical_index
+
+    # Storage primitives, raising on failure
+
+    @abstractmethod
+    def _create_collection(self, collection_name):
+        ...
+
+    @abstractmethod
+    def _upsert(
+        self, collection_name, documents, embeddings, metadatas, ids, batch_size
+    ):
+        # embeddings: (n, dim) float32 matrix; existing ids are replaced
+        ...
+
+    @abstractmethod
+    def _query(self, collection_name, query_embeddings, top_k, filters=None) -> Dict:
+        """
+        The top_k nearest chunks (cosine distance) of every query embedding,
+        filtered as in chroma_where, as a Chroma query result: ids, documents,
+        metadatas, embeddings and distances, one list per query.
+        """
+
+    @abstractmethod
+    def _get(self, collection_name, ids=None, include=(), limit=None, offset=0) -> Dict:
+        # "ids" and the included fields of the given chunks, or of a page of all
+        ...
+
+    @abstractmethod
+    def _delete_video(self, collection_name, video_id):
+        ...
+
+    @abstractmethod
+    def _delete_collection(self, collection_name):
+        ...
+
+    @abstractmethod
+    def get_collections(self) -> List[str]:
+        ...
+
+    # Shared operations
+
+    def _changed(self, collection_name):
+        if self.result_cache is not None:
+            self.result_cache.bump(collection_name)
 
     def create_collection(self, collection_name):
         try:
-            self.client.create_collection(
-                name=collection_name, metadata={"hnsw:space": "cosine"}
-            )
+            self._create_collection(collection_name)
             print(f"Collection '{collection_name}' created successfully.")
+            self._changed(collection_name)
         except Exception as e:
             print(f"Failed to create collection: {str(e)}")
 
     def add_embedding(self, collection_name, document, embedding, metadata, id):
         try:
-            collection = self.client.get_collection(collection_name)
             # either update if ids exist, or add new
-            collection.upsert(
-                documents=[document],
-                embeddings=[embedding.tolist()],
-                metadatas=[metadata],
-                ids=[id],
+            self._upsert(
+                collection_name,
+                [document],
+                np.asarray(embedding, dtype=np.float32).reshape(1, -1),
+                [metadata],
+                [id],
+                batch_size=1,
             )
             print("Embedding added successfully.")
         except Exception as e:
             print(f"Failed to add embedding: {str(e)}")
+        finally:
+            self._changed(collection_name)
 
-    def search_embeddings(self, collection_name, query_embedding, top_k=3):
+    def add_embeddings(
+        self,
+        collection_name,
+        documents,
+        embeddings,
+        metadatas,
+        ids,
+        batch_size=DEFAULT_UPSERT_BATCH_SIZE,
+        texts=None,
+    ) -> bool:
+        # texts: the preprocessed text of every chunk, for the lexical index.
+        # False when the chunks could not all be written
         try:
-            collection = self.client.get_collection(collection_name)
-            results = collection.query(
-                query_embeddings=[query_embedding.tolist()],
-                n_results=top_k,
-                include=['documents', 'embeddings', 'metadatas'],
+            # either update if ids exist, or add new
+            self._upsert(
+                collection_name,
+                documents,
+                np.asarray(embeddings, dtype=np.float32),
+                metadatas,
+                ids,
+                batch_size=batch_size,
             )
-            print("Search successfully")
+            print(f"{len(ids)} embeddings added successfully.")
+            if self.lexical_index is not None and texts is not None:
+                self.lexical_index.add(collection_name, ids, texts, metadatas)
+            return True
+        except Exception as e:
+            print(f"Failed to add embeddings: {str(e)}")
+            return False
+        finally:
+            # Even a failed batch may have written the ones before it
+            self._changed(collection_name)
+
+    def build_lexical_index(self, collection_name):
+        # Once an ingestion is done: the texts added since become searchable
+        if self.lexical_index is None:
+            return
+        try:
+            self.lexical_index.build(collection_name)
+            print(f"Lexical index of '{collection_name}' built successfully.")
+        except Exception as e:
+            print(f"Failed to build the lexical index: {str(e)}")
+
+    def _search(self, collection_name, query_embeddings, top_k, filters=None):
+        try:
+            results = self._query(collection_name, query_embeddings, top_k, filters)
+            print(f"Searched {len(query_embeddings)} queries successfully")
             return results
         except Exception as e:
             print(f"Search failed: {str(e)}")
 
-    def get_collections(self):
-        return [x.name for x in self.client.list_collections()]
+    def search_embeddings(
+        self, collection_name, query_embedding, top_k=3, filters=None
+    ):
+        return self.search_embeddings_batch(
+            collection_name, [query_embedding], top_k, filters
+        )
+
+    def search_embeddings_batch(
+        self, collection_name, query_embeddings, top_k=3, filters=None
+    ):
+        """
+        Search several queries with one query to the store. query_embeddings
+        is a (n_queries, dim) matrix; every list in the result has one entry
+        per query, in the same order. `filters` (see chroma_where) apply to
+        every query. With a result cache only the queries not cached for the
+        current collection version are sent.
+        """
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        if self.result_cache is None:
+            return self._search(collection_name, query_embeddings, top_k, filters)
+
+        # Read before searching, see SearchResultCache
+        version = self.result_cache.version(collection_name)
+        keys = [
+            embedding_key(embedding, top_k, filters) for embedding in query_embeddings
+        ]
+        rows = [self.result_cache.get(collection_name, version, key) for key in keys]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        if missing:
+            results = self._search(
+                collection_name, query_embeddings[missing], top_k, filters
+            )
+            if results is None:
+                return None
+            for i, row in zip(missing, split_results(results, len(missing))):
+                rows[i] = row
+                self.result_cache.put(collection_name, version, keys[i], row)
+        return join_results(rows)
+
+    def search_hybrid(
+        self,
+        collection_name,
+        query_embedding,
+        query_text,
+        top_k=3,
+        filters=None,
+        candidates=HYBRID_CANDIDATES,
+    ):
+        """
+        Fuse the vector search of query_embedding with a BM25 search of
+        query_text (preprocessed like the chunks) by reciprocal rank fusion.
+        Returns a single-query result like search_embeddings, with the fused
+        "scores"; chunks only found by BM25 have no distance. Without a lexical
+        index this is the vector search alone.
+        """
+        candidates = max(top_k, candidates)
+        vector = self.search_embeddings(
+            collection_name, query_embedding, candidates, filters
+        )
+        if vector is None or self.lexical_index is None:
+            return vector
+        lexical = self.lexical_index.search(
+            collection_name, query_text, candidates, filters
+        )
+
+        hits = {
+            id: (document, metadata, embedding, distance)
+            for id, document, metadata, embedding, distance in zip(
+                vector['ids'][0],
+                vector['documents'][0],
+                vector['metadatas'][0],
+                vector['embeddings'][0],
+                vector['distances'][0],
+            )
+        }
+        fused = reciprocal_rank_fusion([vector['ids'][0], [id for id, _ in lexical]])
+        fused = fused[:top_k]
+        missing = [id for id, _ in fused if id not in hits]
+        if missing:
+            try:
+                found = self._get(
+                    collection_name,
+                    ids=missing,
+                    include=['documents', 'metadatas', 'embeddings'],
+                )
+            except Exception as e:
+                print(f"Search failed: {str(e)}")
+                return None
+            for id, document, metadata, embedding in zip(
+                found['ids'],
+                found['documents'],
+                found['metadatas'],
+                found['embeddings'],
+            ):
+                hits[id] = (document, metadata, embedding, None)
+        # An id of the lexical index missing from the collection is dropped
+        fused = [(id, score) for id, score in fused if id in hits]
+        return {
+            'ids': [[id for id, _ in fused]],
+            'documents': [[hits[id][0] for id, _ in fused]],
+            'metadatas': [[hits[id][1] for id, _ in fused]],
+            'embeddings': [[hits[id][2] for id, _ in fused]],
+            'distances': [[hits[id][3] for id, _ in fused]],
+            'scores': [[score for _, score in fused]],
+        }
+
+    def iter_documents(self, collection_name, batch_size=DEFAULT_UPSERT_BATCH_SIZE):
+        # (ids, documents, metadatas) of every chunk, read page by page
+        offset = 0
+        while True:
+            result = self._get(
+                collection_name,
+                include=['documents', 'metadatas'],
+                limit=batch_size,
+                offset=offset,
+            )
+            if result['ids']:
+                yield result['ids'], result['documents'], result['metadatas']
+            if len(result['ids']) < batch_size:
+                return
+            offset += batch_size
+
+    def get_video_ids(self, collection_name, batch_size=DEFAULT_UPSERT_BATCH_SIZE):
+        # Distinct video_id of the chunks already indexed, read page by page
+        video_ids = set()
+        offset = 0
+        while True:
+            try:
+                result = self._get(
+                    collection_name,
+                    include=['metadatas'],
+                    limit=batch_size,
+                    offset=offset,
+                )
+            except Exception as e:
+                print(f"Failed to get collection: {str(e)}")
+                return set()
+            video_ids.update(
+                metadata['video_id']
+                for metadata in result['metadatas']
+                if metadata and 'video_id' in metadata
+            )
+            if len(result['ids']) < batch_size:
+                return video_ids
+            offset += batch_size
+
+    def delete_video(self, collection_name, video_id):
+        try:
+            self._delete_video(collection_name, video_id)
+            print(f"Chunks of video '{video_id}' deleted successfully.")
+        except Exception as e:
+            print(f"Failed to delete video: {str(e)}")
+        finally:
+            if self.lexical_index is not None:
+                self.lexical_index.delete_video(collection_name, video_id)
+            self._changed(collection_name)
 
     def delete_collection(self, collection_name):
         try:
-            self.client.delete_collection(collection_name)
+            self._delete_collection(collection_name)
             print(f"Collection '{collection_name}' deleted successfully.")
         except Exception as e:
             print(f"Failed to delete collection: {str(e)}")
+        finally:
+            if self.lexical_index is not None:
+                self.lexical_index.delete_collection(collection_name)
+            self._changed(collection_name)
+
+
+class ChromaVectorDB(VectorDBOperations):
+    """
+    Collections in a persistent Chroma database under {save_path}/chroma_db,
+    searched with its HNSW index (cosine space).
+    """
+
+    def __init__(
+        self,
+        save_path,
+        result_cache: SearchResultCache = None,
+        lexical_index: LexicalIndex = None,
+    ):
+        super().__init__(result_cache=result_cache, lexical_index=lexical_index)
+        self.client = chromadb.PersistentClient(
+            path=os.path.join(save_path, "chroma_db")
+        )
+
+    def _create_collection(self, collection_name):
+        self.client.create_collection(
+            name=collection_name, metadata={"hnsw:space": "cosine"}
+        )
+
+    def _upsert(
+        self, collection_name, documents, embeddings, metadatas, ids, batch_size
+    ):
+        collection = self.client.get_collection(collection_name)
+        batch_size = min(batch_size, self.client.get_max_batch_size())
+        # one round-trip per batch
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            collection.upsert(
+                documents=list(documents[start:end]),
+                embeddings=embeddings[start:end].tolist(),
+                metadatas=list(metadatas[start:end]),
+                ids=list(ids[start:end]),
+            )
+
+    def _query(self, collection_name, query_embeddings, top_k, filters=None):
+        collection = self.client.get_collection(collection_name)
+        return collection.query(
+            query_embeddings=np.asarray(query_embeddings, dtype=np.float32).tolist(),
+            n_results=top_k,
+            where=chroma_where(filters),
+            include=['documents', 'embeddings', 'metadatas', 'distances'],
+        )
+
+    def _get(self, collection_name, ids=None, include=(), limit=None, offset=0):
+        collection = self.client.get_collection(collection_name)
+        return collection.get(
+            ids=ids, include=list(include), limit=limit, offset=offset
+        )
+
+    def _delete_video(self, collection_name, video_id):
+        collection = self.client.get_collection(collection_name)
+        collection.delete(where={"video_id": video_id})
+
+    def _delete_collection(self, collection_name):
+        self.client.delete_collection(collection_name)
+
+    def get_collections(self):
+        return [x.name for x in self.client.list_collections()]
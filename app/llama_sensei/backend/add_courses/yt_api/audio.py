@@ -1,60 +1,202 @@
 import json
 import os
-from typing import List
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
 
 import yt_dlp
+from yt_dlp.postprocessor import FFmpegPostProcessor
+from yt_dlp.utils import prepend_extension, replace_extension
 
 METADATA_FILENAME = "playlist_metadata.json"
+DOWNLOAD_WORKERS = int(os.getenv("YT_DOWNLOAD_WORKERS", 4))
+
+# Speech-to-text only needs mono 16 kHz; "wav" keeps the old uncompressed output
+AUDIO_PROFILES = {
+    "opus": {
+        "ext": "opus",
+        "codec": "libopus",
+        "args": ["-ac", "1", "-ar", "16000", "-b:a", "24k"],
+        "sample_rate": 16000,
+        "mimetype": "audio/ogg",
+    },
+    "flac": {
+        "ext": "flac",
+        "codec": "flac",
+        "args": ["-ac", "1", "-ar", "16000"],
+        "sample_rate": 16000,
+        "mimetype": "audio/flac",
+    },
+    "wav": {
+        "ext": "wav",
+        "codec": "pcm_s16le",
+        "args": [],
+        "sample_rate": 48000,
+        "mimetype": "audio/wav",
+    },
+}
+DEFAULT_AUDIO_PROFILE = os.getenv("AUDIO_PROFILE", "opus")
+
+
+class AudioProfilePP(FFmpegPostProcessor):
+    """
+    Re-encode the downloaded audio stream with the codec and settings of an
+    audio profile. Unlike FFmpegExtractAudio it never falls back to a stream
+    copy, so the channel and sample-rate settings are always applied.
+    """
+
+    def __init__(self, downloader=None, profile=None):
+        super().__init__(downloader)
+        self.profile = profile
+
+    def run(self, information):
+        path = information['filepath']
+        new_path = replace_extension(path, self.profile['ext'], information['ext'])
+        temp_path = prepend_extension(new_path, 'temp')
+
+        self.to_screen(f'Destination: {new_path}')
+        opts = ['-vn', '-acodec', self.profile['codec'], *self.profile['args']]
+        self.run_ffmpeg(path, temp_path, opts)
+        os.replace(temp_path, new_path)
+
+        information['filepath'] = new_path
+        information['ext'] = self.profile['ext']
+        # Returned files are deleted by yt-dlp once post-processing is done
+        return ([path] if path != new_path else []), information
 
 
 class YouTubeAudioDownloader:
-    def __init__(self, output_path, course_name):
+    def __init__(
+        self,
+        output_path,
+        course_name,
+        max_workers=DOWNLOAD_WORKERS,
+        audio_profile=DEFAULT_AUDIO_PROFILE,
+    ):
         self.course_name = course_name
         self.output_course_path = os.path.join(output_path, course_name)
         os.makedirs(self.output_course_path, exist_ok=True)
+        self.max_workers = max_workers
+        self.failed: Dict[str, str] = {}  # url -> error of the last download_audio
+        self.videos: Dict[str, Dict] = {}  # url -> metadata, in completion order
+        # Videos recorded by earlier runs stay in the metadata file
+        self.previous: List[Dict] = self.load_metadata()
+        self._metadata_lock = threading.Lock()
+        self.profile_name = audio_profile
+        self.profile = AUDIO_PROFILES[audio_profile]
         self.ydl_opts = {
             'format': 'bestaudio/best',
             'outtmpl': os.path.join(self.output_course_path, "audio", '%(id)s.%(ext)s'),
-            'postprocessors': [
-                {
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'wav',
-                    'preferredquality': '10',
-                }
-            ],
             'no_warnings': True,
             'quiet': True,
             'username': 'oauth2',
             'password': '',
         }
 
-    def download_audio(self, urls: List[str]):
+    @staticmethod
+    def _video_info(info: Dict) -> Dict:
+        return {
+            'id': info.get('id', 'No id'),
+            'title': info.get('title', 'No title'),
+            'channel': info.get('channel', 'No channel'),
+            'url': info.get('url', 'No URL'),
+            'description': info.get('description', 'No description'),
+            'chapters': info.get('chapters', 'No chapters'),
+            'duration': info.get('duration', 'Unknown'),
+        }
+
+    def download_one(self, url: str) -> Dict:
+        # YoutubeDL is not thread-safe, so every download gets its own instance.
+        # A single extraction both yields the metadata and drives the download.
+        with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
+            ydl.add_post_processor(AudioProfilePP(ydl, self.profile))
+            info = ydl.extract_info(url, download=True)
+        return self._video_info(info)
+
+    @property
+    def audio_glob(self) -> str:
+        return self.audio_path("*")
+
+    @property
+    def metadata_file(self) -> str:
+        return os.path.join(self.output_course_path, METADATA_FILENAME)
+
+    def load_metadata(self) -> List[Dict]:
         try:
-            with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
-                video_info_list = []
-                for url in urls:
-                    info = ydl.extract_info(url, download=False)
-                    video_info = {
-                        'id': info.get('id', 'No id'),
-                        'title': info.get('title', 'No title'),
-                        'channel': info.get('channel', 'No channel'),
-                        'url': info.get('url', 'No URL'),
-                        'description': info.get('description', 'No description'),
-                        'chapters': info.get('chapters', 'No chapters'),
-                        'duration': info.get('duration', 'Unknown'),
-                    }
-                    video_info_list.append(video_info)
-
-                save_metadata_file = os.path.join(
-                    self.output_course_path, METADATA_FILENAME
-                )
-                with open(save_metadata_file, "w") as f:
-                    json.dump(video_info_list, f, indent=4)
-
-                # Download playlist videos
-                ydl.download(urls)
-
-            return urls
-
-        except Exception as e:
-            print(f"An error occurred: {str(e)}")
+            with open(self.metadata_file, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+
+    def _all_videos(self) -> List[Dict]:
+        new_ids = {info['id'] for info in self.videos.values()}
+        return [info for info in self.previous if info.get('id') not in new_ids] + list(
+            self.videos.values()
+        )
+
+    def forget_videos(self, video_ids):
+        # Drop videos from the metadata file, e.g. once removed from the playlist
+        video_ids = set(video_ids)
+        with self._metadata_lock:
+            self.previous = [v for v in self.previous if v.get('id') not in video_ids]
+            self.videos = {
+                url: info
+                for url, info in self.videos.items()
+                if info['id'] not in video_ids
+            }
+            self._save_metadata(self._all_videos())
+
+    def _save_metadata(self, video_info_list: List[Dict]):
+        save_metadata_file = self.metadata_file
+        tmp_file = save_metadata_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(video_info_list, f, indent=4)
+        os.replace(tmp_file, save_metadata_file)
+
+    def audio_path(self, video_id: str) -> str:
+        return os.path.join(
+            self.output_course_path, "audio", f"{video_id}.{self.profile['ext']}"
+        )
+
+    def download_video(self, url: str) -> str:
+        """
+        Download one video, record its metadata and return the audio file path.
+        Safe to call from several threads at once.
+        """
+        video_info = self.download_one(url)
+        # Keep the metadata file up to date as each video finishes
+        with self._metadata_lock:
+            self.videos[url] = video_info
+            self._save_metadata(self._all_videos())
+        return self.audio_path(video_info['id'])
+
+    def download_audio(
+        self, urls: List[str], on_done: Optional[Callable[[str, str], None]] = None
+    ) -> List[str]:
+        """
+        Download the audio of every url in a bounded thread pool.
+        Returns the urls that were downloaded; failures are kept in self.failed.
+        on_done(url, error) is called as each url finishes, error is None on success;
+        if it raises, downloads that have not started yet are dropped.
+        """
+        self.failed = {}
+        self.videos = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self.download_video, url): url for url in urls}
+            try:
+                for future in as_completed(futures):
+                    error = None
+                    try:
+                        future.result()
+                    except Exception as e:
+                        error = self.failed[futures[future]] = str(e)
+                        print(f"Failed to download {futures[future]}: {str(e)}")
+                    if on_done is not None:
+                        on_done(futures[future], error)
+            except BaseException:
+                pool.shutdown(cancel_futures=True)
+                raise
+
+        downloaded = [url for url in urls if url in self.videos]
+        print(f"Downloaded {len(downloaded)}/{len(urls)} videos")
+        return downloaded
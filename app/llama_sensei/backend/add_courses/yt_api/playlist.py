@@ -1,5 +1,5 @@
 import sys
-from typing import List
+from typing import Dict, List
 
 import yt_dlp
 
@@ -12,7 +12,11 @@ class PlaylistVideosFetcher:
             "quiet": False,  # Set to False for more verbose output
         }
 
-    def get_playlist_videos(self, playlist_url: str) -> List[str]:
+    def get_playlist_entries(self, playlist_url: str) -> List[Dict]:
+        """
+        Return the id, url, title and duration of every video in the playlist,
+        without downloading or fully extracting any of them.
+        """
         try:
             with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
                 print(f"Extracting info from: {playlist_url}")
@@ -26,14 +30,22 @@ class PlaylistVideosFetcher:
                     print("No 'entries' found in playlist info.")
                     return []
 
-                video_urls = [
-                    video["url"]
+                entries = [
+                    {
+                        "id": video.get("id"),
+                        "url": video["url"],
+                        "title": video.get("title"),
+                        "duration": video.get("duration"),
+                    }
                     for video in playlist_info["entries"]
                     if video.get("url")
                 ]
-                print(f"Total videos found: {len(video_urls)}")
-                return video_urls
+                print(f"Total videos found: {len(entries)}")
+                return entries
 
         except Exception as e:
             print(f"An error occurred: {str(e)}", file=sys.stderr)
             return []  # Ensure an empty list is returned in case of an exception
+
+    def get_playlist_videos(self, playlist_url: str) -> List[str]:
+        return [entry["url"] for entry in self.get_playlist_entries(playlist_url)]
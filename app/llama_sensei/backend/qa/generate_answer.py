@@ -1,6 +1,9 @@
+import base64
 import json
+import threading
 from datetime import datetime
 
+import msgpack
 import numpy as np
 import requests
 import torch
@@ -9,12 +12,118 @@ from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
 from langchain_groq import ChatGroq
 from ragas import evaluate
 from ragas.metrics import faithfulness
+from requests.adapters import HTTPAdapter
 from sentence_transformers import SentenceTransformer
 from sklearn.metrics.pairwise import cosine_similarity
 
 MODEL = "llama3-70b-8192"
 EMBEDDING_LLM = "all-MiniLM-L12-v2"
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+HTTP_POOL_SIZE = 32
+WARMUP_TEXT = "Warm up the embedding model before serving questions."
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+# Ask for msgpack, the search API falls back to JSON if it does not support it
+SEARCH_ACCEPT = f"{MSGPACK_MEDIA_TYPE}, application/json;q=0.9"
+
+
+def decode_search_response(response) -> dict:
+    """
+    Reads a course search response, JSON or msgpack, into documents, metadatas and
+    a (len(documents), dim) float32 embedding matrix.
+
+    Parameters:
+        response (requests.Response): Response of the search API.
+
+    Returns:
+        dict: The payload with 'embeddings' as a numpy matrix.
+    """
+    content_type = str(response.headers.get("Content-Type", ""))
+    if content_type.startswith(MSGPACK_MEDIA_TYPE):
+        payload = msgpack.unpackb(response.content, raw=False)
+    else:
+        payload = response.json()
+
+    rows = len(payload["documents"])
+    embeddings = payload.get("embeddings")
+    if isinstance(embeddings, bytes):
+        embeddings = np.frombuffer(embeddings, dtype="<f4")
+    elif payload.get("embeddings_b64") is not None:
+        embeddings = np.frombuffer(
+            base64.b64decode(payload["embeddings_b64"]), dtype="<f4"
+        )
+    else:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+    payload["embeddings"] = embeddings.reshape(rows, -1 if rows else 0)
+    return payload
+
+
+def to_json_default(value):
+    # Context embeddings are numpy rows, sent on to the client as lists
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class RAGEngine:
+    """
+    Holds the resources shared by every question a worker answers, so they are loaded once per process.
+
+    Attributes:
+        context_search_url (str): URL of the course search API used for context retrieval.
+        model_name (str): Identifier for the large language model used for generating answers.
+        embedder (SentenceTransformer): Transformer model used to compute embeddings for context relevance.
+        model (ChatGroq): Instance of the large language model, reused across requests.
+        session (requests.Session): Pooled HTTP client for calls to the course search API.
+        encode_lock (threading.Lock): Serialises embedder calls, the fast tokenizer is not thread-safe.
+
+    Methods:
+        load: Loads the embedding model, LLM client and HTTP session, then warms up the embedder.
+        close: Releases pooled HTTP connections.
+    """
+
+    def __init__(self, context_search_url: str, model=MODEL):
+        """
+        Records engine settings; nothing heavy happens until load() is called.
+
+        Parameters:
+            context_search_url (str): URL of the course search API.
+            model (str): The model identifier for the language model used in answer generation.
+        """
+        self.context_search_url = context_search_url
+        self.model_name = model
+        self.embedder = None
+        self.model = None
+        self.session = None
+        self.encode_lock = threading.Lock()
+
+    def load(self):
+        """
+        Loads the shared models and opens the HTTP connection pool, then runs a dummy encode.
+
+        Returns:
+            RAGEngine: The loaded engine, for chaining.
+        """
+        before = datetime.now()
+        self.embedder = SentenceTransformer(EMBEDDING_LLM, trust_remote_code=True).to(
+            DEVICE
+        )
+        self.model = ChatGroq(model=self.model_name, temperature=0)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.embedder.encode(WARMUP_TEXT)
+        print(f"RAG engine ready in {datetime.now() - before} seconds")
+        return self
+
+    def close(self):
+        """
+        Closes pooled HTTP connections held by the engine.
+        """
+        if self.session is not None:
+            self.session.close()
 
 
 class GenerateRAGAnswer:
@@ -23,11 +132,15 @@ class GenerateRAGAnswer:
     This class supports both internet-based and internal database context retrieval, which are then used
     to generate responses through a large language model.
 
+    An instance is a lightweight, per-question object: the heavy models live in a shared RAGEngine,
+    while the query and its contexts belong to this instance, so one engine can serve concurrent questions.
+
     Attributes:
         course (str): Course identifier for context retrieval from internal databases.
-        model (str): Identifier for the large language model used for generating answers.
+        engine (RAGEngine): Shared engine holding the models and HTTP session.
         embedder (SentenceTransformer): Transformer model used to compute embeddings for context relevance.
         model (ChatGroq): Instance of the large language model initialized with specified model parameters.
+        query (str): The question currently being answered.
         contexts (list): List storing retrieved contexts along with metadata and embeddings.
 
     Methods:
@@ -42,32 +155,71 @@ class GenerateRAGAnswer:
         cal_evidence: Compiles evidence of the generated answer's quality and relevancy.
     """
 
-    def __init__(self, course: str, context_search_url: str, model=MODEL):
+    def __init__(
+        self,
+        course: str,
+        context_search_url: str = None,
+        model=MODEL,
+        engine: RAGEngine = None,
+    ):
         """
         Initializes the GenerateRAGAnswer instance with specified course and model settings.
 
         Parameters:
             course (str): The identifier for the course to retrieve contextual data from.
+            context_search_url (str): URL of the course search API, defaults to the engine's.
             model (str): The model identifier for the language model used in answer generation.
+            engine (RAGEngine): Shared engine to reuse; a new one is loaded when omitted.
         """
+        if engine is None:
+            engine = RAGEngine(context_search_url, model=model).load()
         self.query = ""
         self.contexts = []  # To store the retrieved contexts
         self.course = course
-        self.context_search_url = context_search_url
-        self.embedder = SentenceTransformer(EMBEDDING_LLM, trust_remote_code=True).to(
-            DEVICE
-        )
-        self.model = ChatGroq(model=model, temperature=0)
+        self.context_search_url = context_search_url or engine.context_search_url
+        self.engine = engine
+        self.embedder = engine.embedder
+        self.model = engine.model
 
-    def retrieve_contexts(self, top_k=5):
+    def encode(self, text):
+        """
+        Embeds text with the shared embedder, one caller at a time.
+
+        Parameters:
+            text (str): The text to embed.
+
+        Returns:
+            np.ndarray: The embedding vector.
+        """
+        with self.engine.encode_lock:
+            return self.embedder.encode(text)
+
+    def retrieve_contexts(self, top_k=5, filters=None):
+        """
+        Retrieves the top_k chunks of the course closest to the current query.
+
+        Parameters:
+            top_k (int): Number of chunks to retrieve.
+            filters (dict): Optional course search filters (video_ids, start_after, end_before,
+                metadata), applied by the vector store before the search.
+
+        Returns:
+            list: The contexts retrieved so far.
+        """
         search_query = {
             "course_name": self.course,
             "text": self.query,
             "top_k": top_k,
         }
+        if filters:
+            search_query["filters"] = filters
         try:
-            r = requests.post(url=self.context_search_url, json=search_query)
-            response = r.json()
+            r = self.engine.session.post(
+                url=self.context_search_url,
+                json=search_query,
+                headers={"Accept": SEARCH_ACCEPT},
+            )
+            response = decode_search_response(r)
 
             self.contexts.extend(
                 [
@@ -139,7 +291,7 @@ class GenerateRAGAnswer:
             float: The average cosine similarity score indicating relevancy of contexts to the query.
         """
         # Embed the query
-        embedded_query = self.embedder.encode(self.query)
+        embedded_query = self.encode(self.query)
 
         # Retrieve the embeddings
         similarity_scores = []
@@ -212,7 +364,7 @@ class GenerateRAGAnswer:
         """
 
         # Embed the query and reshape it to 2D array
-        embedded_query = self.embedder.encode(self.query).reshape(1, -1)
+        embedded_query = self.encode(self.query).reshape(1, -1)
 
         # Extract the embeddings of the contexts and ensure they are in a 2D array
         all_embeddings = [
@@ -233,7 +385,9 @@ class GenerateRAGAnswer:
 
         return top_contexts
 
-    def prepare_context(self, indb: bool, internet: bool, query: str) -> str:
+    def prepare_context(
+        self, indb: bool, internet: bool, query: str, filters: dict = None
+    ) -> str:
         """
         Prepares necessary contexts by either retrieving from the internal database or searching on the internet.
 
@@ -241,6 +395,7 @@ class GenerateRAGAnswer:
             indb (bool): Flag to indicate if contexts should be retrieved from the internal database.
             internet (bool): Flag to indicate if contexts should be searched on the internet.
             query (str): The query for which contexts are being prepared.
+            filters (dict): Optional course search filters forwarded to the internal database search.
         """
         self.query = query
         self.contexts = []
@@ -253,7 +408,7 @@ class GenerateRAGAnswer:
                     {
                         "text": result['snippet'],
                         "metadata": {"link": result['link']},
-                        "embedding": self.embedder.encode(result['snippet']).tolist(),
+                        "embedding": self.encode(result['snippet']).tolist(),
                         "is_internal": False,
                     }
                     for result in search_results
@@ -261,7 +416,7 @@ class GenerateRAGAnswer:
             )
 
         if indb:
-            self.retrieve_contexts()
+            self.retrieve_contexts(filters=filters)
 
         if indb or internet:
             self.contexts = self.rank_and_select_top_contexts(top_n=5)
@@ -283,7 +438,9 @@ class GenerateRAGAnswer:
                 is_sent_context = False
             else:
                 context = None
-            json_text = json.dumps({"token": chunk.content, "context": context})
+            json_text = json.dumps(
+                {"token": chunk.content, "context": context}, default=to_json_default
+            )
             yield json_text + "\n"
 
     def cal_evidence(self, llm_answer) -> str:
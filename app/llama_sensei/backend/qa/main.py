@@ -1,37 +1,45 @@
 import os
+from contextlib import asynccontextmanager
 
 import uvicorn
 from dotenv import load_dotenv
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
-from generate_answer import GenerateRAGAnswer
+from generate_answer import GenerateRAGAnswer, RAGEngine
 from schemas import ChatResponse, EvaluationRequest, EvaluationResponse, Question
 
 load_dotenv()
 CONTEXT_SEARCH_API_URL = f'{os.getenv("COURSE_API_URL")}/search'
-app = FastAPI(title="LlamaSensei: Chat API")
+rag_engine = RAGEngine(context_search_url=CONTEXT_SEARCH_API_URL)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the embedder, LLM client and HTTP pool once per worker
+    await run_in_threadpool(rag_engine.load)
+    yield
+    rag_engine.close()
+
+
+app = FastAPI(title="LlamaSensei: Chat API", lifespan=lifespan)
 
 
 @app.post("/generate_answer", response_model=ChatResponse)
 async def api_generate_answer(question: Question):
-    rag_chain = GenerateRAGAnswer(
-        course=question.course,
-        context_search_url=CONTEXT_SEARCH_API_URL,
-    )
+    rag_chain = GenerateRAGAnswer(course=question.course, engine=rag_engine)
     rag_chain.prepare_context(
         indb=question.indb,
         internet=question.internet,
         query=question.question,
+        filters=question.filters,
     )
     return StreamingResponse(rag_chain.generate_llm_answer())
 
 
 @app.post("/evaluate", response_model=EvaluationResponse)
 def evaluate_answer(request: EvaluationRequest):
-    rag_chain = GenerateRAGAnswer(
-        course=request.course_name,
-        context_search_url=CONTEXT_SEARCH_API_URL,
-    )
+    rag_chain = GenerateRAGAnswer(course=request.course_name, engine=rag_engine)
     evidence = rag_chain.run_evaluation(
         query=request.query,
         answer=request.answer,
@@ -1,4 +1,4 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -8,6 +8,10 @@ class Question(BaseModel):
     course: str = Field(..., description="Course to ask")
     indb: bool = Field(default=True, description="Search internal vectorDB")
     internet: bool = Field(default=False, description="Search on internet")
+    filters: Optional[Dict] = Field(
+        default=None,
+        description="Course search filters: video_ids, start_after, end_before, metadata",
+    )
 
 
 class ChatResponse(BaseModel):
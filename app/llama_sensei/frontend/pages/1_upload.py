@@ -1,5 +1,9 @@
+import time
+
 import streamlit as st
-from utils.client import add_course, get_courses
+from utils.client import add_course, cancel_job, get_courses, get_job
+
+STAGES = ["fetch", "sync", "resume", "download", "transcribe", "embed"]
 
 if 'list_name' not in st.session_state:
     st.session_state.list_name = get_courses()
@@ -27,6 +31,10 @@ if st.button("Add new"):
     create_course()
 
 erase_db = st.checkbox("Erase all data currently in course database")
+sync = st.checkbox("Only process videos that are new or changed since the last upload")
+delete_removed = st.checkbox(
+    "Remove videos that are no longer in the playlist", disabled=not sync
+)
 
 st.write("Paste the youtube link of the course:")
 url = st.text_input(
@@ -36,12 +44,54 @@ url = st.text_input(
 
 def upload():
     try:
-        response = add_course(url, course_name)
-        if "Success" in response["message"]:
-            st.success("Completed upload")
+        response = add_course(url, course_name, sync, delete_removed)
+        st.session_state.job_id = response["job_id"]
     except Exception as e:
         st.error(f"An error occurred while uploading: {str(e)}")
-        st.rerun()
+
+
+def show_job(job):
+    for stage in STAGES:
+        progress = job["progress"].get(stage)
+        if progress is None:
+            continue
+        total = progress.get("total") or 0
+        label = f"{stage}: {progress['done']}/{total or '?'}"
+        if progress.get("failed"):
+            label += f" ({progress['failed']} failed)"
+        if "chunks" in progress:
+            label += f", {progress['chunks']} chunks"
+        if stage in job["timings"]:
+            label += f" in {job['timings'][stage]:.0f}s"
+        st.progress(progress["done"] / total if total else 0.0, text=label)
+    for error in job["errors"]:
+        st.warning(error)
 
 
 st.button("Upload", on_click=upload)
+
+if "job_id" in st.session_state:
+    job_id = st.session_state.job_id
+    if st.button("Cancel upload"):
+        cancel_job(job_id)
+
+    placeholder = st.empty()
+    while True:
+        try:
+            job = get_job(job_id)
+        except Exception as e:
+            st.error(f"Could not get the upload status: {str(e)}")
+            break
+        if "status" not in job:
+            st.error(job.get("detail", "Unknown upload"))
+            del st.session_state.job_id
+            break
+        with placeholder.container():
+            st.write(f"Upload {job['status']}, {job['elapsed']:.0f} seconds")
+            show_job(job)
+        if job["status"] in ("done", "failed", "cancelled"):
+            if job["status"] == "done":
+                st.success("Completed upload")
+            del st.session_state.job_id
+            break
+        time.sleep(2)
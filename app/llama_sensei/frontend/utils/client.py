@@ -10,6 +10,7 @@ from dotenv import load_dotenv
 load_dotenv()
 ADD_COURSE_API_URL = f'{os.getenv("COURSE_API_URL")}/add_course'
 GET_COURSE_API_URL = f'{os.getenv("COURSE_API_URL")}/courses'
+JOBS_API_URL = f'{os.getenv("COURSE_API_URL")}/jobs'
 CHAT_API_URL = f'{os.getenv("CHAT_API_URL")}/generate_answer'
 EVALUATE_API_URL = f'{os.getenv("CHAT_API_URL")}/evaluate'
 
@@ -19,12 +20,32 @@ def get_courses():
     return r.json()
 
 
-def add_course(playlist_url: str, course_name: str):
-    course_info = {"playlist_url": playlist_url, "course_name": course_name}
+def add_course(
+    playlist_url: str,
+    course_name: str,
+    sync: bool = False,
+    delete_removed: bool = False,
+):
+    course_info = {
+        "playlist_url": playlist_url,
+        "course_name": course_name,
+        "sync": sync,
+        "delete_removed": delete_removed,
+    }
     r = requests.post(ADD_COURSE_API_URL, json=course_info)
     return r.json()
 
 
+def get_job(job_id: str):
+    r = requests.get(f"{JOBS_API_URL}/{job_id}")
+    return r.json()
+
+
+def cancel_job(job_id: str):
+    r = requests.post(f"{JOBS_API_URL}/{job_id}/cancel")
+    return r.json()
+
+
 def response_generator(input: str, course_name: str, indb: bool, internet: bool):
     chat_query = {
         "question": input,
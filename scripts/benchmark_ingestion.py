@@ -0,0 +1,63 @@
+import argparse
+import glob
+import os
+import tempfile
+import time
+
+from llama_sensei.backend.add_courses.vectordb.document_processor import (
+    DocumentProcessor,
+    ingestion_window_size,
+)
+from llama_sensei.backend.add_courses.vectordb.get_embedding import Embedder
+from llama_sensei.backend.add_courses.vectordb.numpy_vector_db import NumpyVectorDB
+from llama_sensei.backend.add_courses.vectordb.preprocessing_text import (
+    TextPreprocessor,
+)
+
+parser = argparse.ArgumentParser(
+    description="Time process_document (preprocess, embed, write) over transcripts "
+    "with worker pools of several sizes"
+)
+parser.add_argument("transcript_dir", help="folder of Deepgram transcript json")
+parser.add_argument(
+    "--workers",
+    type=int,
+    nargs="*",
+    default=[0, 2, 4, 8, 16, 32],
+    help="PREPROCESS_WORKERS and EMBED_WORKERS to try (0 = in process)",
+)
+args = parser.parse_args()
+
+paths = sorted(glob.glob(os.path.join(args.transcript_dir, "*.json")))
+baseline = None
+for workers in args.workers:
+    text_processor = TextPreprocessor(workers=workers)
+    embedder = Embedder(workers=workers)
+    window_size = ingestion_window_size(embedder, text_processor)
+    with tempfile.TemporaryDirectory() as save_path:
+        processor = DocumentProcessor(
+            NumpyVectorDB(save_path),
+            "benchmark",
+            search_only=False,
+            text_processor=text_processor,
+            embedder=embedder,
+            window_size=window_size,
+        )
+        # Start the pools (and load the models in them) outside the timing
+        processor.process_document(paths[0], {"video_id": "warmup"})
+        num_chunks = 0
+        before = time.perf_counter()
+        for path in paths:
+            num_chunks += processor.process_document(
+                path, {"video_id": os.path.basename(path).split(".")[0]}
+            )
+        elapsed = time.perf_counter() - before
+    text_processor.close()
+    embedder.close()
+
+    rate = num_chunks / elapsed
+    baseline = baseline or rate
+    print(
+        f"workers={workers} window={window_size}: {num_chunks} chunks in "
+        f"{elapsed:.2f} s ({rate:.1f} chunks/s, x{rate / baseline:.2f})"
+    )
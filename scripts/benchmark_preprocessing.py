@@ -0,0 +1,75 @@
+import argparse
+import glob
+import os
+import statistics
+import time
+
+from llama_sensei.backend.add_courses.vectordb.load_text import TranscriptLoader
+from llama_sensei.backend.add_courses.vectordb.preprocessing_text import (
+    TextPreprocessor,
+)
+
+QUERIES = [
+    "What is gradient descent?",
+    "How does the learning rate affect convergence?",
+    "Explain the difference between bias and variance",
+    "Why do we normalize the features before training?",
+    "What did the lecturer say about overfitting and regularization?",
+]
+
+parser = argparse.ArgumentParser(
+    description="Compare the original and fast TextPreprocessor pipelines"
+)
+parser.add_argument("--transcript-dir", help="folder of Deepgram transcript json")
+parser.add_argument("--repeat", type=int, default=200, help="passes over the queries")
+parser.add_argument(
+    "--workers",
+    type=int,
+    nargs="*",
+    default=[],
+    help="also time ingest preprocessing with these process counts, e.g. 2 4 8 16 32",
+)
+args = parser.parse_args()
+
+chunks = []
+if args.transcript_dir:
+    for path in sorted(glob.glob(os.path.join(args.transcript_dir, "*.json"))):
+        chunks.extend(TranscriptLoader(path).load_data() or [])
+
+for fast in (False, True):
+    preprocessor = TextPreprocessor(fast=fast)
+    latencies = []
+    for _ in range(args.repeat):
+        for query in QUERIES:
+            before = time.perf_counter()
+            preprocessor._preprocess(query)
+            latencies.append((time.perf_counter() - before) * 1000)
+    latencies.sort()
+    print(
+        f"fast={fast} query: p50 {statistics.median(latencies):.3f} ms, "
+        f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.3f} ms, "
+        f"mean {statistics.mean(latencies):.3f} ms over {len(latencies)} queries"
+    )
+
+    if chunks:
+        before = time.perf_counter()
+        preprocessor.preprocess_text(chunks)
+        elapsed = time.perf_counter() - before
+        print(
+            f"fast={fast} ingest: {len(chunks)} paragraphs in {elapsed:.2f} s "
+            f"({len(chunks) / elapsed:.0f} paragraphs/s)"
+        )
+    if fast:
+        print(f"token caches: {preprocessor.cache_info()}")
+
+for workers in args.workers if chunks else []:
+    preprocessor = TextPreprocessor(workers=workers)
+    preprocessor.preprocess_text(chunks[:1000])  # start the worker processes
+    before = time.perf_counter()
+    preprocessor.preprocess_text(chunks)
+    elapsed = time.perf_counter() - before
+    preprocessor.close()
+    print(
+        f"workers={workers} ingest: {len(chunks)} paragraphs in {elapsed:.2f} s "
+        f"({len(chunks) / elapsed:.0f} paragraphs/s)"
+    )
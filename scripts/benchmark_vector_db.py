@@ -0,0 +1,75 @@
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from llama_sensei.backend.add_courses.vectordb.backends import BACKENDS
+
+parser = argparse.ArgumentParser(
+    description="Compare the search latency of the vector store engines"
+)
+parser.add_argument("--chunks", type=int, nargs="*", default=[1000, 5000, 20000])
+parser.add_argument("--dim", type=int, default=384, help="all-MiniLM-L6-v2 size")
+parser.add_argument("--queries", type=int, default=200)
+parser.add_argument("--top-k", type=int, default=5)
+parser.add_argument("--videos", type=int, default=40, help="video_id values")
+args = parser.parse_args()
+
+rng = np.random.default_rng(0)
+
+
+def percentile(latencies, q):
+    return latencies[max(0, int(len(latencies) * q) - 1)]
+
+
+for num_chunks in args.chunks:
+    embeddings = rng.normal(size=(num_chunks, args.dim)).astype(np.float32)
+    queries = rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    metadatas = [
+        {"video_id": f"video{i % args.videos}", "start": float(i), "end": i + 1.0}
+        for i in range(num_chunks)
+    ]
+    ids = [f"video{i % args.videos}_{i}" for i in range(num_chunks)]
+    found = {}
+    for backend, vector_db_cls in sorted(BACKENDS.items()):
+        with tempfile.TemporaryDirectory() as save_path:
+            vector_db = vector_db_cls(save_path)
+            vector_db.create_collection("course")
+            before = time.perf_counter()
+            vector_db.add_embeddings(
+                "course", [f"chunk {i}" for i in ids], embeddings, metadatas, ids
+            )
+            ingest = time.perf_counter() - before
+
+            for filters in (None, {"video_ids": ["video0", "video1"]}):
+                latencies = []
+                results = []
+                for query in queries:
+                    before = time.perf_counter()
+                    result = vector_db._query(
+                        "course", query[None], args.top_k, filters
+                    )
+                    latencies.append((time.perf_counter() - before) * 1000)
+                    results.append(result["ids"][0])
+                latencies.sort()
+                found[backend, filters is None] = results
+                print(
+                    f"{backend:>6} {num_chunks:>6} chunks{' filtered' if filters else ''}: "
+                    f"p50 {statistics.median(latencies):.3f} ms, "
+                    f"p95 {percentile(latencies, 0.95):.3f} ms "
+                    f"(ingest {ingest:.2f} s)"
+                )
+
+    # numpy is exact: how many of the true top_k the HNSW index returns
+    for unfiltered in (True, False):
+        recall = statistics.mean(
+            len(set(approx) & set(exact)) / max(1, len(exact))
+            for approx, exact in zip(
+                found["chroma", unfiltered], found["numpy", unfiltered]
+            )
+        )
+        print(
+            f"chroma recall@{args.top_k} {'' if unfiltered else 'filtered '}"
+            f"vs exact search: {recall:.3f}"
+        )
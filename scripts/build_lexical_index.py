@@ -0,0 +1,60 @@
+import argparse
+import os
+import statistics
+import time
+
+from llama_sensei.backend.add_courses.vectordb.backends import open_vector_db
+from llama_sensei.backend.add_courses.vectordb.lexical_index import LexicalIndex
+from llama_sensei.backend.add_courses.vectordb.preprocessing_text import (
+    TextPreprocessor,
+)
+
+QUERIES = [
+    "What is gradient descent?",
+    "Explain the kernel trick in support vector machines",
+    "Bellman equation",
+    "How does backpropagation compute the gradients?",
+    "softmax cross entropy loss",
+]
+
+parser = argparse.ArgumentParser(
+    description="Build the BM25 index of courses ingested before it existed"
+)
+parser.add_argument(
+    "data_dir", nargs="?", default=os.getenv("DATA_SAVE_DIR"), help="DATA_SAVE_DIR"
+)
+parser.add_argument("--course", action="append", help="only these courses")
+parser.add_argument("--repeat", type=int, default=200, help="passes over the queries")
+args = parser.parse_args()
+
+lexical_index = LexicalIndex(args.data_dir)
+vectordb = open_vector_db(args.data_dir, lexical_index=lexical_index)
+preprocessor = TextPreprocessor()
+
+for course in args.course or vectordb.get_collections():
+    before = time.perf_counter()
+    lexical_index.delete_collection(course)
+    num_chunks = 0
+    for ids, documents, metadatas in vectordb.iter_documents(course):
+        texts = [preprocessor._preprocess(document) for document in documents]
+        lexical_index.add(course, ids, texts, metadatas)
+        num_chunks += len(ids)
+    if not num_chunks:
+        print(f"{course}: no chunks")
+        continue
+    lexical_index.build(course)
+    elapsed = time.perf_counter() - before
+
+    queries = [preprocessor._preprocess(query) for query in QUERIES]
+    latencies = []
+    for _ in range(args.repeat):
+        for query in queries:
+            before = time.perf_counter()
+            lexical_index.search(course, query, top_k=20)
+            latencies.append((time.perf_counter() - before) * 1000)
+    latencies.sort()
+    print(
+        f"{course}: {num_chunks} chunks indexed in {elapsed:.2f} s, "
+        f"BM25 query p50 {statistics.median(latencies):.3f} ms, "
+        f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.3f} ms"
+    )
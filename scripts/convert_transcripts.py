@@ -0,0 +1,58 @@
+import argparse
+import glob
+import os
+import time
+
+from llama_sensei.backend.add_courses.vectordb.load_text import (
+    TranscriptLoader,
+    compact_path,
+    write_compact,
+)
+
+parser = argparse.ArgumentParser(
+    description="Write the compact paragraph copy of every raw transcript of the courses"
+)
+parser.add_argument(
+    "data_dir", nargs="?", default=os.getenv("DATA_SAVE_DIR"), help="DATA_SAVE_DIR"
+)
+parser.add_argument("--course", action="append", help="only these courses")
+parser.add_argument("--force", action="store_true", help="rewrite existing copies")
+args = parser.parse_args()
+
+courses = args.course or sorted(
+    name
+    for name in os.listdir(args.data_dir)
+    if os.path.isdir(os.path.join(args.data_dir, name, "transcript"))
+)
+
+for course in courses:
+    raw_bytes = compact_bytes = 0
+    raw_seconds = compact_seconds = 0.0
+    converted = 0
+    transcript_dir = os.path.join(args.data_dir, course, "transcript")
+    for raw_file in sorted(glob.glob(os.path.join(transcript_dir, "*.json"))):
+        compact_file = compact_path(raw_file)
+        before = time.perf_counter()
+        loader = TranscriptLoader(raw_file, compact=False)
+        paragraphs = loader.load_data()
+        raw_seconds += time.perf_counter() - before
+        if paragraphs is None:
+            print(f"Skipping {raw_file}")
+            continue
+        if args.force or not os.path.exists(compact_file):
+            write_compact(compact_file, paragraphs, loader.get_metadata())
+            converted += 1
+
+        before = time.perf_counter()
+        compact_paragraphs = list(TranscriptLoader(compact_file).iter_paragraphs())
+        compact_seconds += time.perf_counter() - before
+        if compact_paragraphs != paragraphs:
+            raise ValueError(f"{compact_file} does not match {raw_file}")
+        raw_bytes += os.path.getsize(raw_file)
+        compact_bytes += os.path.getsize(compact_file)
+
+    print(
+        f"{course}: converted {converted} transcripts, "
+        f"{raw_bytes / 1e3:.0f} kB -> {compact_bytes / 1e3:.0f} kB, "
+        f"load {raw_seconds:.3f} s -> {compact_seconds:.3f} s"
+    )
@@ -1,12 +1,10 @@
 import glob
 import os
 
+from llama_sensei.backend.add_courses.vectordb.backends import open_vector_db
 from llama_sensei.backend.add_courses.vectordb.document_processor import (
     DocumentProcessor,
 )
-from llama_sensei.backend.add_courses.vectordb.vector_db_operations import (
-    VectorDBOperations,
-)
 
 course_name = "cs229_stanford"
 transcript_folder = f"/shared/final/{course_name}/transcript/"
@@ -14,8 +12,9 @@ transcript_files = glob.glob(os.path.join(transcript_folder, "*.json"))
 ids = [os.path.basename(name)[:-5] for name in transcript_files]
 print(transcript_files, ids)
 
-vectordb = VectorDBOperations("data/")
+vectordb = open_vector_db("data/")
 proc = DocumentProcessor(vectordb, course_name, search_only=False)
 for path, video_id in zip(transcript_files, ids):
     proc.process_document(path=path, metadata={'video_id': video_id})
+vectordb.build_lexical_index(course_name)
 # print(proc.vector_db.client.list_collections())
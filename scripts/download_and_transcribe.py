@@ -18,8 +18,10 @@ if __name__ == "__main__":
     downloader.download_audio(video_urls)
     print('Download success')
 
-    audio_list = glob.glob(os.path.join(out_dir, course_name, "audio/*.wav"))
+    audio_list = glob.glob(downloader.audio_glob)
     deepgram_client = DeepgramSTTClient(
-        os.path.join(out_dir, course_name, "transcript")
+        os.path.join(out_dir, course_name, "transcript"),
+        sample_rate=downloader.profile["sample_rate"],
+        mimetype=downloader.profile["mimetype"],
     )
-    asyncio.run(deepgram_client.get_transcripts(audio_list))
+    asyncio.run(deepgram_client.aget_transcripts(audio_list))
@@ -0,0 +1,103 @@
+import pytest
+from llama_sensei.backend.add_courses.speech_to_text.segment import (
+    merge_transcripts,
+    parse_silencedetect,
+    plan_segments,
+)
+from llama_sensei.backend.add_courses.vectordb.load_text import TranscriptLoader
+
+SILENCEDETECT_OUTPUT = """Input #0, ogg, from 'lecture.opus':
+  Duration: 01:20:03.50, start: 0.007500, bitrate: 25 kb/s
+[silencedetect @ 0x55d1] silence_start: -0.01
+[silencedetect @ 0x55d1] silence_end: 1.2 | silence_duration: 1.21
+[silencedetect @ 0x55d1] silence_start: 598.4
+[silencedetect @ 0x55d1] silence_end: 599.6 | silence_duration: 1.2
+[silencedetect @ 0x55d1] silence_start: 4800.0
+"""
+
+
+def make_result(words, request_id):
+    # words: (word, start, end) relative to the segment
+    return {
+        "metadata": {"request_id": request_id, "duration": words[-1][2] + 1.0, "channels": 1},
+        "results": {
+            "channels": [
+                {
+                    "alternatives": [
+                        {
+                            "transcript": " ".join(w for w, _, _ in words),
+                            "confidence": 0.9,
+                            "words": [{"word": w, "start": s, "end": e, "confidence": 0.9} for w, s, e in words],
+                            "paragraphs": {
+                                "transcript": "\n" + " ".join(w for w, _, _ in words),
+                                "paragraphs": [
+                                    {
+                                        "sentences": [{"text": " ".join(w for w, _, _ in words), "start": words[0][1], "end": words[-1][2]}],
+                                        "start": words[0][1],
+                                        "end": words[-1][2],
+                                    }
+                                ],
+                            },
+                        }
+                    ]
+                }
+            ]
+        },
+    }
+
+
+def test_parse_silencedetect():
+    duration, silences = parse_silencedetect(SILENCEDETECT_OUTPUT)
+    assert duration == pytest.approx(4803.5)
+    assert silences == [(0.0, 1.2), (598.4, 599.6), (4800.0, pytest.approx(4803.5))]
+
+
+def test_parse_silencedetect_without_duration():
+    with pytest.raises(ValueError):
+        parse_silencedetect("no duration here")
+
+
+def test_plan_segments_short_audio_is_not_split():
+    assert plan_segments(500.0, [], segment_length=600) == [(0.0, 500.0)]
+
+
+def test_plan_segments_cuts_at_silences():
+    silences = [(290.0, 292.0), (598.0, 600.0), (1190.0, 1192.0), (1500.0, 1502.0)]
+    segments = plan_segments(2000.0, silences, segment_length=600)
+    assert segments == [(0.0, 599.0), (599.0, 1191.0), (1191.0, 2000.0)]
+
+
+def test_plan_segments_hard_cut_without_silence():
+    segments = plan_segments(1900.0, [], segment_length=600)
+    assert segments == [(0.0, 600.0), (600.0, 1200.0), (1200.0, 1900.0)]
+    # Contiguous and bounded, with no tiny last segment
+    assert all(end - start >= 300 for start, end in segments)
+
+
+def test_merge_transcripts_offsets_timestamps():
+    results = [
+        make_result([("hello", 0.5, 1.0), ("class", 1.1, 1.5)], "a"),
+        make_result([("today", 0.2, 0.6)], "b"),
+    ]
+    merged = merge_transcripts(results, [0.0, 599.0])
+
+    alternative = merged["results"]["channels"][0]["alternatives"][0]
+    assert alternative["transcript"] == "hello class today"
+    assert [(w["start"], w["end"]) for w in alternative["words"]] == [(0.5, 1.0), (1.1, 1.5), (599.2, 599.6)]
+    paragraphs = alternative["paragraphs"]["paragraphs"]
+    assert [(p["start"], p["end"]) for p in paragraphs] == [(0.5, 1.5), (599.2, 599.6)]
+    assert paragraphs[1]["sentences"][0]["start"] == 599.2
+    assert merged["metadata"]["duration"] == pytest.approx(600.6)
+    assert merged["metadata"]["segments"] == [{"start": 0.0, "request_id": "a"}, {"start": 599.0, "request_id": "b"}]
+    # The inputs are left untouched
+    assert results[1]["results"]["channels"][0]["alternatives"][0]["words"][0]["start"] == 0.2
+
+
+def test_merged_transcript_loads(tmp_path):
+    import json
+
+    results = [make_result([("hello", 0.5, 1.0)], "a"), make_result([("today", 0.2, 0.6)], "b")]
+    path = tmp_path / "video.json"
+    path.write_text(json.dumps(merge_transcripts(results, [0.0, 599.0])))
+
+    assert TranscriptLoader(str(path)).load_data() == [("hello", 0.5, 1.0), ("today", 599.2, 599.6)]
@@ -42,6 +42,7 @@ def test_transcribe_success(deepgram_client):
     with patch('llama_sensei.backend.add_courses.speech_to_text.transcript.DeepgramClient', return_value=mock_deepgram_client), \
          patch('aiofiles.open', return_value=mock_file), \
          patch('builtins.open', MagicMock()), \
+         patch('os.replace'), \
          patch('llama_sensei.backend.add_courses.speech_to_text.transcript.datetime', mock_datetime), \
          patch('builtins.print') as mock_print:
 
@@ -68,4 +69,322 @@ def test_transcribe_exception(deepgram_client):
         
         deepgram_client.transcribe("test.wav", "test.json")
     
-    mock_print.assert_called_with("Exception: Test error")
\ No newline at end of file
+    mock_print.assert_called_with("Exception: Test error")
+
+import asyncio
+import os
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_TRANSCRIPT = {
+    "metadata": {"request_id": "fake", "duration": 1.0, "channels": 1},
+    "results": {
+        "channels": [
+            {"alternatives": [{"transcript": "hello world", "confidence": 0.99, "words": []}]}
+        ]
+    },
+}
+
+
+class FakeDeepgramHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for Deepgram's /v1/listen endpoint."""
+
+    def read_body(self):
+        # Streamed uploads arrive with chunked encoding and no Content-Length
+        if self.headers.get("Transfer-Encoding") != "chunked":
+            return len(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        received = 0
+        while True:
+            size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+            if size == 0:
+                self.rfile.readline()
+                return received
+            received += len(self.rfile.read(size))
+            self.rfile.readline()
+
+    def do_POST(self):
+        server = self.server
+        received = self.read_body()
+        with server.lock:
+            server.bodies.append((self.headers.get("Transfer-Encoding"), received))
+            server.requests += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            if server.fail_first > 0:
+                server.fail_first -= 1
+                code = server.fail_status
+            else:
+                code = 200
+        time.sleep(server.delay)
+        with server.lock:
+            server.in_flight -= 1
+
+        body = FAKE_TRANSCRIPT if code == 200 else {"err_code": "ERR", "err_msg": "fake error"}
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_deepgram():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeDeepgramHandler)
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.bodies = []  # (transfer encoding, bytes received) per request
+    server.in_flight = 0
+    server.max_in_flight = 0
+    server.fail_first = 0
+    server.fail_status = 429
+    server.delay = 0.2
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_audio_files(tmp_path, count):
+    audio_dir = tmp_path / "audio"
+    audio_dir.mkdir()
+    files = []
+    for i in range(count):
+        path = audio_dir / f"video{i}.wav"
+        path.write_bytes(b"fake audio" * 100)
+        files.append(str(path))
+    return files
+
+
+def test_aget_transcripts_runs_concurrently(fake_deepgram, tmp_path):
+    audio_files = make_audio_files(tmp_path, 6)
+    client = DeepgramSTTClient(
+        output_path=str(tmp_path / "transcript"), concurrency=3, url=fake_deepgram.url
+    )
+
+    before = time.perf_counter()
+    statuses = asyncio.run(client.aget_transcripts(audio_files))
+    elapsed = time.perf_counter() - before
+
+    assert [status["status"] for status in statuses] == ["done"] * 6
+    assert [status["file"] for status in statuses] == audio_files
+    assert all(status["seconds"] > 0 for status in statuses)
+    assert fake_deepgram.max_in_flight == 3
+    assert elapsed < 6 * fake_deepgram.delay
+    for i in range(6):
+        with open(tmp_path / "transcript" / f"video{i}.json") as f:
+            assert json.load(f)["results"]["channels"][0]["alternatives"][0]["transcript"] == "hello world"
+
+
+def test_aget_transcripts_retries_rate_limits(fake_deepgram, tmp_path):
+    fake_deepgram.fail_first = 2
+    fake_deepgram.delay = 0
+    audio_files = make_audio_files(tmp_path, 1)
+    client = DeepgramSTTClient(
+        output_path=str(tmp_path / "transcript"),
+        url=fake_deepgram.url,
+        retry_base_delay=0.01,
+    )
+
+    statuses = asyncio.run(client.aget_transcripts(audio_files))
+
+    assert statuses[0]["status"] == "done"
+    assert statuses[0]["attempts"] == 3
+    assert fake_deepgram.requests == 3
+
+
+def test_aget_transcripts_does_not_retry_client_errors(fake_deepgram, tmp_path):
+    fake_deepgram.fail_first = 1
+    fake_deepgram.fail_status = 400
+    fake_deepgram.delay = 0
+    audio_files = make_audio_files(tmp_path, 1)
+    client = DeepgramSTTClient(
+        output_path=str(tmp_path / "transcript"),
+        url=fake_deepgram.url,
+        retry_base_delay=0.01,
+    )
+
+    statuses = asyncio.run(client.aget_transcripts(audio_files))
+
+    assert statuses[0]["status"] == "failed"
+    assert statuses[0]["attempts"] == 1
+    assert "error" in statuses[0]
+    assert not (tmp_path / "transcript" / "video0.json").exists()
+
+
+def test_aget_transcripts_skips_existing(fake_deepgram, tmp_path):
+    audio_files = make_audio_files(tmp_path, 2)
+    (tmp_path / "transcript").mkdir()
+    (tmp_path / "transcript" / "video0.json").write_text("{}")
+    client = DeepgramSTTClient(output_path=str(tmp_path / "transcript"), url=fake_deepgram.url)
+
+    statuses = asyncio.run(client.aget_transcripts(audio_files))
+
+    assert [status["status"] for status in statuses] == ["skipped", "done"]
+    assert fake_deepgram.requests == 1
+
+
+def test_delete_audio_after_transcript(fake_deepgram, tmp_path):
+    fake_deepgram.delay = 0
+    audio_files = make_audio_files(tmp_path, 2)
+    client = DeepgramSTTClient(
+        output_path=str(tmp_path / "transcript"),
+        url=fake_deepgram.url,
+        delete_audio=True,
+    )
+
+    statuses = asyncio.run(client.aget_transcripts(audio_files))
+
+    assert [status["status"] for status in statuses] == ["done", "done"]
+    assert not any(os.path.exists(path) for path in audio_files)
+    assert (tmp_path / "transcript" / "video0.json").exists()
+
+
+def test_audio_kept_by_default(fake_deepgram, tmp_path):
+    fake_deepgram.delay = 0
+    audio_files = make_audio_files(tmp_path, 1)
+    client = DeepgramSTTClient(output_path=str(tmp_path / "transcript"), url=fake_deepgram.url)
+
+    asyncio.run(client.aget_transcripts(audio_files))
+
+    assert os.path.exists(audio_files[0])
+
+
+def test_upload_is_streamed_from_disk(fake_deepgram, tmp_path):
+    """
+    Audio is sent in chunks straight from the file instead of one in-memory body.
+    """
+    fake_deepgram.delay = 0
+    audio_files = make_audio_files(tmp_path, 1)
+    client = DeepgramSTTClient(output_path=str(tmp_path / "transcript"), url=fake_deepgram.url)
+
+    statuses = asyncio.run(client.aget_transcripts(audio_files))
+
+    assert statuses[0]["status"] == "done"
+    assert statuses[0]["peak_rss_mb"] > 0
+    assert fake_deepgram.bodies == [("chunked", os.path.getsize(audio_files[0]))]
+
+
+def test_retry_resends_the_whole_file(fake_deepgram, tmp_path):
+    fake_deepgram.fail_first = 1
+    fake_deepgram.delay = 0
+    audio_files = make_audio_files(tmp_path, 1)
+    client = DeepgramSTTClient(
+        output_path=str(tmp_path / "transcript"),
+        url=fake_deepgram.url,
+        retry_base_delay=0.01,
+    )
+
+    client.get_transcripts(audio_files)
+
+    size = os.path.getsize(audio_files[0])
+    assert fake_deepgram.bodies == [("chunked", size), ("chunked", size)]
+
+
+def test_streamed_upload_memory_is_bounded(fake_deepgram, tmp_path):
+    """
+    Uploading a large file only ever holds a few upload chunks in memory.
+    """
+    import tracemalloc
+
+    fake_deepgram.delay = 0
+    audio_file = tmp_path / "lecture.opus"
+    with open(audio_file, "wb") as f:
+        for _ in range(20):
+            f.write(os.urandom(1024 * 1024))
+    client = DeepgramSTTClient(output_path=str(tmp_path / "transcript"), url=fake_deepgram.url)
+
+    tracemalloc.start()
+    try:
+        statuses = asyncio.run(client.aget_transcripts([str(audio_file)]))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert statuses[0]["status"] == "done"
+    assert fake_deepgram.bodies == [("chunked", 20 * 1024 * 1024)]
+    assert peak < 8 * 1024 * 1024
+
+
+def test_long_audio_is_transcribed_in_segments(fake_deepgram, tmp_path):
+    """
+    With segmenting on, each segment is its own request and the results are
+    stitched back into one transcript file.
+    """
+    fake_deepgram.delay = 0.2
+    audio_files = make_audio_files(tmp_path, 1)
+    client = DeepgramSTTClient(
+        output_path=str(tmp_path / "transcript"),
+        url=fake_deepgram.url,
+        concurrency=3,
+        segment_length=600,
+    )
+
+    def fake_split(audio_file, segments, output_dir):
+        paths = []
+        for i, _ in enumerate(segments):
+            paths.append(os.path.join(output_dir, f"segment_{i}.wav"))
+            with open(paths[-1], "wb") as f:
+                f.write(b"segment")
+        return paths
+
+    module = 'llama_sensei.backend.add_courses.speech_to_text.transcript'
+    with patch(f'{module}.detect_silences', return_value=(1900.0, [(598.0, 600.0)])), \
+         patch(f'{module}.split_audio', side_effect=fake_split):
+        statuses = asyncio.run(client.aget_transcripts(audio_files))
+
+    assert statuses[0]["status"] == "done"
+    assert statuses[0]["segments"] == 3
+    assert statuses[0]["attempts"] == 3
+    assert fake_deepgram.max_in_flight == 3
+    with open(tmp_path / "transcript" / "video0.json") as f:
+        merged = json.load(f)
+    assert merged["results"]["channels"][0]["alternatives"][0]["transcript"] == "hello world hello world hello world"
+    assert [segment["start"] for segment in merged["metadata"]["segments"]] == [0.0, 599.0, 1199.0]
+    # Segment files are cleaned up, the original audio is kept
+    assert os.listdir(tmp_path / "audio") == ["video0.wav"]
+
+
+def test_segmenting_falls_back_to_whole_file(fake_deepgram, tmp_path):
+    fake_deepgram.delay = 0
+    audio_files = make_audio_files(tmp_path, 1)
+    client = DeepgramSTTClient(output_path=str(tmp_path / "transcript"), url=fake_deepgram.url, segment_length=600)
+
+    with patch('llama_sensei.backend.add_courses.speech_to_text.transcript.detect_silences', side_effect=FileNotFoundError("ffmpeg")):
+        statuses = asyncio.run(client.aget_transcripts(audio_files))
+
+    assert statuses[0]["status"] == "done"
+    assert "segments" not in statuses[0]
+    assert fake_deepgram.requests == 1
+
+
+def test_aget_transcripts_reports_progress(fake_deepgram, tmp_path):
+    fake_deepgram.delay = 0
+    audio_files = make_audio_files(tmp_path, 3)
+    client = DeepgramSTTClient(output_path=str(tmp_path / "transcript"), url=fake_deepgram.url)
+    done = []
+
+    asyncio.run(client.aget_transcripts(audio_files, on_done=done.append))
+
+    assert sorted(status["file"] for status in done) == audio_files
+    assert all(status["status"] == "done" for status in done)
+
+
+def test_transcript_written_atomically(fake_deepgram, tmp_path):
+    fake_deepgram.delay = 0
+    audio_files = make_audio_files(tmp_path, 1)
+    client = DeepgramSTTClient(output_path=str(tmp_path / "transcript"), url=fake_deepgram.url)
+
+    with patch('os.replace', side_effect=OSError("disk full")):
+        statuses = asyncio.run(client.aget_transcripts(audio_files))
+
+    # The final name only ever holds a complete transcript
+    assert statuses[0]["status"] == "failed"
+    assert not (tmp_path / "transcript" / "video0.json").exists()
@@ -117,4 +117,113 @@ def test_generate_llm_answer(mocker):
         )
     
     result = mock_generateanswer.generate_llm_answer()
-    assert result is not None
\ No newline at end of file
+    assert result is not None
+
+def make_engine(mocker):
+    from llama_sensei.backend.qa.generate_answer import RAGEngine
+    engine = RAGEngine(context_search_url="http://url/search")
+    engine.embedder = mocker.Mock()
+    engine.model = mocker.Mock()
+    engine.session = mocker.Mock()
+    return engine
+
+def test_shared_engine_is_not_reloaded(mocker):
+    """
+    Answers built on a shared engine reuse its models instead of loading new ones.
+    """
+    engine = make_engine(mocker)
+    mock_st = mocker.patch('llama_sensei.backend.qa.generate_answer.SentenceTransformer')
+    mock_groq = mocker.patch('llama_sensei.backend.qa.generate_answer.ChatGroq')
+
+    first = GenerateRAGAnswer(course="course_a", engine=engine)
+    second = GenerateRAGAnswer(course="course_b", engine=engine)
+
+    mock_st.assert_not_called()
+    mock_groq.assert_not_called()
+    assert first.embedder is second.embedder is engine.embedder
+    assert first.model is second.model is engine.model
+    assert first.context_search_url == "http://url/search"
+
+def test_per_request_state_is_isolated(mocker):
+    engine = make_engine(mocker)
+    engine.session.post.return_value.json.return_value = {
+        'documents': ['doc'],
+        'metadatas': [{'video_id': 'abc'}],
+        'embeddings': [[0.1, 0.2]],
+    }
+    first = GenerateRAGAnswer(course="course_a", engine=engine)
+    second = GenerateRAGAnswer(course="course_b", engine=engine)
+    first.query = "first question"
+
+    first.retrieve_contexts(top_k=1)
+
+    assert len(first.contexts) == 1
+    assert second.contexts == []
+    engine.session.post.assert_called_once_with(
+        url="http://url/search",
+        json={"course_name": "course_a", "text": "first question", "top_k": 1},
+        headers={"Accept": "application/msgpack, application/json;q=0.9"},
+    )
+
+def test_retrieve_contexts_decodes_msgpack(mocker):
+    import msgpack
+    engine = make_engine(mocker)
+    embeddings = np.array([[0.1, 0.2], [0.3, 0.4]], dtype="<f4")
+    response = engine.session.post.return_value
+    response.headers = {"Content-Type": "application/msgpack"}
+    response.content = msgpack.packb({
+        'documents': ['doc 1', 'doc 2'],
+        'metadatas': [{'video_id': 'a'}, {'video_id': 'b'}],
+        'embeddings': embeddings.tobytes(),
+        'embedding_dim': 2,
+    }, use_bin_type=True)
+    answer = GenerateRAGAnswer(course="course_a", engine=engine)
+
+    answer.retrieve_contexts(top_k=2)
+
+    response.json.assert_not_called()
+    assert [ctx['text'] for ctx in answer.contexts] == ['doc 1', 'doc 2']
+    assert np.array_equal(answer.contexts[1]['embedding'], embeddings[1])
+
+def test_decode_search_response_base64(mocker):
+    import base64
+    from llama_sensei.backend.qa.generate_answer import decode_search_response
+    embeddings = np.arange(6, dtype="<f4").reshape(3, 2)
+    response = mocker.Mock()
+    response.headers = {"Content-Type": "application/json"}
+    response.json.return_value = {
+        'documents': ['a', 'b', 'c'],
+        'metadatas': [{}, {}, {}],
+        'embeddings_b64': base64.b64encode(embeddings.tobytes()).decode(),
+        'embedding_dim': 2,
+    }
+    assert np.array_equal(decode_search_response(response)['embeddings'], embeddings)
+
+def test_numpy_context_embeddings_stream_as_lists(mocker):
+    engine = make_engine(mocker)
+    engine.model.stream.return_value = [mocker.Mock(content="Hi")]
+    answer = GenerateRAGAnswer(course="course_a", engine=engine)
+    answer.contexts = [{"text": "doc", "embedding": np.array([0.5, 1.0], dtype=np.float32)}]
+
+    async def first_line():
+        async for line in answer.generate_llm_answer():
+            return json.loads(line)
+
+    import asyncio
+    line = asyncio.run(first_line())
+    assert line["context"][0]["embedding"] == [0.5, 1.0]
+
+def test_filters_are_forwarded_to_the_search_api(mocker):
+    engine = make_engine(mocker)
+    engine.session.post.return_value.json.return_value = {
+        'documents': [], 'metadatas': [], 'embeddings': [],
+    }
+    answer = GenerateRAGAnswer(course="course_a", engine=engine)
+    mocker.patch.object(answer, "rank_and_select_top_contexts", return_value=[])
+    filters = {"video_ids": ["abc"], "start_after": 300.0}
+
+    answer.prepare_context(indb=True, internet=False, query="what about lecture 5?", filters=filters)
+
+    assert engine.session.post.call_args.kwargs["json"] == {
+        "course_name": "course_a", "text": "what about lecture 5?", "top_k": 5, "filters": filters,
+    }
@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+from llama_sensei.backend.add_courses.jobs import JobManager
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(max_workers=1)
+    yield manager
+    manager.shutdown()
+
+
+def wait_for(job, timeout=5):
+    if not job.future.cancelled():
+        job.future.exception(timeout=timeout)
+    return job.to_dict()
+
+
+def test_submit_returns_at_once_and_runs_in_background(manager):
+    started = threading.Event()
+    release = threading.Event()
+
+    def work(job, n):
+        started.set()
+        release.wait(5)
+        with job.run_stage("embed", total=n):
+            for _ in range(n):
+                job.advance(done=1, chunks=10)
+        return {"message": "Success"}
+
+    job = manager.submit(work, 3, course_name="cs229")
+    assert started.wait(5)
+    assert job.to_dict()["status"] == "running"
+
+    release.set()
+    state = wait_for(job)
+    assert state["status"] == "done"
+    assert state["course_name"] == "cs229"
+    assert state["progress"]["embed"] == {"done": 3, "total": 3, "chunks": 30}
+    assert "embed" in state["timings"]
+    assert state["result"] == {"message": "Success"}
+    assert manager.get(job.id) is job
+
+
+def test_failed_job_keeps_the_error(manager):
+    def work(job):
+        with job.run_stage("download"):
+            raise ValueError("playlist not found")
+
+    job = manager.submit(work)
+    state = wait_for(job)
+    assert state["status"] == "failed"
+    assert state["errors"] == ["playlist not found"]
+    assert state["stage"] == "download"
+
+
+def test_cancel_running_job_stops_at_checkpoint(manager):
+    started = threading.Event()
+    processed = []
+
+    def work(job):
+        with job.run_stage("embed", total=100):
+            for i in range(100):
+                job.check_cancelled()
+                processed.append(i)
+                started.set()
+                time.sleep(0.01)
+
+    job = manager.submit(work)
+    assert started.wait(5)
+    manager.cancel(job.id)
+    state = wait_for(job)
+    assert state["status"] == "cancelled"
+    assert len(processed) < 100
+
+
+def test_cancel_queued_job_never_runs(manager):
+    release = threading.Event()
+    ran = []
+    first = manager.submit(lambda job: release.wait(5))
+    second = manager.submit(lambda job: ran.append(job.id))
+
+    assert manager.cancel(second.id).status == "cancelled"
+    release.set()
+    wait_for(first)
+    assert ran == []
+    assert manager.get(second.id).to_dict()["status"] == "cancelled"
+
+
+def test_unknown_job(manager):
+    assert manager.get("missing") is None
+    assert manager.cancel("missing") is None
+
+
+def test_finished_jobs_are_pruned():
+    manager = JobManager(max_workers=1, max_finished=2)
+    try:
+        finished = [manager.submit(lambda job: None) for _ in range(3)]
+        for job in finished:
+            wait_for(job)
+        latest = manager.submit(lambda job: None)
+        wait_for(latest)
+        assert manager.get(finished[0].id) is None
+        assert [job.id for job in manager.jobs()] == [finished[1].id, finished[2].id, latest.id]
+    finally:
+        manager.shutdown()
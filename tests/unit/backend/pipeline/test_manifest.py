@@ -0,0 +1,128 @@
+import json
+import os
+
+import pytest
+from llama_sensei.backend.add_courses.manifest import CourseManifest, is_complete_transcript
+from llama_sensei.backend.add_courses.pipeline import IngestionPipeline
+from llama_sensei.backend.add_courses.speech_to_text.transcript import DeepgramSTTClient
+from llama_sensei.backend.add_courses.yt_api.audio import YouTubeAudioDownloader
+
+TRANSCRIPT = json.dumps({"results": {"channels": [{"alternatives": [{"transcript": "hi"}]}]}})
+
+
+def entry(video_id):
+    return {"id": video_id, "url": f"https://www.youtube.com/watch?v={video_id}"}
+
+
+def write(path, content):
+    with open(path, "w") as f:
+        f.write(content)
+
+
+@pytest.fixture
+def course(tmp_path):
+    downloader = YouTubeAudioDownloader(str(tmp_path), "course")
+    os.makedirs(os.path.join(downloader.output_course_path, "audio"))
+    stt_client = DeepgramSTTClient(output_path=os.path.join(downloader.output_course_path, "transcript"))
+    manifest = CourseManifest(downloader.output_course_path, "model-a")
+    return downloader, stt_client, manifest
+
+
+def test_states_are_persisted(course):
+    downloader, stt_client, manifest = course
+    write(stt_client.transcript_path("a"), TRANSCRIPT)
+    manifest.mark_downloaded("a", downloader.audio_path("a"))
+    manifest.mark_transcribed("a", stt_client.transcript_path("a"))
+    manifest.mark_indexed("a", 12)
+
+    reloaded = CourseManifest(downloader.output_course_path, "model-a")
+    record = reloaded.videos["a"]
+    assert record["state"] == "indexed"
+    assert record["chunks"] == 12
+    assert record["model"] == "model-a"
+    assert len(record["transcript_sha256"]) == 64
+    assert not os.path.exists(reloaded.path + ".tmp")
+
+
+def test_resume_picks_up_each_video_where_it_stopped(course):
+    downloader, stt_client, manifest = course
+    # a: fully indexed
+    write(stt_client.transcript_path("a"), TRANSCRIPT)
+    manifest.mark_transcribed("a", stt_client.transcript_path("a"))
+    manifest.mark_indexed("a", 3)
+    # b: transcribed, crashed before indexing
+    write(stt_client.transcript_path("b"), TRANSCRIPT)
+    manifest.mark_transcribed("b", stt_client.transcript_path("b"))
+    # c: downloaded, transcript cut off mid-write
+    write(downloader.audio_path("c"), "audio")
+    manifest.mark_downloaded("c", downloader.audio_path("c"))
+    write(stt_client.transcript_path("c"), TRANSCRIPT[:20])
+    # d: never seen
+
+    resume = manifest.resume([entry(v) for v in "abcd"], downloader, stt_client, indexed={"a"})
+
+    assert resume == {
+        "indexed": ["a"],
+        "transcripts": [stt_client.transcript_path("b")],
+        "audio_files": [downloader.audio_path("c")],
+        "urls": [entry("d")["url"]],
+    }
+    assert not os.path.exists(stt_client.transcript_path("c"))
+
+
+def test_resume_redoes_tampered_transcripts_and_other_models(course):
+    downloader, stt_client, manifest = course
+    for video_id in "ab":
+        write(stt_client.transcript_path(video_id), TRANSCRIPT)
+        manifest.mark_transcribed(video_id, stt_client.transcript_path(video_id))
+        manifest.mark_indexed(video_id, 3)
+    write(stt_client.transcript_path("b"), TRANSCRIPT.replace("hi", "ho"))
+
+    other_model = CourseManifest(downloader.output_course_path, "model-b")
+    resume = other_model.resume([entry("a"), entry("b")], downloader, stt_client, indexed={"a", "b"})
+
+    # a was indexed with another model, b's transcript no longer matches its checksum
+    assert resume["transcripts"] == [stt_client.transcript_path("a")]
+    assert resume["urls"] == [entry("b")["url"]]
+
+
+def test_resume_adopts_complete_transcripts_from_before_the_manifest(course):
+    downloader, stt_client, manifest = course
+    write(stt_client.transcript_path("a"), TRANSCRIPT)
+    write(stt_client.transcript_path("b"), '{"metadata": {}}')
+
+    resume = manifest.resume([entry("a"), entry("b")], downloader, stt_client, indexed=set())
+
+    assert resume["transcripts"] == [stt_client.transcript_path("a")]
+    assert resume["urls"] == [entry("b")["url"]]
+    assert manifest.state("a") == "transcribed"
+
+
+def test_is_complete_transcript(tmp_path):
+    path = str(tmp_path / "t.json")
+    write(path, TRANSCRIPT)
+    assert is_complete_transcript(path)
+    write(path, TRANSCRIPT[:-3])
+    assert not is_complete_transcript(path)
+    assert not is_complete_transcript(str(tmp_path / "missing.json"))
+
+
+def test_pipeline_records_every_stage(course):
+    from test_pipeline import FakeDownloader, FakeProcessor, FakeSTTClient
+
+    downloader, stt_client, manifest = course
+    audio_dir = os.path.dirname(downloader.audio_path("x"))
+    fake_stt = FakeSTTClient(stt_client.output_path)
+    fake_stt.atranscribe = _write_transcript
+    pipeline = IngestionPipeline(FakeDownloader(audio_dir), fake_stt, FakeProcessor(delay=0), manifest=manifest)
+
+    pipeline.run(["video0"])
+
+    assert manifest.state("video0") == "indexed"
+    assert manifest.videos["video0"]["chunks"] == 5
+    assert "transcript_sha256" in manifest.videos["video0"]
+
+
+async def _write_transcript(audio_file, save_file, semaphore):
+    write(save_file, TRANSCRIPT)
+    return {"file": audio_file, "status": "done", "seconds": 0.0}
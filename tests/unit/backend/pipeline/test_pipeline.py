@@ -0,0 +1,211 @@
+import asyncio
+import os
+import threading
+import time
+
+from unittest.mock import Mock
+
+import pytest
+from llama_sensei.backend.add_courses.jobs import Job, JobManager
+from llama_sensei.backend.add_courses.pipeline import IngestionPipeline
+
+STAGE_SECONDS = 0.1
+
+
+class FakeDownloader:
+    def __init__(self, audio_dir, fail=(), max_workers=1):
+        self.audio_dir = audio_dir
+        self.fail = fail
+        self.max_workers = max_workers
+        self.downloaded = []
+
+    def download_video(self, url):
+        time.sleep(STAGE_SECONDS)
+        if url in self.fail:
+            raise Exception("Video unavailable")
+        path = os.path.join(self.audio_dir, f"{url}.opus")
+        with open(path, "wb") as f:
+            f.write(b"audio")
+        self.downloaded.append(url)
+        return path
+
+
+class FakeSTTClient:
+    def __init__(self, transcript_dir, concurrency=1):
+        self.transcript_dir = transcript_dir
+        self.concurrency = concurrency
+
+    def transcript_path(self, audio_file):
+        return os.path.join(self.transcript_dir, os.path.basename(audio_file).split(".")[0] + ".json")
+
+    async def atranscribe(self, audio_file, save_file, semaphore):
+        async with semaphore:
+            await asyncio.sleep(STAGE_SECONDS)
+        with open(save_file, "w") as f:
+            f.write("{}")
+        return {"file": audio_file, "status": "done", "attempts": 1, "seconds": STAGE_SECONDS}
+
+
+class FakeProcessor:
+    def __init__(self, delay=STAGE_SECONDS, downloader=None):
+        self.delay = delay
+        self.downloader = downloader
+        self.embedded = []
+        self.ahead = []  # downloaded but not yet embedded, seen at each embed
+
+    def process_document(self, path, metadata):
+        if self.downloader is not None:
+            self.ahead.append(len(self.downloader.downloaded) - len(self.embedded))
+        time.sleep(self.delay)
+        self.embedded.append(metadata["video_id"])
+        return 5
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    (tmp_path / "audio").mkdir()
+    (tmp_path / "transcript").mkdir()
+    return str(tmp_path / "audio"), str(tmp_path / "transcript")
+
+
+def test_stages_overlap(dirs):
+    audio_dir, transcript_dir = dirs
+    urls = [f"video{i}" for i in range(6)]
+    pipeline = IngestionPipeline(FakeDownloader(audio_dir), FakeSTTClient(transcript_dir), FakeProcessor())
+
+    before = time.perf_counter()
+    result = pipeline.run(urls)
+    elapsed = time.perf_counter() - before
+
+    assert sorted(pipeline.processor.embedded) == urls
+    assert result["chunks"] == 5 * len(urls)
+    assert [status["status"] for status in result["transcripts"]] == ["done"] * len(urls)
+    # Close to the slowest stage (6 x 0.1s) plus filling the pipe, not the sum (18 x 0.1s)
+    assert elapsed < 0.6 * 3 * len(urls) * STAGE_SECONDS
+    assert result["busy_seconds"]["download"] >= len(urls) * STAGE_SECONDS
+
+
+def test_backpressure_bounds_work_ahead_of_slow_stage(dirs):
+    audio_dir, transcript_dir = dirs
+    downloader = FakeDownloader(audio_dir, max_workers=2)
+    processor = FakeProcessor(delay=3 * STAGE_SECONDS, downloader=downloader)
+    pipeline = IngestionPipeline(downloader, FakeSTTClient(transcript_dir), processor, queue_size=1)
+
+    pipeline.run([f"video{i}" for i in range(8)])
+
+    assert len(processor.embedded) == 8
+    # queue slots + files in transcription + downloads in flight, never the whole course
+    assert max(processor.ahead) <= 1 + 1 + 1 + 2 + 1
+
+
+def test_failed_videos_do_not_stop_the_others(dirs):
+    audio_dir, transcript_dir = dirs
+    pipeline = IngestionPipeline(
+        FakeDownloader(audio_dir, fail={"video1"}), FakeSTTClient(transcript_dir), FakeProcessor(delay=0)
+    )
+
+    result = pipeline.run(["video0", "video1", "video2"])
+
+    assert result["failed"]["download"] == {"video1": "Video unavailable"}
+    assert sorted(pipeline.processor.embedded) == ["video0", "video2"]
+
+
+def test_failed_download_is_taken_off_the_later_totals(dirs):
+    audio_dir, transcript_dir = dirs
+    job = Job("job", {})
+    pipeline = IngestionPipeline(
+        FakeDownloader(audio_dir, fail={"video1"}), FakeSTTClient(transcript_dir), FakeProcessor(delay=0), job=job
+    )
+
+    pipeline.run(["video0", "video1", "video2"])
+
+    progress = job.to_dict()["progress"]
+    assert progress["download"] == {"done": 3, "total": 3, "failed": 1}
+    assert progress["transcribe"] == {"done": 2, "total": 2, "failed": 0}
+    assert progress["embed"] == {"done": 2, "total": 2, "failed": 0, "chunks": 10}
+
+
+def test_existing_transcripts_are_not_requested_again(dirs):
+    audio_dir, transcript_dir = dirs
+    with open(os.path.join(transcript_dir, "video0.json"), "w") as f:
+        f.write("{}")
+    pipeline = IngestionPipeline(FakeDownloader(audio_dir), FakeSTTClient(transcript_dir), FakeProcessor(delay=0))
+
+    result = pipeline.run(["video0", "video1"])
+
+    assert sorted(status["status"] for status in result["transcripts"]) == ["done", "skipped"]
+    assert sorted(pipeline.processor.embedded) == ["video0", "video1"]
+
+
+def test_embed_errors_are_recorded(dirs):
+    audio_dir, transcript_dir = dirs
+    class BrokenProcessor(FakeProcessor):
+        def process_document(self, path, metadata):
+            raise ValueError("bad transcript")
+
+    manifest = Mock()
+    pipeline = IngestionPipeline(FakeDownloader(audio_dir), FakeSTTClient(transcript_dir), BrokenProcessor(), manifest=manifest)
+
+    result = pipeline.run(["video0"])
+
+    assert result["failed"]["embed"] == {"video0": "bad transcript"}
+    assert result["chunks"] == 0
+    # Left for the next run to embed again
+    manifest.mark_indexed.assert_not_called()
+
+
+def test_crashed_stage_stops_the_pipeline(dirs):
+    audio_dir, transcript_dir = dirs
+    stt_client = FakeSTTClient(transcript_dir)
+    stt_client.transcript_path = lambda audio_file: 1 / 0
+    pipeline = IngestionPipeline(FakeDownloader(audio_dir), stt_client, FakeProcessor(delay=0))
+
+    with pytest.raises(ZeroDivisionError):
+        pipeline.run([f"video{i}" for i in range(5)])
+
+
+def test_job_progress_and_cancellation(dirs):
+    audio_dir, transcript_dir = dirs
+    manager = JobManager(max_workers=1)
+    embedded = threading.Event()
+
+    class SignallingProcessor(FakeProcessor):
+        def process_document(self, path, metadata):
+            chunks = super().process_document(path, metadata)
+            embedded.set()
+            return chunks
+
+    def work(job, urls):
+        pipeline = IngestionPipeline(FakeDownloader(audio_dir), FakeSTTClient(transcript_dir), SignallingProcessor(), job=job)
+        return pipeline.run(urls)
+
+    try:
+        job = manager.submit(work, [f"video{i}" for i in range(30)])
+        assert embedded.wait(5)
+        state = job.to_dict()
+        assert state["progress"]["download"]["total"] == 30
+        assert state["progress"]["embed"]["done"] >= 1
+        assert state["progress"]["embed"]["chunks"] >= 5
+
+        manager.cancel(job.id)
+        job.future.result(timeout=5)
+        state = job.to_dict()
+        assert state["status"] == "cancelled"
+        assert state["progress"]["download"]["done"] < 30
+    finally:
+        manager.shutdown()
+
+
+def test_existing_transcripts_go_straight_to_embedding(dirs):
+    audio_dir, transcript_dir = dirs
+    transcript = os.path.join(transcript_dir, "old.json")
+    with open(transcript, "w") as f:
+        f.write("{}")
+    downloader = FakeDownloader(audio_dir)
+    pipeline = IngestionPipeline(downloader, FakeSTTClient(transcript_dir), FakeProcessor(delay=0))
+
+    result = pipeline.run(["video0"], transcripts=[transcript])
+
+    assert downloader.downloaded == ["video0"]
+    assert sorted(pipeline.processor.embedded) == ["old", "video0"]
+    assert result["chunks"] == 10
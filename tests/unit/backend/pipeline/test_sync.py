@@ -0,0 +1,93 @@
+import json
+import os
+from unittest.mock import Mock
+
+import pytest
+from llama_sensei.backend.add_courses.speech_to_text.transcript import DeepgramSTTClient
+from llama_sensei.backend.add_courses.sync import CourseSync, plan_sync
+from llama_sensei.backend.add_courses.vectordb.load_text import compact_path
+from llama_sensei.backend.add_courses.yt_api.audio import YouTubeAudioDownloader
+
+
+def entry(video_id, duration=100):
+    return {"id": video_id, "url": f"https://www.youtube.com/watch?v={video_id}", "duration": duration}
+
+
+def test_plan_sync():
+    entries = [entry("a"), entry("b"), entry("c", duration=250), entry("d")]
+    recorded = [{"id": "a", "duration": 100}, {"id": "c", "duration": 100}, {"id": "gone", "duration": 5}]
+    indexed = {"a", "c", "old"}
+
+    plan = plan_sync(entries, recorded, indexed)
+
+    assert plan == {
+        "new": ["b", "d"],
+        "changed": ["c"],
+        "unchanged": ["a"],
+        "removed": ["gone", "old"],
+    }
+
+
+def test_plan_sync_unknown_duration_is_unchanged():
+    plan = plan_sync([entry("a", duration=None)], [{"id": "a", "duration": "Unknown"}], {"a"})
+    assert plan["unchanged"] == ["a"]
+
+
+@pytest.fixture
+def course(tmp_path):
+    downloader = YouTubeAudioDownloader(str(tmp_path), "course")
+    os.makedirs(os.path.join(downloader.output_course_path, "audio"))
+    stt_client = DeepgramSTTClient(output_path=os.path.join(downloader.output_course_path, "transcript"))
+    vector_db = Mock()
+    return downloader, stt_client, vector_db
+
+
+def touch(path, content="{}"):
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def test_prepare_only_returns_new_and_changed(course):
+    downloader, stt_client, vector_db = course
+    touch(downloader.metadata_file, json.dumps([{"id": "a", "duration": 100}, {"id": "c", "duration": 100}, {"id": "gone"}]))
+    downloader = YouTubeAudioDownloader(os.path.dirname(downloader.output_course_path), "course")
+    touch(stt_client.transcript_path("c"))
+    touch(stt_client.transcript_path("gone"))
+    vector_db.get_video_ids.return_value = {"a", "c", "gone"}
+    manifest = Mock()
+
+    sync = CourseSync(downloader, stt_client, vector_db, "course", manifest)
+    prepared = sync.prepare([entry("a"), entry("b"), entry("c", duration=250), entry("d")])
+
+    assert prepared["entries"] == [entry("b"), entry("c", duration=250), entry("d")]
+    # The changed video is dropped so it is indexed again from scratch
+    vector_db.delete_video.assert_called_once_with("course", "c")
+    manifest.forget.assert_called_once_with(["c"])
+    assert not os.path.exists(stt_client.transcript_path("c"))
+    # Removed videos are kept unless asked otherwise
+    assert os.path.exists(stt_client.transcript_path("gone"))
+    assert prepared["plan"]["removed"] == ["gone"]
+
+
+def test_prepare_deletes_removed_videos(course):
+    downloader, stt_client, vector_db = course
+    touch(downloader.metadata_file, json.dumps([{"id": "a"}, {"id": "gone"}]))
+    downloader = YouTubeAudioDownloader(os.path.dirname(downloader.output_course_path), "course")
+    touch(stt_client.transcript_path("gone"))
+    compact_file = compact_path(stt_client.transcript_path("gone"))
+    touch(compact_file)
+    touch(stt_client.transcript_path("gone_2"))  # another video, kept
+    touch(downloader.audio_path("gone"), "audio")
+    vector_db.get_video_ids.return_value = {"a", "gone"}
+
+    sync = CourseSync(downloader, stt_client, vector_db, "course")
+    prepared = sync.prepare([entry("a")], delete_removed=True)
+
+    assert prepared["entries"] == []
+    vector_db.delete_video.assert_called_once_with("course", "gone")
+    assert not os.path.exists(stt_client.transcript_path("gone"))
+    assert not os.path.exists(compact_file)
+    assert os.path.exists(stt_client.transcript_path("gone_2"))
+    assert not os.path.exists(downloader.audio_path("gone"))
+    with open(downloader.metadata_file) as f:
+        assert [video["id"] for video in json.load(f)] == ["a"]
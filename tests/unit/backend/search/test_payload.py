@@ -0,0 +1,47 @@
+import base64
+
+import msgpack
+import numpy as np
+from llama_sensei.backend.add_courses.payload import pack, search_payload, wants_msgpack
+from llama_sensei.backend.add_courses.schemas import SearchResponse
+
+DOCUMENTS = ["first", "second"]
+METADATAS = [{"video_id": "a", "start": 0.0}, {"video_id": "b", "start": 4.5}]
+EMBEDDINGS = np.random.rand(2, 384).astype(np.float32)
+
+def test_list_format_is_unchanged():
+    payload = search_payload(DOCUMENTS, METADATAS, EMBEDDINGS.tolist())
+    assert payload == {"documents": DOCUMENTS, "metadatas": METADATAS, "embeddings": EMBEDDINGS.tolist()}
+    SearchResponse(**payload)
+
+def test_none_format_leaves_embeddings_out():
+    payload = search_payload(DOCUMENTS, METADATAS, EMBEDDINGS, "none")
+    assert payload == {"documents": DOCUMENTS, "metadatas": METADATAS}
+    assert SearchResponse(**payload).embeddings is None
+
+def test_base64_format_round_trips():
+    payload = search_payload(DOCUMENTS, METADATAS, EMBEDDINGS, "base64")
+    SearchResponse(**payload)
+    decoded = np.frombuffer(base64.b64decode(payload["embeddings_b64"]), dtype="<f4")
+    assert np.array_equal(decoded.reshape(-1, payload["embedding_dim"]), EMBEDDINGS)
+    assert "embeddings" not in payload
+
+def test_msgpack_body_carries_raw_float32():
+    payload = search_payload(DOCUMENTS, METADATAS, EMBEDDINGS, "list", binary=True)
+    body = pack(payload)
+    unpacked = msgpack.unpackb(body, raw=False)
+    decoded = np.frombuffer(unpacked["embeddings"], dtype="<f4").reshape(2, unpacked["embedding_dim"])
+    assert np.array_equal(decoded, EMBEDDINGS)
+    assert unpacked["metadatas"] == METADATAS
+    # Several times smaller than the float lists as JSON
+    import json
+    assert len(body) * 3 < len(json.dumps(search_payload(DOCUMENTS, METADATAS, EMBEDDINGS)))
+
+def test_no_hits():
+    payload = search_payload([], [], [], "base64")
+    assert payload["embeddings_b64"] == ""
+
+def test_wants_msgpack():
+    assert wants_msgpack("application/msgpack, application/json;q=0.9")
+    assert not wants_msgpack("application/json")
+    assert not wants_msgpack(None)
@@ -1,3 +1,4 @@
+import numpy as np
 import pytest
 from unittest.mock import Mock, patch
 from llama_sensei.backend.add_courses.vectordb.document_processor import DocumentProcessor
@@ -52,45 +53,111 @@ def test_process_document(document_processor, mock_text_processor, mock_vector_d
     Ensures that:
     1. The TranscriptLoader is called with the correct path.
     2. The text processing methods are called the correct number of times.
-    3. The embedding method is called.
-    4. The vector database add_embedding method is called the correct number of times.
+    3. The embedding method is called once for the whole document.
+    4. A document smaller than a window is written with a single add_embeddings call.
     """
     mock_transcript_loader = Mock()
-    mock_transcript_loader.load_data.return_value = ["Sentence 1.", "Sentence 2.", "Sentence 3.", "Sentence 4."]
+    mock_transcript_loader.iter_paragraphs.return_value = iter([
+        ("Sentence 1.", 0, 1), ("Sentence 2.", 1, 2), ("Sentence 3.", 2, 3), ("Sentence 4.", 3, 4)
+    ])
 
     # Mock the return value of merge_text
-    mock_text_processor.merge_text.side_effect = lambda x: "".join(x)
+    mock_text_processor.merge_text.side_effect = lambda x: (" ".join(s[0] for s in x), x[0][1], x[-1][2])
 
     # Mock the return value of preprocess_text
-    mock_text_processor.preprocess_text.return_value = ["Preprocessed chunk 1", "Preprocessed chunk 2"]
+    mock_text_processor.preprocess_text.return_value = [("Preprocessed chunk 1", 0, 2), ("Preprocessed chunk 2", 2, 4)]
 
-    # Mock the return value of embed_chunks
-    mock_embedder.embed_chunks.return_value = [
-        ("Preprocessed chunk 1", [0.1, 0.2, 0.3], 0, 2),
-        ("Preprocessed chunk 2", [0.4, 0.5, 0.6], 2, 4)
-    ]
+    # Mock the return value of embed_chunks: one row per chunk
+    mock_embedder.embed_chunks.return_value = np.array([[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]], dtype=np.float32)
 
     with patch('llama_sensei.backend.add_courses.vectordb.document_processor.TranscriptLoader', return_value=mock_transcript_loader):
         document_processor.process_document("test_path", {"video_id": "123"}, num_st_each_chunk=2)
 
     # Verify that methods were called with correct arguments
-    mock_transcript_loader.load_data.assert_called_once()
+    mock_transcript_loader.iter_paragraphs.assert_called_once()
     assert mock_text_processor.merge_text.call_count == 2
     mock_text_processor.preprocess_text.assert_called_once()
     mock_embedder.embed_chunks.assert_called_once()
-    assert mock_vector_db.add_embedding.call_count == 2
+    mock_vector_db.add_embedding.assert_not_called()
+    mock_vector_db.add_embeddings.assert_called_once()
+
+    # Verify the arguments of the bulk add_embeddings call
+    args, kwargs = mock_vector_db.add_embeddings.call_args
+    assert args[0] == "test_collection"  # collection name
+    assert kwargs["documents"] == ["Sentence 1. Sentence 2.", "Sentence 3. Sentence 4."]  # raw text
+    assert np.allclose(kwargs["embeddings"], [[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]])
+    assert kwargs["metadatas"] == [
+        {"video_id": "123", "start": 0, "end": 2},
+        {"video_id": "123", "start": 2, "end": 4},
+    ]
+    assert kwargs["ids"] == ["123_0", "123_1"]  # document IDs
+    assert kwargs["texts"] == ["Preprocessed chunk 1", "Preprocessed chunk 2"]  # lexical index
 
-    # Verify the arguments of add_embedding calls
-    call_args_list = mock_vector_db.add_embedding.call_args_list
-    assert call_args_list[0][0][1] == "S"  # raw text for first chunk (first character only)
-    assert call_args_list[1][0][1] == "S"  # raw text for second chunk (first character only)
+def _run_windowed(document_processor, mock_text_processor, mock_embedder, paragraphs, window_size):
+    mock_text_processor.merge_text.side_effect = lambda x: (" ".join(s[0] for s in x), x[0][1], x[-1][2])
+    mock_text_processor.preprocess_text.side_effect = lambda chunks: [(c[0].lower(), c[1], c[2]) for c in chunks]
+    mock_embedder.embed_chunks.side_effect = lambda chunks: np.array([[c[1], c[2]] for c in chunks], dtype=np.float32)
+    mock_transcript_loader = Mock()
+    mock_transcript_loader.iter_paragraphs.return_value = paragraphs
+    with patch('llama_sensei.backend.add_courses.vectordb.document_processor.TranscriptLoader', return_value=mock_transcript_loader):
+        return document_processor.process_document(
+            "test_path", {"video_id": "123"}, num_st_each_chunk=2, window_size=window_size
+        )
 
-    # Verify other arguments of add_embedding calls
-    for i, call_args in enumerate(call_args_list):
-        assert call_args[0][0] == "test_collection"  # collection name
-        assert call_args[0][2] == [0.1, 0.2, 0.3] if i == 0 else [0.4, 0.5, 0.6]  # embedding
-        assert call_args[0][3] == {"video_id": "123", "start": 0 if i == 0 else 2, "end": 2 if i == 0 else 4}  # metadata
-        assert call_args[0][4] == f"123_{i}"  # document ID
+def test_process_document_in_windows(document_processor, mock_text_processor, mock_vector_db, mock_embedder):
+    """
+    Chunks are written window by window, with the same ids and start/end
+    metadata as when the whole document fits in one window.
+    """
+    paragraphs = [(f"Sentence {i}.", i, i + 1) for i in range(9)]
+    assert _run_windowed(document_processor, mock_text_processor, mock_embedder, iter(paragraphs), 100) == 5
+    whole = mock_vector_db.add_embeddings.call_args.kwargs
+    mock_vector_db.add_embeddings.reset_mock()
+
+    assert _run_windowed(document_processor, mock_text_processor, mock_embedder, iter(paragraphs), 2) == 5
+    calls = [c.kwargs for c in mock_vector_db.add_embeddings.call_args_list]
+    assert [len(c["ids"]) for c in calls] == [2, 2, 1]
+    for key in ("documents", "metadatas", "ids"):
+        assert [item for c in calls for item in c[key]] == whole[key]
+    assert np.array_equal(np.vstack([c["embeddings"] for c in calls]), whole["embeddings"])
+    assert whole["ids"] == ["123_0", "123_1", "123_2", "123_3", "123_4"]
+    assert whole["metadatas"][-1] == {"video_id": "123", "start": 8, "end": 9}
+
+def test_process_document_default_window(document_processor, mock_text_processor, mock_vector_db, mock_embedder):
+    document_processor.window_size = 2
+    paragraphs = [(f"Sentence {i}.", i, i + 1) for i in range(9)]
+    assert _run_windowed(document_processor, mock_text_processor, mock_embedder, iter(paragraphs), None) == 5
+    assert [len(c.kwargs["ids"]) for c in mock_vector_db.add_embeddings.call_args_list] == [2, 2, 1]
+
+def test_process_document_streams_paragraphs(document_processor, mock_text_processor, mock_vector_db, mock_embedder):
+    """
+    Only the paragraphs of the current window are read before it is written.
+    """
+    consumed = []
+    def paragraphs():
+        for i in range(100):
+            consumed.append(i)
+            yield (f"Sentence {i}.", i, i + 1)
+    read_before_write = []
+    mock_vector_db.add_embeddings.side_effect = lambda *a, **kw: read_before_write.append(len(consumed)) or True
+
+    assert _run_windowed(document_processor, mock_text_processor, mock_embedder, paragraphs(), 5) == 50
+    assert read_before_write[:3] == [10, 20, 30]
+
+def test_process_document_unreadable(document_processor, mock_vector_db):
+    mock_transcript_loader = Mock()
+    mock_transcript_loader.iter_paragraphs.return_value = None
+    with patch('llama_sensei.backend.add_courses.vectordb.document_processor.TranscriptLoader', return_value=mock_transcript_loader):
+        with pytest.raises(ValueError):
+            document_processor.process_document("test_path", {"video_id": "123"})
+    mock_vector_db.add_embeddings.assert_not_called()
+
+def test_process_document_fails_when_a_window_is_not_written(document_processor, mock_text_processor, mock_vector_db, mock_embedder):
+    # Raised, so that the pipeline does not record the video as indexed
+    mock_vector_db.add_embeddings.return_value = False
+    paragraphs = [(f"Sentence {i}.", i, i + 1) for i in range(4)]
+    with pytest.raises(RuntimeError):
+        _run_windowed(document_processor, mock_text_processor, mock_embedder, iter(paragraphs), 100)
 
 def test_search(document_processor, mock_text_processor, mock_vector_db, mock_embedder):
     """
@@ -109,7 +176,43 @@ def test_search(document_processor, mock_text_processor, mock_vector_db, mock_em
     
     mock_text_processor._preprocess.assert_called_once_with(query)
     mock_embedder.embed.assert_called_once_with("preprocessed query")
-    mock_vector_db.search_embeddings.assert_called_once_with("test_collection", [0.1, 0.2, 0.3], 3)
+    mock_vector_db.search_embeddings.assert_called_once_with("test_collection", [0.1, 0.2, 0.3], 3, filters=None)
+
+def test_search_with_filters(document_processor, mock_text_processor, mock_vector_db, mock_embedder):
+    mock_embedder.embed.return_value = [0.1, 0.2, 0.3]
+    filters = {"video_ids": ["abc"], "start_after": 60.0}
+    document_processor.search("test query", top_k=3, filters=filters)
+    mock_vector_db.search_embeddings.assert_called_once_with("test_collection", [0.1, 0.2, 0.3], 3, filters=filters)
+
+def test_hybrid_search(document_processor, mock_text_processor, mock_vector_db, mock_embedder):
+    mock_text_processor._preprocess.return_value = "kernel trick"
+    mock_embedder.embed.return_value = [0.1, 0.2, 0.3]
+    document_processor.search("the kernel trick", top_k=3, mode="hybrid")
+    mock_vector_db.search_embeddings.assert_not_called()
+    mock_vector_db.search_hybrid.assert_called_once_with(
+        "test_collection", [0.1, 0.2, 0.3], "kernel trick", 3, filters=None
+    )
+    # The same preprocessed text is embedded and searched by BM25
+    mock_text_processor._preprocess.assert_called_once_with("the kernel trick")
+    mock_embedder.embed.assert_called_once_with("kernel trick")
+
+def test_search_batch(document_processor, mock_text_processor, mock_vector_db, mock_embedder):
+    """
+    A batch of queries is preprocessed one by one, encoded in a single call
+    and searched with a single multi-query search.
+    """
+    mock_text_processor._preprocess.side_effect = lambda q: f"pp {q}"
+    mock_embedder.embed.return_value = np.array([[0.1, 0.2], [0.3, 0.4], [0.5, 0.6]])
+
+    document_processor.search_batch(["q1", "q2", "q3"], top_k=4)
+
+    mock_embedder.embed.assert_called_once_with(["pp q1", "pp q2", "pp q3"], batch_size=3)
+    args = mock_vector_db.search_embeddings_batch.call_args.args
+    assert mock_vector_db.search_embeddings_batch.call_args.kwargs == {"filters": None}
+    assert args[0] == "test_collection"
+    assert args[1].dtype == np.float32 and args[1].shape == (3, 2)
+    assert args[2] == 4
+    mock_vector_db.search_embeddings.assert_not_called()
 
 def test_erase_all_data(document_processor, mock_vector_db):
     """
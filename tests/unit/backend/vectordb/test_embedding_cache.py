@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+from unittest.mock import Mock
+from llama_sensei.backend.add_courses.vectordb.document_processor import DocumentProcessor
+from llama_sensei.backend.add_courses.vectordb.embedding_cache import EmbeddingCache
+
+DIM = 4
+
+
+def vectors(n, start=0):
+    return np.arange(start * DIM, (start + n) * DIM, dtype=np.float32).reshape(n, DIM)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return EmbeddingCache(str(tmp_path), "all-MiniLM-L12-v2", DIM, max_entries=5)
+
+
+def test_miss_then_hit(cache):
+    embeddings, missing = cache.get_many(["a", "b"])
+    assert missing == [0, 1]
+
+    cache.put_many(["a", "b"], vectors(2))
+    embeddings, missing = cache.get_many(["b", "c", "a"])
+
+    assert missing == [1]
+    np.testing.assert_array_equal(embeddings[[0, 2]], vectors(2)[[1, 0]])
+    assert cache.stats() == {"entries": 2, "capacity": 5, "hits": 2, "misses": 3, "evictions": 0}
+
+
+def test_persists_across_instances(tmp_path, cache):
+    cache.put_many(["a", "b"], vectors(2))
+
+    reopened = EmbeddingCache(str(tmp_path), "all-MiniLM-L12-v2", DIM, max_entries=5)
+    embeddings, missing = reopened.get_many(["a", "b"])
+
+    assert missing == []
+    np.testing.assert_array_equal(embeddings, vectors(2))
+
+
+def test_keyed_by_model(tmp_path, cache):
+    cache.put_many(["a"], vectors(1))
+    other = EmbeddingCache(str(tmp_path), "sentence-transformers/other-model", DIM, max_entries=5)
+    assert other.get_many(["a"])[1] == [0]
+    assert cache.key("a") != other.key("a")
+
+
+def test_dimension_change_starts_afresh(tmp_path, cache):
+    cache.put_many(["a"], vectors(1))
+    resized = EmbeddingCache(str(tmp_path), "all-MiniLM-L12-v2", DIM * 2, max_entries=5)
+    assert len(resized) == 0
+
+
+def test_least_recently_used_is_evicted(cache):
+    cache.put_many(["a", "b", "c", "d", "e"], vectors(5))
+    cache.get_many(["a"])  # a is now the most recently used
+
+    cache.put_many(["f", "g"], vectors(2, start=5))
+
+    _, missing = cache.get_many(["a", "b", "c", "d", "e", "f", "g"])
+    assert missing == [1, 2]
+    assert len(cache) == 5
+    assert cache.stats()["evictions"] == 2
+
+
+def test_batch_larger_than_cache_keeps_the_last_entries(cache):
+    texts = [f"text {i}" for i in range(8)]
+    cache.put_many(texts, vectors(8))
+
+    embeddings, missing = cache.get_many(texts)
+    assert missing == [0, 1, 2]
+    np.testing.assert_array_equal(embeddings[3:], vectors(8)[3:])
+
+
+def test_process_document_only_embeds_uncached_chunks(cache):
+    text_processor = Mock()
+    text_processor.merge_text.side_effect = lambda x: (" ".join(s[0] for s in x), x[0][1], x[-1][2])
+    text_processor.preprocess_text.side_effect = lambda chunks: [(text.lower(), start, end) for text, start, end in chunks]
+    embedder = Mock()
+    embedder.embed_texts.side_effect = lambda texts: vectors(len(texts), start=len(cache))
+    vector_db = Mock()
+    processor = DocumentProcessor(vector_db, "course", search_only=True, text_processor=text_processor, embedder=embedder, cache=cache)
+    cache.put_many(["b"], vectors(1, start=9))
+
+    with pytest.MonkeyPatch.context() as mp:
+        loader = Mock()
+        loader.iter_paragraphs.return_value = iter([("A", 0, 1), ("B", 1, 2), ("C", 2, 3)])
+        mp.setattr('llama_sensei.backend.add_courses.vectordb.document_processor.TranscriptLoader', lambda path: loader)
+        processor.process_document("path", {"video_id": "v"}, num_st_each_chunk=1)
+
+    embedder.embed_texts.assert_called_once_with(["a", "c"])
+    embeddings = vector_db.add_embeddings.call_args.kwargs["embeddings"]
+    np.testing.assert_array_equal(embeddings[1], vectors(1, start=9)[0])
+    assert processor.cache_stats == {"hits": 1, "misses": 2}
+    # The new chunks are cached for the next run
+    assert cache.get_many(["a", "c"])[1] == []
+
+
+def test_crash_never_leaves_keys_without_their_vectors(cache, mocker):
+    cache.put_many(["a", "b", "c", "d", "e"], vectors(5))
+    arrays = {"vectors": cache._vectors, "keys": cache._keys, "used": cache._used}
+    # What survives a crash: each array as of its last flush, the one being
+    # flushed either way
+    disk = {name: np.array(array) for name, array in arrays.items()}
+    crashes = []
+
+    def flush(array):
+        name = next(name for name, other in arrays.items() if other is array)
+        crashes.append(dict(disk))
+        disk[name] = np.array(array)
+        crashes.append(dict(disk))
+
+    mocker.patch.object(np.memmap, "flush", autospec=True, side_effect=flush)
+    # Evicts a and b, their slots take f and g
+    cache.put_many(["f", "g"], vectors(2, start=5))
+
+    expected = {cache.key(text): row for text, row in zip("abcdefg", vectors(7))}
+    for state in crashes:
+        for slot in np.flatnonzero(state["used"]):
+            np.testing.assert_array_equal(state["vectors"][slot], expected[state["keys"][slot].tobytes()])
+    assert cache.get_many(list("cdefg"))[1] == []
@@ -1,9 +1,12 @@
+import os
+
 import pytest
 import numpy as np
 from typing import List
+from unittest.mock import patch
 import torch
 from sentence_transformers import SentenceTransformer
-from llama_sensei.backend.add_courses.vectordb.get_embedding import Embedder
+from llama_sensei.backend.add_courses.vectordb.get_embedding import Embedder, _encode_worker
 
 @pytest.fixture
 def embedder():
@@ -28,11 +31,10 @@ def test_embed_chunks(embedder):
         ("Chunk 3", 21, 30),
     ]
     embedded_chunks = embedder.embed_chunks(chunks)
-    assert len(embedded_chunks) == 3
-    for chunk in embedded_chunks:
-        assert len(chunk) == 4
-        assert isinstance(chunk[1], np.ndarray)
-        assert chunk[1].ndim == 1
+    assert isinstance(embedded_chunks, np.ndarray)
+    assert embedded_chunks.shape == (3, embedder.dimension)
+    assert embedded_chunks.dtype == np.float32
+    assert embedded_chunks.flags['C_CONTIGUOUS']
 
 def test_embed_chunks_with_top_chunks(embedder):
     chunks = [
@@ -41,11 +43,7 @@ def test_embed_chunks_with_top_chunks(embedder):
         ("Chunk 3", 21, 30),
     ]
     embedded_chunks = embedder.embed_chunks(chunks, top_chunks=2)
-    assert len(embedded_chunks) == 2
-    for chunk in embedded_chunks:
-        assert len(chunk) == 4
-        assert isinstance(chunk[1], np.ndarray)
-        assert chunk[1].ndim == 1
+    assert embedded_chunks.shape == (2, embedder.dimension)
 
 def test_embed_empty_document(embedder):
     doc = ""
@@ -57,6 +55,7 @@ def test_embed_chunks_empty_list(embedder):
     chunks = []
     embedded_chunks = embedder.embed_chunks(chunks)
     assert len(embedded_chunks) == 0
+    assert embedded_chunks.shape == (0, embedder.dimension)
 
 @pytest.mark.parametrize("model_name", ["all-MiniLM-L6-v2", "paraphrase-MiniLM-L3-v2"])
 def test_embedder_with_different_models(model_name):
@@ -72,4 +71,122 @@ def test_embed_chunks_consistency(embedder):
     embedded_chunks1 = embedder.embed_chunks(chunks)
     embedded_chunks2 = embedder.embed_chunks(chunks)
     for chunk1, chunk2 in zip(embedded_chunks1, embedded_chunks2):
-        assert np.allclose(chunk1[1], chunk2[1])
\ No newline at end of file
+        assert np.allclose(chunk1, chunk2)
+
+def test_embed_chunks_matches_single_embed(embedder):
+    chunks = [
+        ("A much longer chunk of lecture text about gradient descent.", 0, 10),
+        ("Short", 11, 20),
+        ("Medium sized chunk", 21, 30),
+    ]
+    embedded_chunks = embedder.embed_chunks(chunks, batch_size=2)
+    for i, chunk in enumerate(chunks):
+        assert np.allclose(embedded_chunks[i], embedder.embed(chunk[0]), atol=1e-5)
+
+def test_embed_documents(embedder):
+    documents = [
+        [("Doc 1 chunk 1", 0, 1), ("Doc 1 chunk 2", 1, 2)],
+        [],
+        [("Doc 3 chunk 1", 0, 1)],
+    ]
+    embedded = embedder.embed_documents(documents)
+    assert [len(e) for e in embedded] == [2, 0, 1]
+    assert np.allclose(embedded[2][0], embedder.embed_chunks(documents[2])[0], atol=1e-5)
+
+
+class FakeModel:
+    """Encodes a text as [len(text), index of text in the batch]."""
+    def __init__(self):
+        self.batches = []
+
+    def get_sentence_embedding_dimension(self):
+        return 2
+
+    def encode(self, texts, batch_size=None, convert_to_numpy=True):
+        self.batches.append(list(texts))
+        return np.array([[len(t), i] for i, t in enumerate(texts)], dtype=np.float64)
+
+    def encode_multi_process(self, texts, pool, batch_size=32, chunk_size=None):
+        # Like sentence-transformers: chunks of chunk_size texts, one encode each
+        return np.vstack([
+            self.encode(texts[i : i + chunk_size], batch_size=batch_size)
+            for i in range(0, len(texts), chunk_size)
+        ])
+
+    @staticmethod
+    def stop_multi_process_pool(pool):
+        pool["started"] = False
+
+@pytest.fixture
+def fake_embedder():
+    with patch('llama_sensei.backend.add_courses.vectordb.get_embedding.SentenceTransformer') as mock_st:
+        mock_st.return_value.to.return_value = FakeModel()
+        yield Embedder(batch_size=2)
+
+def fake_start_encode_pool(model, workers, threads):
+    model.pool = {"devices": ["cpu"] * workers, "threads": threads, "started": True}
+    return model.pool
+
+@pytest.fixture
+def fake_pool_embedder():
+    with patch('llama_sensei.backend.add_courses.vectordb.get_embedding.SentenceTransformer') as mock_st, \
+         patch('llama_sensei.backend.add_courses.vectordb.get_embedding.start_encode_pool', fake_start_encode_pool), \
+         patch('llama_sensei.backend.add_courses.vectordb.get_embedding.torch.cuda.is_available', return_value=False):
+        mock_st.return_value.to.return_value = FakeModel()
+        yield Embedder(batch_size=2, workers=3)
+
+def test_embed_texts_sorted_batches_keep_input_order(fake_embedder):
+    texts = ["bb", "a", "dddd", "ccc", "eeeee"]
+    embeddings = fake_embedder.embed_texts(texts)
+
+    # Micro-batches are formed longest first to minimise padding
+    assert fake_embedder.model.batches == [["eeeee", "dddd"], ["ccc", "bb"], ["a"]]
+    # Rows come back in the original order as a contiguous float32 matrix
+    assert embeddings[:, 0].tolist() == [2, 1, 4, 3, 5]
+    assert embeddings.dtype == np.float32
+    assert embeddings.flags['C_CONTIGUOUS']
+
+def test_embed_texts_records_throughput(fake_embedder):
+    fake_embedder.embed_texts(["one", "two", "three"])
+    assert fake_embedder.stats["chunks"] == 3
+    assert fake_embedder.throughput() > 0
+def test_embed_texts_in_pool_matches_serial(fake_embedder, fake_pool_embedder):
+    """
+    The multi-process path encodes the same micro-batches as the serial one.
+    """
+    texts = ["bb", "a", "dddd", "ccc", "eeeee"]
+    serial = fake_embedder.embed_texts(texts)
+    parallel = fake_pool_embedder.embed_texts(texts)
+
+    assert np.array_equal(parallel, serial)
+    assert fake_pool_embedder.model.batches == fake_embedder.model.batches
+    assert fake_pool_embedder.model.pool["devices"] == ["cpu"] * 3
+    assert fake_pool_embedder.stats["chunks"] == 5
+
+def test_pool_workers_limit_their_own_threads(fake_pool_embedder, monkeypatch):
+    monkeypatch.setenv("OMP_NUM_THREADS", "7")
+    fake_pool_embedder.embed_texts(["a", "bb", "ccc"])
+    assert fake_pool_embedder.model.pool["threads"] == max(1, (os.cpu_count() or 1) // 3)
+    # The service's environment, inherited by whatever it spawns, is left alone
+    assert os.environ["OMP_NUM_THREADS"] == "7"
+
+def test_encode_worker_sets_its_threads():
+    previous = torch.get_num_threads()
+    try:
+        with patch.object(SentenceTransformer, "_multi_process_worker") as worker:
+            _encode_worker(1, "cpu", "model", "input", "output")
+        assert torch.get_num_threads() == 1
+        worker.assert_called_once_with("cpu", "model", "input", "output")
+    finally:
+        torch.set_num_threads(previous)
+
+def test_small_inputs_skip_the_pool(fake_pool_embedder):
+    fake_pool_embedder.embed_texts(["one", "two"])
+    assert not hasattr(fake_pool_embedder.model, "pool")
+
+def test_close_stops_the_pool(fake_pool_embedder):
+    fake_pool_embedder.embed_texts(["a", "bb", "ccc"])
+    pool = fake_pool_embedder.model.pool
+    fake_pool_embedder.close()
+    assert pool["started"] is False
+    assert fake_pool_embedder._pool is None
@@ -0,0 +1,170 @@
+import numpy as np
+import pytest
+from llama_sensei.backend.add_courses.vectordb.lexical_index import (
+    LexicalIndex,
+    reciprocal_rank_fusion,
+    tokenize,
+)
+from llama_sensei.backend.add_courses.vectordb.result_cache import SearchResultCache
+from llama_sensei.backend.add_courses.vectordb.vector_db_operations import ChromaVectorDB
+
+# Already preprocessed, as written by DocumentProcessor
+TEXTS = [
+    "gradient descent minim loss , step size learn rate .",
+    "kernel trick support vector machin .",
+    "learn rate schedul gradient descent converg",
+    "bellman equat valu iter",
+]
+METADATAS = [
+    {"video_id": "video0", "start": 0.0, "end": 30.0},
+    {"video_id": "video0", "start": 30.0, "end": 60.0},
+    {"video_id": "video1", "start": 0.0, "end": 30.0, "lecture": 2},
+    {"video_id": "video1", "start": 30.0, "end": 60.0, "lecture": 2},
+]
+IDS = ["video0_0", "video0_1", "video1_0", "video1_1"]
+
+@pytest.fixture
+def index(tmp_path):
+    index = LexicalIndex(str(tmp_path))
+    index.add("course", IDS, TEXTS, METADATAS)
+    index.build("course")
+    return index
+
+def test_tokenize_drops_punctuation():
+    assert tokenize("Gradient descent , step ( size ) .") == ["gradient", "descent", "step", "size"]
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+    assert [id for id, _ in fused] == ["a", "c", "b"]
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
+
+def test_exact_term_ranks_first(index):
+    assert [id for id, _ in index.search("course", "bellman equat")] == ["video1_1"]
+    assert [id for id, _ in index.search("course", "kernel")] == ["video0_1"]
+    assert index.search("course", "unknown term") == []
+
+def test_rarer_and_repeated_terms_score_higher(index):
+    hits = index.search("course", "learn rate schedul")
+    assert [id for id, _ in hits] == ["video1_0", "video0_0"]
+    assert hits[0][1] > hits[1][1] > 0
+
+def test_top_k(index):
+    assert len(index.search("course", "gradient learn kernel bellman", top_k=2)) == 2
+
+@pytest.mark.parametrize("filters, expected", [
+    ({"video_ids": ["video1"]}, ["video1_0"]),
+    ({"start_after": 30.0}, []),
+    ({"end_before": 30.0}, ["video0_0", "video1_0"]),
+    ({"metadata": {"lecture": 2}}, ["video1_0"]),
+])
+def test_filters(index, filters, expected):
+    hits = index.search("course", "gradient descent", filters=filters)
+    assert sorted(id for id, _ in hits) == expected
+
+def test_index_follows_writes(index):
+    assert index.search("course", "bellman")
+    # Re-adding an id replaces the chunk, like the vector db upsert, once built
+    index.add("course", ["video1_1"], ["polici gradient"], [METADATAS[3]])
+    assert index.search("course", "polici") == []
+    index.build("course")
+    assert index.search("course", "bellman") == []
+    assert "video1_1" in [id for id, _ in index.search("course", "polici")]
+
+    index.delete_video("course", "video0")
+    assert index.search("course", "kernel") == []
+    assert sorted(id for id, _ in index.search("course", "gradient")) == ["video1_0", "video1_1"]
+
+    index.delete_collection("course")
+    assert index.search("course", "gradient") == []
+
+def test_searches_before_the_first_build_find_nothing(tmp_path):
+    index = LexicalIndex(str(tmp_path))
+    index.build("course")  # no chunks yet
+    index.add("course", IDS, TEXTS, METADATAS)
+    assert index.search("course", "bellman") == []
+
+def test_build_compacts_the_source(index, tmp_path):
+    source = tmp_path / "lexical_index" / "course" / "chunks.jsonl"
+    for _ in range(3):
+        index.add("course", IDS, TEXTS, METADATAS)
+    assert len(source.read_text().splitlines()) == 4 * len(IDS)
+    before = index.search("course", "gradient descent")
+    index.build("course")
+    assert len(source.read_text().splitlines()) == len(IDS)
+    assert index.search("course", "gradient descent") == before
+
+def test_index_is_persisted_and_memory_mapped(index, tmp_path):
+    before = index.search("course", "gradient descent")
+    reopened = LexicalIndex(str(tmp_path))
+    assert reopened.search("course", "gradient descent") == before
+    assert isinstance(reopened._indexes["course"].postings, np.memmap)
+
+def test_index_rebuilt_elsewhere_is_reloaded(index, tmp_path):
+    assert index.search("course", "bellman")
+    # Another process, e.g. scripts/build_lexical_index.py
+    other = LexicalIndex(str(tmp_path))
+    other.add("course", ["video1_1"], ["polici gradient"], [METADATAS[3]])
+    other.build("course")
+
+    assert index.search("course", "bellman") == []
+    assert "video1_1" in [id for id, _ in index.search("course", "polici")]
+    loaded = index._indexes["course"]
+    index.search("course", "polici")
+    assert index._indexes["course"] is loaded  # not reloaded while unchanged
+
+    other.delete_collection("course")
+    assert index.search("course", "polici") == []
+
+@pytest.fixture
+def vector_db(tmp_path):
+    vector_db = ChromaVectorDB(
+        str(tmp_path), result_cache=SearchResultCache(), lexical_index=LexicalIndex(str(tmp_path))
+    )
+    vector_db.create_collection("course")
+    vector_db.add_embeddings(
+        "course",
+        documents=[f"raw {text}" for text in TEXTS],
+        embeddings=np.eye(4, dtype=np.float32),
+        metadatas=METADATAS,
+        ids=IDS,
+        texts=TEXTS,
+    )
+    vector_db.build_lexical_index("course")
+    return vector_db
+
+def test_hybrid_search_fuses_both_rankings(vector_db):
+    # Vector ranking video0_0, video0_1, video1_0, video1_1: no ties
+    query = np.array([1.0, 0.5, 0.2, 0.0], dtype=np.float32)
+    result = vector_db.search_hybrid("course", query, "bellman equat", top_k=2, candidates=2)
+    # Best vector hit and the only BM25 hit, which the vector search missed
+    assert sorted(result["ids"][0]) == ["video0_0", "video1_1"]
+    row = result["ids"][0].index("video1_1")
+    assert result["documents"][0][row] == "raw bellman equat valu iter"
+    assert result["metadatas"][0][row]["video_id"] == "video1"
+    assert np.allclose(result["embeddings"][0][row], np.eye(4)[3])
+    assert result["distances"][0][row] is None
+    assert len(result["scores"][0]) == 2
+
+def test_hybrid_search_with_filters(vector_db):
+    query = np.eye(4, dtype=np.float32)[0]
+    result = vector_db.search_hybrid("course", query, "gradient", top_k=4, filters={"video_ids": ["video1"]})
+    assert set(result["ids"][0]) == {"video1_0", "video1_1"}
+    assert result["ids"][0][0] == "video1_0"  # found by both
+
+def test_hybrid_search_without_lexical_index(tmp_path):
+    vector_db = ChromaVectorDB(str(tmp_path))
+    vector_db.create_collection("course")
+    vector_db.add_embeddings("course", TEXTS, np.eye(4, dtype=np.float32), METADATAS, IDS, texts=TEXTS)
+    result = vector_db.search_hybrid("course", np.eye(4, dtype=np.float32)[2], "bellman", top_k=1, candidates=1)
+    assert result["ids"] == [["video1_0"]]
+
+def test_deleting_from_the_vector_db_updates_the_lexical_index(vector_db):
+    vector_db.delete_video("course", "video1")
+    assert vector_db.lexical_index.search("course", "bellman") == []
+    vector_db.delete_collection("course")
+    assert vector_db.lexical_index.search("course", "kernel") == []
+
+def test_iter_documents(vector_db):
+    pages = list(vector_db.iter_documents("course", batch_size=3))
+    assert [len(ids) for ids, _, _ in pages] == [3, 1]
+    assert sorted(id for ids, _, _ in pages for id in ids) == sorted(IDS)
@@ -2,7 +2,7 @@ import pytest
 import json
 import tempfile
 import os
-from llama_sensei.backend.add_courses.vectordb.load_text import TranscriptLoader
+from llama_sensei.backend.add_courses.vectordb.load_text import TranscriptLoader, compact_path, write_compact
 
 @pytest.fixture
 def sample_data():
@@ -45,6 +45,8 @@ def temp_json_file(sample_data):
         json.dump(sample_data, tmp)
     yield tmp.name
     os.unlink(tmp.name)
+    if os.path.exists(compact_path(tmp.name)):
+        os.unlink(compact_path(tmp.name))
 
 def test_transcript_loader_initialization(temp_json_file):
     loader = TranscriptLoader(temp_json_file)
@@ -71,4 +73,71 @@ def test_load_data_file_not_found():
 def test_load_data_invalid_json(temp_json_file):
     with open(temp_json_file, 'w') as f:
         f.write("This is not valid JSON")
-    loader = TranscriptLoader(temp_json_file)
\ No newline at end of file
+    loader = TranscriptLoader(temp_json_file)
+def test_load_data_truncated_file(temp_json_file, sample_data):
+    """A transcript cut off mid-write is rejected instead of half loaded."""
+    content = json.dumps(sample_data)
+    with open(temp_json_file, 'w') as f:
+        f.write(content[: len(content) // 2])
+    loader = TranscriptLoader(temp_json_file)
+    assert loader.load_data() is None
+    assert loader.data is None
+
+def test_load_data_without_results(temp_json_file):
+    with open(temp_json_file, 'w') as f:
+        json.dump({"metadata": {"request_id": "x"}}, f)
+    loader = TranscriptLoader(temp_json_file)
+    assert loader.load_data() is None
+    assert loader.load_data(simple_output=True) is None
+
+def test_iter_paragraphs(temp_json_file):
+    paragraphs = TranscriptLoader(temp_json_file).iter_paragraphs()
+    assert not isinstance(paragraphs, list)
+    assert next(paragraphs) == ("This is a test sentence. This is another sentence.", 0.0, 5.0)
+    assert list(paragraphs) == [("This is a second paragraph.", 5.1, 8.0)]
+
+def test_iter_paragraphs_file_not_found():
+    assert TranscriptLoader("non_existent_file.json").iter_paragraphs() is None
+
+EXPECTED_PARAGRAPHS = [
+    ("This is a test sentence. This is another sentence.", 0.0, 5.0),
+    ("This is a second paragraph.", 5.1, 8.0),
+]
+
+def test_loading_raw_writes_compact_copy(temp_json_file):
+    assert list(TranscriptLoader(temp_json_file).iter_paragraphs()) == EXPECTED_PARAGRAPHS
+    assert os.path.exists(compact_path(temp_json_file))
+    assert compact_path(temp_json_file).endswith(".paragraphs.jsonl.gz")
+
+    # The next load streams the compact copy without parsing the raw JSON
+    loader = TranscriptLoader(temp_json_file)
+    assert list(loader.iter_paragraphs()) == EXPECTED_PARAGRAPHS
+    assert loader.data is None
+    assert loader.get_metadata() == {"key": "value"}
+
+def test_compact_copy_disabled(temp_json_file):
+    assert list(TranscriptLoader(temp_json_file, compact=False).iter_paragraphs()) == EXPECTED_PARAGRAPHS
+    assert not os.path.exists(compact_path(temp_json_file))
+
+def test_stale_compact_copy_is_ignored(temp_json_file):
+    """A transcript redone after its compact copy was written wins."""
+    write_compact(compact_path(temp_json_file), [("Old paragraph.", 0.0, 1.0)])
+    newer = os.path.getmtime(compact_path(temp_json_file)) + 10
+    os.utime(temp_json_file, (newer, newer))
+    loader = TranscriptLoader(temp_json_file)
+    assert list(loader.iter_paragraphs()) == EXPECTED_PARAGRAPHS
+    assert loader.data is not None
+
+def test_compact_copy_without_raw_file(tmp_path):
+    raw_file = str(tmp_path / "video.json")
+    write_compact(compact_path(raw_file), EXPECTED_PARAGRAPHS, {"duration": 8.0})
+    assert list(TranscriptLoader(raw_file).iter_paragraphs()) == EXPECTED_PARAGRAPHS
+    loader = TranscriptLoader(compact_path(raw_file))
+    assert list(loader.iter_paragraphs()) == EXPECTED_PARAGRAPHS
+    assert loader.get_metadata() == {"duration": 8.0}
+
+def test_unreadable_compact_copy_falls_back_to_raw(temp_json_file):
+    with open(compact_path(temp_json_file), "wb") as f:
+        f.write(b"not gzip")
+    assert list(TranscriptLoader(temp_json_file, compact=False).iter_paragraphs()) == EXPECTED_PARAGRAPHS
+    assert TranscriptLoader(compact_path(temp_json_file)).iter_paragraphs() is None
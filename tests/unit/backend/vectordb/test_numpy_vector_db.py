@@ -0,0 +1,103 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+from llama_sensei.backend.add_courses.vectordb.numpy_vector_db import NumpyVectorDB
+
+DIM = 4
+IDS = [f"video0_{i}" for i in range(3)]
+EMBEDDINGS = np.eye(3, DIM, dtype=np.float32) + 0.1
+METADATAS = [{"video_id": "video0", "start": float(i)} for i in range(3)]
+
+
+@pytest.fixture
+def course(tmp_path):
+    vector_db = NumpyVectorDB(str(tmp_path))
+    vector_db.create_collection("course")
+    vector_db._upsert("course", [f"chunk {i}" for i in range(3)], EMBEDDINGS, METADATAS, IDS, batch_size=100)
+    return tmp_path / "numpy_db" / "course"
+
+
+def reopen(tmp_path):
+    # A new process: nothing loaded yet
+    return NumpyVectorDB(str(tmp_path))._collection("course")
+
+
+def test_reload(course, tmp_path):
+    collection = reopen(tmp_path)
+    assert collection.ids == IDS
+    np.testing.assert_array_equal(collection.vectors, EMBEDDINGS)
+
+
+def test_cut_last_line_is_dropped(course, tmp_path):
+    # A crash while writing the chunks of a new row, after its vector
+    with open(course / "vectors.f32", "ab") as f:
+        f.write(np.ones(DIM, dtype=np.float32).tobytes())
+    with open(course / "chunks.jsonl", "a") as f:
+        f.write('{"id": "video0_3", "docum')
+
+    collection = reopen(tmp_path)
+
+    assert collection.ids == IDS
+    assert (course / "chunks.jsonl").read_text().endswith("\n")
+    assert os.path.getsize(course / "vectors.f32") == len(IDS) * DIM * 4
+    np.testing.assert_array_equal(collection.vectors, EMBEDDINGS)
+
+
+def test_partial_vector_row_is_dropped(course, tmp_path):
+    with open(course / "vectors.f32", "ab") as f:
+        f.write(b"\0" * 6)
+    collection = reopen(tmp_path)
+    assert os.path.getsize(course / "vectors.f32") == len(IDS) * DIM * 4
+    np.testing.assert_array_equal(collection.vectors, EMBEDDINGS)
+
+
+def test_chunks_without_vectors_are_dropped(course, tmp_path):
+    # The last vector row never reached the disk, its chunk line did
+    os.truncate(course / "vectors.f32", 2 * DIM * 4)
+
+    collection = reopen(tmp_path)
+
+    assert collection.ids == IDS[:2]
+    assert len((course / "chunks.jsonl").read_text().splitlines()) == 2
+    np.testing.assert_array_equal(collection.vectors, EMBEDDINGS[:2])
+    # And the collection takes the chunk again
+    vector_db = NumpyVectorDB(str(tmp_path))
+    vector_db._upsert("course", ["chunk 2"], EMBEDDINGS[2:], METADATAS[2:], IDS[2:], batch_size=100)
+    np.testing.assert_array_equal(reopen(tmp_path).vectors, EMBEDDINGS)
+
+
+def test_collections_have_their_own_lock(tmp_path):
+    vector_db = NumpyVectorDB(str(tmp_path))
+    for name in ("course", "other"):
+        vector_db.create_collection(name)
+        vector_db._upsert(name, ["chunk"], EMBEDDINGS[:1], METADATAS[:1], IDS[:1], batch_size=100)
+
+    searched = threading.Event()
+    with vector_db._collection("course").lock:
+        # An upsert of "course" in progress does not hold up "other"
+        thread = threading.Thread(
+            target=lambda: vector_db._query("other", EMBEDDINGS[:1], 1) and searched.set()
+        )
+        thread.start()
+        assert searched.wait(5)
+    thread.join()
+
+
+def test_upserts_update_only_their_rows(course, tmp_path, mocker):
+    vector_db = NumpyVectorDB(str(tmp_path))
+    collection = vector_db._collection("course")
+    full_rebuild = mocker.spy(collection, "_map")
+    vector_db._upsert("course", ["new"], EMBEDDINGS[:1] * 3, [{"video_id": "video1", "start": 9.0}], ["video1_0"], batch_size=100)
+    # Replaced: new vector, metadata merged into the old
+    vector_db._upsert("course", ["moved"], np.ones((1, DIM), dtype=np.float32), [{"start": 5.0}], [IDS[1]], batch_size=100)
+    full_rebuild.assert_not_called()
+
+    # The same search state as a collection loaded from disk
+    loaded = reopen(tmp_path)
+    np.testing.assert_allclose(collection.norms, loaded.norms)
+    np.testing.assert_array_equal(collection.columns.video_ids, loaded.columns.video_ids)
+    np.testing.assert_array_equal(collection.columns.starts, loaded.columns.starts)
+    assert collection.columns.metadatas == loaded.columns.metadatas
+    assert collection.columns.mask({"start_after": 5.0}).tolist() == [False, True, False, True]
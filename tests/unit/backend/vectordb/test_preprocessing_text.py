@@ -1,5 +1,11 @@
+import glob
+import os
+import subprocess
+import sys
 import pytest
 from typing import List
+from unittest.mock import patch
+from llama_sensei.backend.add_courses.vectordb.load_text import TranscriptLoader
 from llama_sensei.backend.add_courses.vectordb.preprocessing_text import TextPreprocessor
 
 @pytest.fixture
@@ -74,4 +80,105 @@ def test_preprocess_text_empty_input(preprocessor):
 def test_preprocess_text_with_numbers(preprocessor):
     chunks = [("There are 123 apples and 456 oranges.", 0.0, 1.0)]
     result = preprocessor.preprocess_text(chunks)
-    assert "123 appl 456 orang" in result[0][0]
\ No newline at end of file
+    assert "123 appl 456 orang" in result[0][0]
+
+def test_download_nltk_resources_once(monkeypatch):
+    from llama_sensei.backend.add_courses.vectordb import preprocessing_text
+    monkeypatch.setattr(preprocessing_text, "_nltk_resources_ready", False)
+    with patch('llama_sensei.backend.add_courses.vectordb.preprocessing_text.nltk.download') as mock_download:
+        preprocessing_text.download_nltk_resources()
+        preprocessing_text.download_nltk_resources()
+    assert mock_download.call_count == len(preprocessing_text.NLTK_RESOURCES)
+
+# Lecture style text: repeated words, all stop word sentences, numbers, symbols
+GOLDEN_TEXTS = [
+    "So today we're going to talk about gradient descent. It is what it is. "
+    "We compute the gradient, then we're updating the parameters, and we keep updating them.",
+    "I am. Are you? Running, ran, runs: the learner was learning what learners learn.",
+    "Let's say x equals 3.5 and y is x squared, so y = 12.25 -- right? OK.",
+    "The hypotheses h_theta(x) were fitted on 1,000 examples; the cost J(theta) decreased.",
+    "",
+]
+
+def _golden_chunks():
+    chunks = [(text, float(i), float(i + 1)) for i, text in enumerate(GOLDEN_TEXTS)]
+    # Real transcripts, e.g. GOLDEN_TRANSCRIPT_DIR=/shared/final/cs229_stanford/transcript
+    transcript_dir = os.getenv("GOLDEN_TRANSCRIPT_DIR")
+    if transcript_dir:
+        for path in sorted(glob.glob(os.path.join(transcript_dir, "*.json"))):
+            chunks.extend(TranscriptLoader(path).load_data() or [])
+    return chunks
+
+@pytest.mark.parametrize("apply_lemmatize", [True, False])
+@pytest.mark.parametrize("apply_stem", [True, False])
+def test_fast_mode_matches_original(apply_lemmatize, apply_stem):
+    chunks = _golden_chunks()
+    original = TextPreprocessor(fast=False).preprocess_text(
+        chunks, apply_lemmatize=apply_lemmatize, apply_stem=apply_stem
+    )
+    fast = TextPreprocessor(fast=True).preprocess_text(
+        chunks, apply_lemmatize=apply_lemmatize, apply_stem=apply_stem
+    )
+    assert fast == original
+
+def test_fast_mode_skips_pos_tag():
+    with patch('llama_sensei.backend.add_courses.vectordb.preprocessing_text.pos_tag') as mock_pos_tag:
+        TextPreprocessor()._preprocess("Running and running again.")
+    mock_pos_tag.assert_not_called()
+
+def test_fast_mode_caches_tokens():
+    preprocessor = TextPreprocessor(cache_size=16)
+    preprocessor._preprocess("learning learning learning")
+    info = preprocessor.cache_info()
+    assert info["lemmatize"]["misses"] == 1
+    assert info["lemmatize"]["hits"] == 2
+    assert info["stem"]["hits"] == 2
+    assert info["stem"]["maxsize"] == 16
+
+def test_parallel_preprocessing_matches_serial(sample_chunks):
+    chunks = [(text, float(i), float(i + 1)) for i, (text, _, _) in enumerate(sample_chunks * 20)]
+    serial = TextPreprocessor(workers=0).preprocess_text(chunks)
+    parallel_preprocessor = TextPreprocessor(workers=2)
+    try:
+        parallel = parallel_preprocessor.preprocess_text(chunks)
+    finally:
+        parallel_preprocessor.close()
+    assert parallel == serial
+
+def test_few_chunks_stay_in_process(sample_chunks):
+    preprocessor = TextPreprocessor(workers=4)
+    with patch('llama_sensei.backend.add_courses.vectordb.preprocessing_text.ProcessPoolExecutor') as mock_pool:
+        result = preprocessor.preprocess_text(sample_chunks)
+    mock_pool.assert_not_called()
+    assert len(result) == 3
+
+ADD_COURSES_DIR = os.path.join(os.path.dirname(__file__), "../../../../app/llama_sensei/backend/add_courses")
+
+# Run as if started with `python main.py`: spawned workers re-import main.py as __mp_main__
+POOL_FROM_MAIN = """
+import os, sys
+import __main__
+sys.path.insert(0, {add_courses_dir!r})
+__main__.__file__ = os.path.join({add_courses_dir!r}, "main.py")
+if __name__ == "__main__":
+    from vectordb.preprocessing_text import TextPreprocessor
+    preprocessor = TextPreprocessor(workers=2)
+    try:
+        print(len(preprocessor.preprocess_text([("Lectures are recorded.", 0.0, 1.0)] * 64)))
+    finally:
+        preprocessor.close()
+"""
+
+def test_pool_workers_do_not_start_the_service(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    script = POOL_FROM_MAIN.format(add_courses_dir=os.path.abspath(ADD_COURSES_DIR))
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        env={**os.environ, "DATA_SAVE_DIR": str(data_dir)},
+        capture_output=True, text=True, timeout=300,
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split()[-1] == "64"
+    # No vector db, lexical index or embedding cache opened by the workers
+    assert os.listdir(data_dir) == []
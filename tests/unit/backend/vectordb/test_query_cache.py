@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from unittest.mock import Mock
+from llama_sensei.backend.add_courses.vectordb.document_processor import DocumentProcessor
+from llama_sensei.backend.add_courses.vectordb.query_cache import ENTRY_OVERHEAD, QueryEmbeddingCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def cache(clock):
+    return QueryEmbeddingCache("model", max_bytes=10_000, ttl=60, clock=clock)
+
+def vector(value, dim=4):
+    return np.full(dim, value, dtype=np.float32)
+
+def test_get_put_and_stats(cache):
+    assert cache.get("gradient descent") is None
+    cache.put_many(["gradient descent"], [vector(1)])
+    # Whitespace is normalised away
+    np.testing.assert_array_equal(cache.get("  gradient   descent "), vector(1))
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+    assert stats["entries"] == 1
+
+def test_keyed_by_model(cache, clock):
+    cache.put_many(["query"], [vector(1)])
+    other = QueryEmbeddingCache("other-model", clock=clock)
+    assert cache.key("query") != other.key("query")
+    assert other.get("query") is None
+
+def test_entries_expire(cache, clock):
+    cache.put_many(["query"], [vector(1)])
+    clock.now = 59
+    assert cache.get("query") is not None
+    clock.now = 60
+    assert cache.get("query") is None
+    assert cache.stats()["expired"] == 1
+    assert len(cache) == 0 and cache.bytes == 0
+
+def test_memory_cap_evicts_least_recently_used(clock):
+    entry_size = vector(0, dim=256).nbytes + ENTRY_OVERHEAD
+    cache = QueryEmbeddingCache("model", max_bytes=int(entry_size * 3.5), clock=clock)
+    cache.put_many(["a", "b", "c"], [vector(i, dim=256) for i in range(3)])
+    cache.get("a")  # b is now the least recently used
+    cache.put_many(["d"], [vector(3, dim=256)])
+    assert cache.get("b") is None
+    assert all(cache.get(text) is not None for text in ("a", "c", "d"))
+    assert cache.stats()["evictions"] == 1
+    assert cache.bytes <= cache.max_bytes
+
+def test_cached_vectors_are_read_only(cache):
+    cache.put_many(["query"], [vector(1)])
+    with pytest.raises(ValueError):
+        cache.get("query")[0] = 5
+
+def test_single_and_batch_search_share_the_cache(cache):
+    text_processor = Mock()
+    text_processor._preprocess.side_effect = lambda q: q.lower()
+    embedder = Mock()
+    embedder.embed.side_effect = lambda texts, batch_size: np.array([vector(len(t)) for t in texts])
+    vector_db = Mock()
+    processor = DocumentProcessor(vector_db, "course", search_only=True, text_processor=text_processor, embedder=embedder, query_cache=cache)
+
+    processor.search("What is SGD", top_k=3)
+    np.testing.assert_array_equal(vector_db.search_embeddings.call_args.args[1], vector(11))
+    processor.search_batch(["what is sgd", "Define overfitting"], top_k=3)
+
+    # The repeated question is not encoded again
+    assert [c.args[0] for c in embedder.embed.call_args_list] == [["what is sgd"], ["define overfitting"]]
+    embeddings = vector_db.search_embeddings_batch.call_args.args[1]
+    np.testing.assert_array_equal(embeddings, [vector(11), vector(18)])
+    assert cache.stats()["hits"] == 1
+
+def test_hybrid_search_preprocesses_the_query_once(cache):
+    text_processor = Mock()
+    text_processor._preprocess.side_effect = lambda q: q.lower()
+    embedder = Mock()
+    embedder.embed.side_effect = lambda texts, batch_size: np.array([vector(len(t)) for t in texts])
+    vector_db = Mock()
+    processor = DocumentProcessor(vector_db, "course", search_only=True, text_processor=text_processor, embedder=embedder, query_cache=cache)
+
+    processor.search("What is SGD", top_k=3, mode="hybrid")
+    text_processor._preprocess.assert_called_once_with("What is SGD")
+    assert vector_db.search_hybrid.call_args.args[2] == "what is sgd"
+    np.testing.assert_array_equal(vector_db.search_hybrid.call_args.args[1], vector(11))
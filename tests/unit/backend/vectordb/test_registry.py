@@ -0,0 +1,95 @@
+import pytest
+from unittest.mock import Mock, patch
+from llama_sensei.backend.add_courses.vectordb.registry import ModelRegistry
+
+MODULE = 'llama_sensei.backend.add_courses.vectordb.registry'
+
+@pytest.fixture
+def mock_text_processor():
+    processor = Mock(workers=0)
+    processor._preprocess.return_value = "warm up"
+    return processor
+
+@pytest.fixture
+def mock_embedder():
+    return Mock(workers=0, batch_size=64)
+
+@pytest.fixture
+def registry(mock_text_processor, mock_embedder):
+    with patch(f'{MODULE}.TextPreprocessor', return_value=mock_text_processor) as text_cls, \
+         patch(f'{MODULE}.Embedder', return_value=mock_embedder) as embed_cls, \
+         patch(f'{MODULE}.download_nltk_resources') as download:
+        registry = ModelRegistry()
+        registry.mocks = {"text": text_cls, "embed": embed_cls, "download": download}
+        yield registry
+
+def test_not_ready_before_load(registry):
+    assert registry.ready is False
+    with pytest.raises(RuntimeError):
+        registry.document_processor(Mock(), "test_collection")
+
+def test_load_warms_up(registry, mock_embedder):
+    """
+    Loading downloads NLTK resources, builds the models once and runs a dummy encode.
+    """
+    registry.load()
+    assert registry.ready is True
+    registry.mocks["download"].assert_called_once()
+    registry.mocks["text"].assert_called_once()
+    registry.mocks["embed"].assert_called_once_with(model_name=registry.model_name)
+    mock_embedder.embed.assert_called_once_with("warm up")
+
+def test_load_is_idempotent(registry):
+    registry.load()
+    registry.load()
+    registry.mocks["embed"].assert_called_once()
+
+def test_load_failure_is_reported(registry):
+    registry.mocks["embed"].side_effect = Exception("no model")
+    registry.load()
+    assert registry.ready is False
+    assert registry.error == "no model"
+
+def test_document_processor_shares_models(registry, mock_text_processor, mock_embedder):
+    """
+    Every processor handed out uses the registry's models instead of loading new ones.
+    """
+    registry.load()
+    vector_db = Mock()
+    with patch('llama_sensei.backend.add_courses.vectordb.document_processor.Embedder') as embed_cls, \
+         patch('llama_sensei.backend.add_courses.vectordb.document_processor.TextPreprocessor') as text_cls:
+        first = registry.document_processor(vector_db, "course_a")
+        second = registry.document_processor(vector_db, "course_b")
+    embed_cls.assert_not_called()
+    text_cls.assert_not_called()
+    assert first.embedder is second.embedder is mock_embedder
+    assert first.text_processor is second.text_processor is mock_text_processor
+    vector_db.create_collection.assert_not_called()
+
+def test_embedding_cache_is_shared(mock_text_processor, mock_embedder, tmp_path):
+    mock_embedder.dimension = 4
+    with patch(f'{MODULE}.TextPreprocessor', return_value=mock_text_processor), \
+         patch(f'{MODULE}.Embedder', return_value=mock_embedder), \
+         patch(f'{MODULE}.download_nltk_resources'):
+        registry = ModelRegistry(cache_dir=str(tmp_path)).load()
+    assert registry.cache.dimension == 4
+    assert registry.document_processor(Mock(), "course").cache is registry.cache
+
+def test_no_cache_by_default(registry):
+    registry.load()
+    assert registry.cache is None
+    assert registry.document_processor(Mock(), "course").cache is None
+
+def test_query_cache_is_shared(registry):
+    registry.load()
+    assert registry.query_cache.model_name == registry.model_name
+    first = registry.document_processor(Mock(), "course_a")
+    second = registry.document_processor(Mock(), "course_b")
+    assert first.query_cache is second.query_cache is registry.query_cache
+
+def test_window_grows_with_the_worker_pools(registry, mock_embedder):
+    registry.load()
+    assert registry.document_processor(Mock(), "course").window_size == 256
+    mock_embedder.workers = 32
+    # 4 micro-batches of 64 chunks for each of the 32 encode processes
+    assert registry.document_processor(Mock(), "course").window_size == 32 * 64 * 4
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+from llama_sensei.backend.add_courses.vectordb.result_cache import SearchResultCache, embedding_key
+from llama_sensei.backend.add_courses.vectordb.vector_db_operations import ChromaVectorDB
+
+def test_get_put_and_lru():
+    cache = SearchResultCache(max_entries=2)
+    for i in range(3):
+        cache.put("course", 0, i, {"ids": [[str(i)]]})
+    assert cache.get("course", 0, 0) is None
+    assert cache.get("course", 0, 2) == {"ids": [["2"]]}
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+def test_bump_invalidates_only_that_collection():
+    cache = SearchResultCache()
+    cache.put("a", 0, "key", {"ids": [["a"]]})
+    cache.put("b", 0, "key", {"ids": [["b"]]})
+    cache.bump("a")
+    assert cache.version("a") == 1
+    assert cache.get("a", 1, "key") is None
+    assert cache.get("b", 0, "key") == {"ids": [["b"]]}
+    assert cache.stats()["invalidations"] == 1
+
+def test_result_of_a_search_raced_by_a_write_is_dropped():
+    cache = SearchResultCache()
+    version = cache.version("a")
+    cache.bump("a")  # written while the search ran
+    cache.put("a", version, "key", {"ids": [["old"]]})
+    assert cache.stats()["entries"] == 0
+
+def test_embedding_key():
+    embedding = np.array([0.1, 0.2], dtype=np.float32)
+    assert embedding_key(embedding, 5) == embedding_key(embedding.tolist(), 5)
+    assert embedding_key(embedding, 5) != embedding_key(embedding, 3)
+    assert embedding_key(embedding, 5) == embedding_key(embedding, 5, {})
+    assert embedding_key(embedding, 5, {"video_ids": ["a"]}) != embedding_key(embedding, 5)
+
+def test_filtered_searches_are_cached_apart(vector_db, mocker):
+    query = count_queries(vector_db, mocker)
+    embedding = np.eye(6, dtype=np.float32)[2]
+    everything = vector_db.search_embeddings("course", embedding, top_k=1)
+    video1 = vector_db.search_embeddings("course", embedding, top_k=1, filters={"video_ids": ["video1"]})
+    assert query.call_count == 2
+    assert everything["ids"] == [["id_2"]]
+    assert video1["metadatas"][0][0]["video_id"] == "video1"
+    vector_db.search_embeddings("course", embedding, top_k=1, filters={"video_ids": ["video1"]})
+    assert query.call_count == 2
+
+@pytest.fixture
+def vector_db(tmp_path):
+    vector_db = ChromaVectorDB(str(tmp_path), result_cache=SearchResultCache())
+    vector_db.create_collection("course")
+    vector_db.add_embeddings(
+        "course",
+        documents=[f"chunk {i}" for i in range(6)],
+        embeddings=np.eye(6, dtype=np.float32),
+        metadatas=[{"video_id": f"video{i % 2}"} for i in range(6)],
+        ids=[f"id_{i}" for i in range(6)],
+    )
+    return vector_db
+
+def count_queries(vector_db, mocker):
+    collection_cls = vector_db.client.get_collection("course").__class__
+    return mocker.spy(collection_cls, "query")
+
+def test_repeated_search_is_served_from_cache(vector_db, mocker):
+    query = count_queries(vector_db, mocker)
+    first = vector_db.search_embeddings("course", np.eye(6, dtype=np.float32)[2], top_k=2)
+    second = vector_db.search_embeddings("course", np.eye(6, dtype=np.float32)[2], top_k=2)
+    assert query.call_count == 1
+    assert second["ids"] == first["ids"] and first["ids"][0][0] == "id_2"
+
+@pytest.mark.parametrize("write", [
+    lambda db: db.add_embedding("course", "new", np.eye(6, dtype=np.float32)[2], {"video_id": "video9"}, "id_new"),
+    lambda db: db.add_embeddings("course", ["new"], np.eye(6, dtype=np.float32)[2:3], [{"video_id": "video9"}], ["id_new"]),
+    lambda db: db.delete_video("course", "video0"),
+    lambda db: (db.delete_collection("course"), db.create_collection("course")),
+])
+def test_writes_invalidate(vector_db, mocker, write):
+    query = count_queries(vector_db, mocker)
+    before = vector_db.search_embeddings("course", np.eye(6, dtype=np.float32)[2], top_k=2)
+    write(vector_db)
+    after = vector_db.search_embeddings("course", np.eye(6, dtype=np.float32)[2], top_k=2)
+    assert query.call_count == 2
+    assert after["ids"] != before["ids"]
+
+def test_batch_only_queries_what_is_not_cached(vector_db, mocker):
+    eye = np.eye(6, dtype=np.float32)
+    vector_db.search_embeddings("course", eye[4], top_k=1)
+    query = count_queries(vector_db, mocker)
+    results = vector_db.search_embeddings_batch("course", eye[[1, 4, 5]], top_k=1)
+    assert query.call_count == 1
+    assert len(query.call_args.kwargs["query_embeddings"]) == 2
+    assert results["ids"] == [["id_1"], ["id_4"], ["id_5"]]
+    assert len(results["documents"]) == len(results["metadatas"]) == len(results["embeddings"]) == 3
+    # Every query is cached now
+    vector_db.search_embeddings_batch("course", eye[[5, 1]], top_k=1)
+    assert query.call_count == 1
@@ -0,0 +1,181 @@
+"""
+Behaviour every vector store engine must share, run against each of them.
+"""
+import numpy as np
+import pytest
+from llama_sensei.backend.add_courses.vectordb.backends import BACKENDS, RoutedVectorDB, open_vector_db
+from llama_sensei.backend.add_courses.vectordb.lexical_index import LexicalIndex
+from llama_sensei.backend.add_courses.vectordb.result_cache import SearchResultCache
+from llama_sensei.backend.add_courses.vectordb.vector_db_operations import VectorDBOperations
+
+DIM = 8
+NUM_CHUNKS = 12
+rng = np.random.default_rng(0)
+EMBEDDINGS = rng.normal(size=(NUM_CHUNKS, DIM)).astype(np.float32)
+IDS = [f"video{i % 3}_{i}" for i in range(NUM_CHUNKS)]
+METADATAS = [
+    {"video_id": f"video{i % 3}", "start": 10.0 * i, "end": 10.0 * i + 10, "lecture": i % 2}
+    for i in range(NUM_CHUNKS)
+]
+DOCUMENTS = [f"chunk {i}" for i in range(NUM_CHUNKS)]
+
+def cosine_order(query, rows=range(NUM_CHUNKS)):
+    rows = list(rows)
+    similarities = EMBEDDINGS[rows] @ query / (np.linalg.norm(EMBEDDINGS[rows], axis=1) * np.linalg.norm(query))
+    return [IDS[rows[i]] for i in np.argsort(-similarities)]
+
+@pytest.fixture(params=sorted(BACKENDS))
+def backend(request):
+    return request.param
+
+@pytest.fixture
+def vector_db(backend, tmp_path):
+    vector_db = open_vector_db(str(tmp_path), backend=backend, collection_backends={})
+    vector_db.create_collection("course")
+    vector_db.add_embeddings("course", DOCUMENTS, EMBEDDINGS, METADATAS, IDS, batch_size=5)
+    return vector_db
+
+def test_interface_cannot_be_instantiated(tmp_path):
+    # The pre-engine VectorDBOperations(save_path) call fails at once
+    with pytest.raises(TypeError):
+        VectorDBOperations(str(tmp_path))
+
+def test_open_vector_db(backend, tmp_path):
+    assert isinstance(open_vector_db(str(tmp_path), backend=backend, collection_backends={}), BACKENDS[backend])
+    with pytest.raises(ValueError):
+        open_vector_db(str(tmp_path), backend="faiss", collection_backends={})
+
+def test_collections(vector_db):
+    vector_db.create_collection("other_course")
+    assert sorted(vector_db.get_collections()) == ["course", "other_course"]
+    vector_db.delete_collection("other_course")
+    assert vector_db.get_collections() == ["course"]
+
+def test_add_embeddings_reports_failed_writes(vector_db):
+    assert vector_db.add_embeddings("course", ["new"], EMBEDDINGS[:1], METADATAS[:1], ["new_0"]) is True
+    # Wrong dimension: nothing written
+    assert vector_db.add_embeddings("course", ["bad"], np.ones((1, DIM + 1)), METADATAS[:1], ["bad_0"]) is False
+    assert vector_db._get("course", ids=["bad_0"])["ids"] == []
+
+def test_create_existing_collection_keeps_it(vector_db):
+    vector_db.create_collection("course")
+    assert len(vector_db.search_embeddings("course", EMBEDDINGS[0], top_k=NUM_CHUNKS)["ids"][0]) == NUM_CHUNKS
+
+def test_search_returns_nearest_by_cosine(vector_db):
+    query = EMBEDDINGS[4] + 0.1
+    result = vector_db.search_embeddings("course", query, top_k=3)
+    assert result["ids"] == [cosine_order(query)[:3]]
+    row = IDS.index(result["ids"][0][0])
+    assert result["documents"][0][0] == DOCUMENTS[row]
+    assert result["metadatas"][0][0] == METADATAS[row]
+    assert np.allclose(result["embeddings"][0][0], EMBEDDINGS[row], atol=1e-6)
+    expected = 1 - EMBEDDINGS[row] @ query / (np.linalg.norm(EMBEDDINGS[row]) * np.linalg.norm(query))
+    assert result["distances"][0][0] == pytest.approx(expected, abs=1e-4)
+    assert result["distances"][0] == sorted(result["distances"][0])
+
+def test_top_k_larger_than_collection(vector_db):
+    result = vector_db.search_embeddings("course", EMBEDDINGS[0], top_k=50)
+    assert sorted(result["ids"][0]) == sorted(IDS)
+
+def test_search_empty_collection(vector_db):
+    vector_db.create_collection("empty_course")
+    result = vector_db.search_embeddings("empty_course", EMBEDDINGS[0], top_k=3)
+    assert result["ids"] == [[]]
+
+def test_search_missing_collection(vector_db):
+    assert vector_db.search_embeddings("no_such_course", EMBEDDINGS[0], top_k=3) is None
+
+def test_batch_search_keeps_query_order(vector_db):
+    result = vector_db.search_embeddings_batch("course", EMBEDDINGS[[7, 2, 9]], top_k=2)
+    assert [ids[0] for ids in result["ids"]] == [IDS[7], IDS[2], IDS[9]]
+    assert all(len(ids) == 2 for ids in result["ids"])
+    assert len(result["embeddings"]) == len(result["documents"]) == 3
+
+@pytest.mark.parametrize("filters, rows", [
+    ({"video_ids": ["video1"]}, [i for i in range(NUM_CHUNKS) if i % 3 == 1]),
+    ({"video_ids": ["video0", "video2"], "start_after": 50.0}, [5, 6, 8, 9, 11]),
+    ({"end_before": 40.0}, [0, 1, 2, 3]),
+    ({"metadata": {"lecture": 1}, "end_before": 80.0}, [1, 3, 5, 7]),
+])
+def test_filters(vector_db, filters, rows):
+    query = EMBEDDINGS[0]
+    result = vector_db.search_embeddings("course", query, top_k=NUM_CHUNKS, filters=filters)
+    assert result["ids"] == [cosine_order(query, rows)]
+    result = vector_db.search_embeddings("course", query, top_k=2, filters=filters)
+    assert result["ids"] == [cosine_order(query, rows)[:2]]
+
+def test_upsert_replaces(vector_db):
+    vector_db.add_embedding("course", "new text", EMBEDDINGS[5] * -1, {"video_id": "video9"}, IDS[0])
+    result = vector_db.search_embeddings("course", EMBEDDINGS[5] * -1, top_k=1)
+    assert result["ids"] == [[IDS[0]]]
+    assert result["documents"] == [["new text"]]
+    # Given metadata keys are updated, the others kept
+    assert result["metadatas"] == [[{**METADATAS[0], "video_id": "video9"}]]
+    assert len(list(vector_db.iter_documents("course"))[0][0]) == NUM_CHUNKS
+
+def test_get_video_ids_and_delete_video(vector_db):
+    assert vector_db.get_video_ids("course", batch_size=5) == {"video0", "video1", "video2"}
+    vector_db.delete_video("course", "video1")
+    assert vector_db.get_video_ids("course") == {"video0", "video2"}
+    result = vector_db.search_embeddings("course", EMBEDDINGS[1], top_k=NUM_CHUNKS)
+    rows = [i for i in range(NUM_CHUNKS) if i % 3 != 1]
+    assert result["ids"] == [cosine_order(EMBEDDINGS[1], rows)]
+    # Still writable after the rewrite
+    vector_db.add_embeddings("course", ["again"], EMBEDDINGS[1:2], [METADATAS[1]], [IDS[1]])
+    assert vector_db.search_embeddings("course", EMBEDDINGS[1], top_k=1)["ids"] == [[IDS[1]]]
+
+def test_get_video_ids_missing_collection(vector_db):
+    assert vector_db.get_video_ids("no_such_course") == set()
+
+def test_iter_documents(vector_db):
+    pages = list(vector_db.iter_documents("course", batch_size=5))
+    assert [len(ids) for ids, _, _ in pages] == [5, 5, 2]
+    chunks = {id: (document, metadata) for ids, documents, metadatas in pages for id, document, metadata in zip(ids, documents, metadatas)}
+    assert chunks == {id: (document, metadata) for id, document, metadata in zip(IDS, DOCUMENTS, METADATAS)}
+
+def test_writes_invalidate_the_result_cache(backend, tmp_path):
+    vector_db = open_vector_db(str(tmp_path), backend=backend, collection_backends={}, result_cache=SearchResultCache())
+    vector_db.create_collection("course")
+    vector_db.add_embeddings("course", DOCUMENTS, EMBEDDINGS, METADATAS, IDS)
+    before = vector_db.search_embeddings("course", EMBEDDINGS[3], top_k=1)
+    assert vector_db.search_embeddings("course", EMBEDDINGS[3], top_k=1) == before
+    vector_db.delete_video("course", "video0")
+    assert vector_db.search_embeddings("course", EMBEDDINGS[3], top_k=1)["ids"] != before["ids"]
+
+def test_hybrid_search(backend, tmp_path):
+    vector_db = open_vector_db(
+        str(tmp_path), backend=backend, collection_backends={}, lexical_index=LexicalIndex(str(tmp_path))
+    )
+    vector_db.create_collection("course")
+    texts = [f"term{i}" for i in range(NUM_CHUNKS)]
+    vector_db.add_embeddings("course", DOCUMENTS, EMBEDDINGS, METADATAS, IDS, texts=texts)
+    vector_db.build_lexical_index("course")
+    result = vector_db.search_hybrid("course", EMBEDDINGS[0], "term11", top_k=2, candidates=2)
+    assert set(result["ids"][0]) == {IDS[0], IDS[11]}
+    row = result["ids"][0].index(IDS[11])
+    assert result["documents"][0][row] == DOCUMENTS[11]
+    assert np.allclose(result["embeddings"][0][row], EMBEDDINGS[11], atol=1e-6)
+
+def test_data_persists(backend, tmp_path):
+    vector_db = open_vector_db(str(tmp_path), backend=backend, collection_backends={})
+    vector_db.create_collection("course")
+    vector_db.add_embeddings("course", DOCUMENTS, EMBEDDINGS, METADATAS, IDS)
+    vector_db.add_embedding("course", "new text", EMBEDDINGS[6], {"lecture": 5}, IDS[6])
+    before = vector_db.search_embeddings("course", EMBEDDINGS[6], top_k=4)
+    reopened = open_vector_db(str(tmp_path), backend=backend, collection_backends={})
+    after = reopened.search_embeddings("course", EMBEDDINGS[6], top_k=4)
+    assert after["ids"] == before["ids"]
+    assert after["documents"] == before["documents"]
+    assert after["metadatas"] == before["metadatas"]
+
+def test_collections_are_routed_per_course(tmp_path):
+    vector_db = open_vector_db(str(tmp_path), backend="chroma", collection_backends={"small_course": "numpy"})
+    assert isinstance(vector_db, RoutedVectorDB)
+    for name in ("small_course", "big_course"):
+        vector_db.create_collection(name)
+        vector_db.add_embeddings(name, DOCUMENTS, EMBEDDINGS, METADATAS, IDS)
+    assert vector_db.get_collections() == ["big_course", "small_course"]
+    assert vector_db.stores["numpy"].get_collections() == ["small_course"]
+    assert vector_db.stores["chroma"].get_collections() == ["big_course"]
+    assert vector_db.search_embeddings("small_course", EMBEDDINGS[2], top_k=1)["ids"] == [[IDS[2]]]
+    assert vector_db.search_embeddings("big_course", EMBEDDINGS[2], top_k=1)["ids"] == [[IDS[2]]]
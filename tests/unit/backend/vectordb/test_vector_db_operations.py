@@ -1,15 +1,16 @@
+import numpy as np
 import pytest
 
 from llama_sensei.backend.add_courses.vectordb.get_embedding import Embedder
 from llama_sensei.backend.add_courses.vectordb.preprocessing_text import TextPreprocessor
-from llama_sensei.backend.add_courses.vectordb.vector_db_operations import VectorDBOperations
+from llama_sensei.backend.add_courses.vectordb.vector_db_operations import ChromaVectorDB, chroma_where
 
 text_processor = TextPreprocessor()
 embedder = Embedder()
 
 @pytest.fixture
 def vector_db():
-    return VectorDBOperations("data/unittest")
+    return ChromaVectorDB("data/unittest")
 
 def test_create_collection_success(vector_db):
     collection_name = "test_collection"
@@ -25,11 +26,11 @@ def test_search_embeddings(vector_db):
     metadata = {"source": "test"}
     id = "test_id"
     preprocessed_chunks = text_processor.preprocess_text([chunk])
-    chunks_with_embed = embedder.embed_chunks(preprocessed_chunks)
+    embeddings = embedder.embed_chunks(preprocessed_chunks)
     vector_db.add_embedding(
         collection_name, 
         chunk[0], 
-        chunks_with_embed[0][1], 
+        embeddings[0], 
         metadata, 
         id
     )
@@ -64,17 +65,136 @@ def test_add_multiple_embeddings(vector_db):
     ]
     metadata = {"source": "test"}
     preprocessed_chunks = text_processor.preprocess_text(chunks)
-    chunks_with_embed = embedder.embed_chunks(preprocessed_chunks)
-    for i, chunk in enumerate(chunks_with_embed):
-        chunk_metadata = {**metadata, 'start': chunk[2], 'end': chunk[3]}
+    embeddings = embedder.embed_chunks(preprocessed_chunks)
+    for i, chunk in enumerate(preprocessed_chunks):
+        chunk_metadata = {**metadata, 'start': chunk[1], 'end': chunk[2]}
         vector_db.add_embedding(
             collection_name,
             chunks[i][0],  # raw text
-            chunk[1],
+            embeddings[i],
             {"index": i},
             f"id_{i}",
         )
     
     query = embedder.embed("document")
     results = vector_db.search_embeddings(collection_name, query, top_k=3)
-    assert len(results['ids'][0]) == 3
\ No newline at end of file
+    assert len(results['ids'][0]) == 3
+
+def test_add_embeddings_bulk(vector_db):
+    collection_name = "bulk_collection"
+    vector_db.delete_collection(collection_name)
+    vector_db.create_collection(collection_name)
+
+    num_chunks = 25
+    embeddings = np.random.rand(num_chunks, 8).astype(np.float32)
+    vector_db.add_embeddings(
+        collection_name,
+        documents=[f"chunk {i}" for i in range(num_chunks)],
+        embeddings=embeddings,
+        metadatas=[{"index": i} for i in range(num_chunks)],
+        ids=[f"id_{i}" for i in range(num_chunks)],
+        batch_size=10,
+    )
+
+    collection = vector_db.client.get_collection(collection_name)
+    assert collection.count() == num_chunks
+    results = vector_db.search_embeddings(collection_name, embeddings[7], top_k=1)
+    assert results['ids'][0] == ["id_7"]
+
+def test_add_embeddings_batches_upserts(vector_db, mocker):
+    collection = mocker.Mock()
+    mocker.patch.object(vector_db.client, 'get_collection', return_value=collection)
+    vector_db.add_embeddings(
+        "any_collection",
+        documents=["a", "b", "c"],
+        embeddings=np.zeros((3, 4), dtype=np.float32),
+        metadatas=[{}, {}, {}],
+        ids=["1", "2", "3"],
+        batch_size=2,
+    )
+    assert collection.upsert.call_count == 2
+    assert collection.upsert.call_args_list[1].kwargs["ids"] == ["3"]
+
+def test_get_video_ids_and_delete_video(vector_db):
+    collection_name = "video_collection"
+    vector_db.delete_collection(collection_name)
+    vector_db.create_collection(collection_name)
+    ids = [f"video{v}_{i}" for v in range(3) for i in range(4)]
+    vector_db.add_embeddings(
+        collection_name,
+        documents=ids,
+        embeddings=np.random.rand(len(ids), 8).astype(np.float32),
+        metadatas=[{"video_id": chunk_id.split("_")[0]} for chunk_id in ids],
+        ids=ids,
+    )
+
+    # Paged reads still see every video
+    assert vector_db.get_video_ids(collection_name, batch_size=5) == {"video0", "video1", "video2"}
+
+    vector_db.delete_video(collection_name, "video1")
+    assert vector_db.get_video_ids(collection_name) == {"video0", "video2"}
+    assert vector_db.client.get_collection(collection_name).count() == 8
+
+def test_get_video_ids_missing_collection(vector_db):
+    assert vector_db.get_video_ids("no_such_video_collection") == set()
+
+def test_search_embeddings_batch(vector_db, mocker):
+    collection_name = "batch_search_collection"
+    vector_db.delete_collection(collection_name)
+    vector_db.create_collection(collection_name)
+    embeddings = np.eye(8, dtype=np.float32)
+    vector_db.add_embeddings(
+        collection_name,
+        documents=[f"chunk {i}" for i in range(8)],
+        embeddings=embeddings,
+        metadatas=[{"index": i} for i in range(8)],
+        ids=[f"id_{i}" for i in range(8)],
+    )
+
+    query = mocker.spy(vector_db.client.get_collection(collection_name).__class__, 'query')
+    results = vector_db.search_embeddings_batch(collection_name, embeddings[[5, 2, 7]], top_k=2)
+    # One query call, one result list per query embedding, in order
+    assert query.call_count == 1
+    assert [ids[0] for ids in results['ids']] == ["id_5", "id_2", "id_7"]
+    assert all(len(ids) == 2 for ids in results['ids'])
+    assert len(results['embeddings']) == 3
+
+def test_chroma_where():
+    assert chroma_where(None) is None
+    assert chroma_where({"video_ids": [], "metadata": {}}) is None
+    assert chroma_where({"video_ids": ["a"]}) == {"video_id": {"$in": ["a"]}}
+    assert chroma_where({
+        "video_ids": ["a", "b"], "start_after": 60.0, "end_before": 120.0, "metadata": {"lecture": 5},
+    }) == {"$and": [
+        {"video_id": {"$in": ["a", "b"]}},
+        {"start": {"$gte": 60.0}},
+        {"end": {"$lte": 120.0}},
+        {"lecture": 5},
+    ]}
+
+def test_search_embeddings_with_filters(vector_db):
+    collection_name = "filtered_collection"
+    vector_db.delete_collection(collection_name)
+    vector_db.create_collection(collection_name)
+    vector_db.add_embeddings(
+        collection_name,
+        documents=[f"chunk {i}" for i in range(6)],
+        embeddings=np.eye(6, dtype=np.float32),
+        metadatas=[{"video_id": f"video{i % 2}", "start": 10.0 * i, "end": 10.0 * i + 10} for i in range(6)],
+        ids=[f"id_{i}" for i in range(6)],
+    )
+    query = np.eye(6, dtype=np.float32)[0]
+
+    results = vector_db.search_embeddings(collection_name, query, top_k=6, filters={"video_ids": ["video1"]})
+    assert sorted(results['ids'][0]) == ["id_1", "id_3", "id_5"]
+
+    results = vector_db.search_embeddings(
+        collection_name, query, top_k=6, filters={"video_ids": ["video0"], "start_after": 15.0, "end_before": 50.0}
+    )
+    assert sorted(results['ids'][0]) == ["id_2", "id_4"]
+
+    results = vector_db.search_embeddings_batch(
+        collection_name, np.eye(6, dtype=np.float32)[[0, 1]], top_k=1, filters={"video_ids": ["video1"]}
+    )
+    assert results['ids'][1] == ["id_1"]
+    assert results['ids'][0][0] in ("id_1", "id_3", "id_5")
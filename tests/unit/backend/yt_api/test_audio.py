@@ -2,7 +2,7 @@ import pytest
 import os
 import json
 from unittest.mock import patch, MagicMock
-from llama_sensei.backend.add_courses.yt_api.audio import YouTubeAudioDownloader, METADATA_FILENAME
+from llama_sensei.backend.add_courses.yt_api.audio import YouTubeAudioDownloader, METADATA_FILENAME, AUDIO_PROFILES, AudioProfilePP
 
 @pytest.fixture
 def downloader(tmp_path):
@@ -28,7 +28,8 @@ def test_initialization(tmp_path):
     downloader = YouTubeAudioDownloader(str(tmp_path), "test_course")
     assert os.path.exists(os.path.join(str(tmp_path), "test_course"))
     assert downloader.ydl_opts['format'] == 'bestaudio/best'
-    assert downloader.ydl_opts['postprocessors'][0]['preferredcodec'] == 'wav'
+    assert downloader.profile_name == 'opus'
+    assert downloader.profile['sample_rate'] == 16000
 
 @patch('yt_dlp.YoutubeDL')
 def test_download_audio(mock_ydl, downloader, sample_urls, sample_video_info):
@@ -39,8 +40,11 @@ def test_download_audio(mock_ydl, downloader, sample_urls, sample_video_info):
     result = downloader.download_audio(sample_urls)
 
     assert result == sample_urls
+    # One extraction per video, which also performs the download
     assert mock_ydl_instance.extract_info.call_count == len(sample_urls)
-    mock_ydl_instance.download.assert_called_once_with(sample_urls)
+    for url in sample_urls:
+        mock_ydl_instance.extract_info.assert_any_call(url, download=True)
+    mock_ydl_instance.download.assert_not_called()
 
     metadata_file = os.path.join(downloader.output_course_path, METADATA_FILENAME)
     assert os.path.exists(metadata_file)
@@ -60,9 +64,51 @@ def test_output_path_creation(tmp_path):
 
 def test_ydl_opts_configuration(downloader):
     assert 'format' in downloader.ydl_opts
-    assert 'postprocessors' in downloader.ydl_opts
-    assert downloader.ydl_opts['postprocessors'][0]['key'] == 'FFmpegExtractAudio'
-    assert downloader.ydl_opts['postprocessors'][0]['preferredcodec'] == 'wav'
+    # Conversion is done by AudioProfilePP, not FFmpegExtractAudio
+    assert 'postprocessors' not in downloader.ydl_opts
+
+@pytest.mark.parametrize("profile", sorted(AUDIO_PROFILES))
+def test_audio_profiles(tmp_path, profile):
+    downloader = YouTubeAudioDownloader(str(tmp_path), "test_course", audio_profile=profile)
+    assert downloader.audio_glob.endswith(f"audio/*.{AUDIO_PROFILES[profile]['ext']}")
+    assert {'ext', 'codec', 'args', 'sample_rate', 'mimetype'} <= set(downloader.profile)
+
+def test_unknown_audio_profile(tmp_path):
+    with pytest.raises(KeyError):
+        YouTubeAudioDownloader(str(tmp_path), "test_course", audio_profile="mp3")
+
+@patch('yt_dlp.YoutubeDL')
+def test_download_registers_profile_postprocessor(mock_ydl, downloader, sample_video_info):
+    mock_ydl_instance = MagicMock()
+    mock_ydl.return_value.__enter__.return_value = mock_ydl_instance
+    mock_ydl_instance.extract_info.return_value = sample_video_info
+
+    downloader.download_one("https://www.youtube.com/watch?v=sample1")
+
+    pp = mock_ydl_instance.add_post_processor.call_args[0][0]
+    assert isinstance(pp, AudioProfilePP)
+    assert pp.profile is downloader.profile
+
+def test_audio_profile_pp_encodes_mono_16k(tmp_path):
+    source = tmp_path / "video1.webm"
+    source.write_bytes(b"webm audio")
+    pp = AudioProfilePP(None, AUDIO_PROFILES["opus"])
+
+    def fake_ffmpeg(path, out_path, opts):
+        with open(out_path, "wb") as f:
+            f.write(b"opus audio")
+
+    with patch.object(pp, 'run_ffmpeg', side_effect=fake_ffmpeg) as mock_ffmpeg, \
+         patch.object(pp, 'to_screen'):
+        files_to_delete, info = pp.run({'filepath': str(source), 'ext': 'webm'})
+
+    opts = mock_ffmpeg.call_args[0][2]
+    assert opts[:3] == ['-vn', '-acodec', 'libopus']
+    assert ['-ac', '1'] == opts[3:5] and ['-ar', '16000'] == opts[5:7]
+    assert info['filepath'] == str(tmp_path / "video1.opus")
+    assert info['ext'] == 'opus'
+    assert (tmp_path / "video1.opus").read_bytes() == b"opus audio"
+    assert files_to_delete == [str(source)]
 
 @patch('yt_dlp.YoutubeDL')
 def test_metadata_file_content(mock_ydl, downloader, sample_urls, sample_video_info):
@@ -79,4 +125,98 @@ def test_metadata_file_content(mock_ydl, downloader, sample_urls, sample_video_i
     assert isinstance(saved_metadata, list)
     assert len(saved_metadata) == len(sample_urls)
     for video_info in saved_metadata:
-        assert all(key in video_info for key in ['id', 'title', 'channel', 'url', 'description', 'chapters', 'duration'])
\ No newline at end of file
+        assert all(key in video_info for key in ['id', 'title', 'channel', 'url', 'description', 'chapters', 'duration'])
+
+@patch('yt_dlp.YoutubeDL')
+def test_download_audio_reports_failures_per_url(mock_ydl, downloader, sample_urls, sample_video_info):
+    mock_ydl_instance = MagicMock()
+    mock_ydl.return_value.__enter__.return_value = mock_ydl_instance
+
+    def extract_info(url, download):
+        if url == sample_urls[0]:
+            raise Exception("Video unavailable")
+        return sample_video_info
+
+    mock_ydl_instance.extract_info.side_effect = extract_info
+
+    result = downloader.download_audio(sample_urls)
+
+    assert result == [sample_urls[1]]
+    assert downloader.failed == {sample_urls[0]: "Video unavailable"}
+    with open(os.path.join(downloader.output_course_path, METADATA_FILENAME), 'r') as f:
+        saved_metadata = json.load(f)
+    assert len(saved_metadata) == 1
+
+@patch('yt_dlp.YoutubeDL')
+def test_metadata_written_incrementally(mock_ydl, tmp_path, sample_urls, sample_video_info):
+    downloader = YouTubeAudioDownloader(str(tmp_path), "test_course", max_workers=1)
+    mock_ydl_instance = MagicMock()
+    mock_ydl.return_value.__enter__.return_value = mock_ydl_instance
+    metadata_file = os.path.join(downloader.output_course_path, METADATA_FILENAME)
+    seen_before_download = []
+
+    def extract_info(url, download):
+        if os.path.exists(metadata_file):
+            with open(metadata_file, 'r') as f:
+                seen_before_download.append(len(json.load(f)))
+        else:
+            seen_before_download.append(0)
+        return {**sample_video_info, 'id': url[-7:]}
+
+    mock_ydl_instance.extract_info.side_effect = extract_info
+
+    downloader.download_audio(sample_urls)
+
+    # The first video is already recorded when the second one starts
+    assert seen_before_download == [0, 1]
+    with open(metadata_file, 'r') as f:
+        assert [video['id'] for video in json.load(f)] == ['sample1', 'sample2']
+
+@patch('yt_dlp.YoutubeDL')
+def test_download_audio_reports_progress(mock_ydl, downloader, sample_urls, sample_video_info):
+    mock_ydl_instance = MagicMock()
+    mock_ydl.return_value.__enter__.return_value = mock_ydl_instance
+
+    def extract_info(url, download):
+        if url == sample_urls[0]:
+            raise Exception("Video unavailable")
+        return sample_video_info
+
+    mock_ydl_instance.extract_info.side_effect = extract_info
+    done = []
+
+    downloader.download_audio(sample_urls, on_done=lambda url, error: done.append((url, error)))
+
+    assert sorted(done) == [(sample_urls[0], "Video unavailable"), (sample_urls[1], None)]
+
+@patch('yt_dlp.YoutubeDL')
+def test_download_audio_stops_when_callback_raises(mock_ydl, tmp_path, sample_video_info):
+    downloader = YouTubeAudioDownloader(str(tmp_path), "test_course", max_workers=1)
+    mock_ydl_instance = MagicMock()
+    mock_ydl.return_value.__enter__.return_value = mock_ydl_instance
+    mock_ydl_instance.extract_info.return_value = sample_video_info
+    urls = [f"https://www.youtube.com/watch?v=video{i}" for i in range(10)]
+
+    def stop(url, error):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        downloader.download_audio(urls, on_done=stop)
+
+    # Queued downloads are dropped instead of running to the end
+    assert mock_ydl_instance.extract_info.call_count < len(urls)
+
+@patch('yt_dlp.YoutubeDL')
+def test_metadata_keeps_videos_from_earlier_runs(mock_ydl, tmp_path, sample_video_info):
+    mock_ydl_instance = MagicMock()
+    mock_ydl.return_value.__enter__.return_value = mock_ydl_instance
+    mock_ydl_instance.extract_info.side_effect = lambda url, download: {**sample_video_info, 'id': url[-7:]}
+
+    YouTubeAudioDownloader(str(tmp_path), "test_course").download_audio(["https://www.youtube.com/watch?v=video01"])
+    downloader = YouTubeAudioDownloader(str(tmp_path), "test_course")
+    downloader.download_audio(["https://www.youtube.com/watch?v=video02"])
+
+    assert [video['id'] for video in downloader.load_metadata()] == ['video01', 'video02']
+
+    downloader.forget_videos(['video01'])
+    assert [video['id'] for video in downloader.load_metadata()] == ['video02']
@@ -66,3 +66,19 @@ def test_get_playlist_videos_exception_handling(mock_yt_dlp, playlist_fetcher):
 
     assert video_urls == []
     mock_ydl_instance.extract_info.assert_called_once_with(playlist_url, download=False)
+
+@patch('llama_sensei.backend.add_courses.yt_api.playlist.yt_dlp.YoutubeDL')
+def test_get_playlist_entries(mock_yt_dlp, playlist_fetcher):
+    """Entries keep the id and duration needed to diff a playlist."""
+    mock_ydl_instance = MagicMock()
+    mock_ydl_instance.extract_info.return_value = {
+        'entries': [
+            {'id': 'v1', 'url': 'http://video1.url', 'title': 'Intro', 'duration': 300},
+            {'id': 'v2', 'url': None},
+        ]
+    }
+    mock_yt_dlp.return_value.__enter__.return_value = mock_ydl_instance
+
+    entries = playlist_fetcher.get_playlist_entries("http://fakeplaylist.url")
+
+    assert entries == [{'id': 'v1', 'url': 'http://video1.url', 'title': 'Intro', 'duration': 300}]